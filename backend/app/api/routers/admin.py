@@ -15,6 +15,8 @@ from ...schemas.admin import (
     UpdateLogCreate,
     UpdateLogRead,
     UpdateLogUpdate,
+    VectorReindexRequest,
+    VectorReindexStatus,
 )
 from ...schemas.config import SystemConfigCreate, SystemConfigRead, SystemConfigUpdate
 from ...schemas.prompt import PromptCreate, PromptRead, PromptUpdate
@@ -32,6 +34,8 @@ from ...services.novel_service import NovelService
 from ...services.prompt_service import PromptService
 from ...services.update_log_service import UpdateLogService
 from ...services.user_service import UserService
+from ...services.vector_reindex_service import get_reindex_progress, start_reindex_job
+from ...services.vector_store_service import get_vector_store
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
@@ -330,6 +334,44 @@ async def delete_system_config(
     logger.info("管理员删除系统配置：%s", key)
 
 
+@router.post(
+    "/vector-store/reindex",
+    response_model=VectorReindexStatus,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def start_vector_reindex(
+    payload: VectorReindexRequest,
+    current_admin=Depends(get_current_admin),
+) -> VectorReindexStatus:
+    if get_vector_store() is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="向量库未启用")
+    try:
+        progress = start_reindex_job(
+            project_ids=payload.project_ids,
+            rebuild=payload.rebuild,
+            workers=payload.workers,
+        )
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+    logger.info(
+        "管理员 %s 启动向量回填：projects=%s rebuild=%s",
+        current_admin.username,
+        payload.project_ids or "all",
+        payload.rebuild,
+    )
+    return VectorReindexStatus(**progress.as_dict())
+
+
+@router.get("/vector-store/reindex", response_model=VectorReindexStatus)
+async def read_vector_reindex_status(
+    _: None = Depends(get_current_admin),
+) -> VectorReindexStatus:
+    progress = get_reindex_progress()
+    if progress is None:
+        raise HTTPException(status_code=404, detail="尚未运行过向量回填任务")
+    return VectorReindexStatus(**progress.as_dict())
+
+
 @router.post("/password", status_code=status.HTTP_204_NO_CONTENT)
 async def change_password(
     payload: PasswordChangeRequest,
@@ -17,6 +17,8 @@ from ...core.rate_limit import limiter
 from ...models.user import User
 from ...models.ai_routing import AIProvider, AIFunctionRoute, AIFunctionCallLog
 from ...config.ai_function_config import AIFunctionType
+from ...services.config_cache import PROVIDER_CREDENTIAL, PROVIDER_LIMITS, get_config_cache
+from ...services.endpoint_health import STATE_OPEN, get_endpoint_health
 from ...repositories.ai_routing_repository import (
     AIProviderRepository,
     AIFunctionRouteRepository,
@@ -46,6 +48,8 @@ class AIProviderAdminSchema(AIProviderPublicSchema):
     """完整的Provider信息（仅管理员可见）"""
     base_url: str
     priority: int
+    max_concurrent: Optional[int] = None
+    rate_limit_per_minute: Optional[int] = None
     cost_per_1k_tokens: Optional[float] = None
     api_key_env: Optional[str] = None
 
@@ -56,6 +60,8 @@ class AIProviderCreateSchema(BaseModel):
     display_name: str
     base_url: str
     priority: int = 100
+    max_concurrent: int = Field(default=10, ge=0)
+    rate_limit_per_minute: int = Field(default=60, ge=0)
     cost_per_1k_tokens: Optional[float] = None
     api_key_env: Optional[str] = None
     status: str = "active"
@@ -66,6 +72,8 @@ class AIProviderUpdateSchema(BaseModel):
     display_name: Optional[str] = None
     base_url: Optional[str] = None
     priority: Optional[int] = None
+    max_concurrent: Optional[int] = Field(default=None, ge=0)
+    rate_limit_per_minute: Optional[int] = Field(default=None, ge=0)
     cost_per_1k_tokens: Optional[float] = None
     api_key_env: Optional[str] = None
     status: Optional[str] = None
@@ -157,6 +165,8 @@ async def create_provider(
     session.add(new_provider)
     await session.commit()
     await session.refresh(new_provider)
+    get_config_cache().invalidate(PROVIDER_CREDENTIAL)
+    get_config_cache().invalidate(PROVIDER_LIMITS)
 
     logger.info(f"管理员 {current_user.username} 创建了新Provider: {new_provider.name}")
     return AIProviderAdminSchema.model_validate(new_provider)
@@ -190,6 +200,8 @@ async def update_provider(
 
     await session.commit()
     await session.refresh(provider)
+    get_config_cache().invalidate(PROVIDER_CREDENTIAL)
+    get_config_cache().invalidate(PROVIDER_LIMITS)
 
     logger.info(f"管理员 {current_user.username} 更新了Provider {provider_id}")
     return AIProviderAdminSchema.model_validate(provider)
@@ -218,6 +230,8 @@ async def delete_provider(
     # 软删除
     provider.status = "inactive"
     await session.commit()
+    get_config_cache().invalidate(PROVIDER_CREDENTIAL)
+    get_config_cache().invalidate(PROVIDER_LIMITS)
 
     logger.info(f"管理员 {current_user.username} 删除了Provider {provider_id}")
     return None
@@ -449,10 +463,13 @@ async def update_route(
 
 @router.get("/health")
 async def health_check():
-    """健康检查"""
+    """健康检查，附带各 LLM 端点的熔断状态与健康分（不含 API Key）"""
+    endpoints = get_endpoint_health().snapshot()
     return {
         "status": "ok",
         "service": "ai-routing",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "open_endpoints": sum(1 for endpoint in endpoints if endpoint["state"] == STATE_OPEN),
+        "endpoints": endpoints,
     }
 
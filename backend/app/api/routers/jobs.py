@@ -0,0 +1,239 @@
+"""
+异步生成任务API
+
+提供：
+1. 提交任务（立即返回任务ID，由后台任务池执行）
+2. 查询任务状态、进度与结果（断线重连后可继续获取）
+3. 订阅任务进度（Server-Sent Events）
+4. 手动重试失败的任务
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import and_, desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...core.dependencies import get_current_user
+from ...db.session import AsyncSessionLocal, get_session
+from ...models.async_task import GenerationJob
+from ...schemas.user import UserInDB
+from ...services.generation_job_service import get_job_type, list_job_types, notify_generation_jobs
+from ...services.novel_service import NovelService
+from ...utils.sse import SSE_KEEPALIVE, format_sse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/jobs", tags=["异步生成任务"])
+
+# 订阅进度时轮询任务状态的间隔（秒），任务可能由其他进程执行，因此以数据库为准
+_EVENTS_POLL_SECONDS = 1.0
+# 连续多少次轮询没有变化时发送心跳
+_KEEPALIVE_POLLS = 15
+
+
+# ==================== Schemas ====================
+
+class GenerationJobCreate(BaseModel):
+    """提交任务请求"""
+    job_type: str = Field(..., description="任务类型")
+    project_id: Optional[str] = Field(default=None, description="项目ID")
+    payload: Dict[str, Any] = Field(default_factory=dict, description="与同步接口相同的请求参数")
+    priority: int = Field(default=5, ge=1, le=10, description="优先级（1-10，数字越大优先级越高）")
+
+
+class GenerationJobResponse(BaseModel):
+    """任务响应"""
+    id: int
+    job_type: str
+    project_id: Optional[str]
+    status: str
+    priority: int
+    retry_count: int
+    max_retries: int
+    payload: Optional[dict]
+    progress: Optional[dict]
+    result: Optional[Any]
+    error_message: Optional[str]
+    error_type: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    duration_seconds: Optional[int]
+
+    class Config:
+        from_attributes = True
+
+
+async def _get_owned_job(db: AsyncSession, job_id: int, user_id: int) -> GenerationJob:
+    stmt = select(GenerationJob).where(
+        and_(
+            GenerationJob.id == job_id,
+            GenerationJob.user_id == user_id
+        )
+    )
+    job = (await db.execute(stmt)).scalar_one_or_none()
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+# ==================== API端点 ====================
+
+@router.get("/types", response_model=List[str])
+async def get_job_types(current_user: UserInDB = Depends(get_current_user)):
+    """可提交的任务类型"""
+    return list_job_types()
+
+
+@router.post("", response_model=GenerationJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    request: GenerationJobCreate,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session)
+):
+    """
+    提交异步生成任务
+
+    参数校验与项目归属检查在提交时完成，校验通过后立即返回任务，
+    生成过程由后台任务池执行，客户端通过查询或订阅接口获取进度与结果。
+    """
+    job_type = get_job_type(request.job_type)
+    if job_type is None:
+        raise HTTPException(status_code=400, detail=f"不支持的任务类型: {request.job_type}")
+    if job_type.requires_project:
+        if not request.project_id:
+            raise HTTPException(status_code=400, detail="该任务类型需要指定 project_id")
+        await NovelService(db).ensure_project_owner(request.project_id, current_user.id)
+    if job_type.payload_model is not None:
+        try:
+            job_type.payload_model.model_validate(request.payload)
+        except ValidationError as exc:
+            raise HTTPException(status_code=422, detail=exc.errors(include_url=False))
+
+    job = GenerationJob(
+        job_type=request.job_type,
+        user_id=current_user.id,
+        project_id=request.project_id,
+        priority=request.priority,
+        payload=request.payload,
+        progress={"phase": "queued", "events": []},
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    notify_generation_jobs()
+
+    logger.info("用户 %s 提交生成任务 %s: type=%s project=%s", current_user.id, job.id, job.job_type, job.project_id)
+    return GenerationJobResponse.model_validate(job)
+
+
+@router.get("", response_model=List[GenerationJobResponse])
+async def list_jobs(
+    project_id: Optional[str] = Query(None, description="项目ID"),
+    status_filter: Optional[str] = Query(None, alias="status", description="任务状态"),
+    limit: int = Query(20, ge=1, le=100, description="数量限制"),
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session)
+):
+    """获取当前用户的任务列表（按提交时间倒序）"""
+    stmt = select(GenerationJob).where(GenerationJob.user_id == current_user.id)
+    if project_id:
+        stmt = stmt.where(GenerationJob.project_id == project_id)
+    if status_filter:
+        stmt = stmt.where(GenerationJob.status == status_filter)
+    stmt = stmt.order_by(desc(GenerationJob.created_at)).limit(limit)
+
+    result = await db.execute(stmt)
+    return [GenerationJobResponse.model_validate(job) for job in result.scalars().all()]
+
+
+@router.get("/{job_id}", response_model=GenerationJobResponse)
+async def get_job(
+    job_id: int,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session)
+):
+    """查询任务状态、进度与结果"""
+    job = await _get_owned_job(db, job_id, current_user.id)
+    return GenerationJobResponse.model_validate(job)
+
+
+@router.get("/{job_id}/events")
+async def subscribe_job(
+    job_id: int,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session)
+):
+    """
+    订阅任务进度（Server-Sent Events）
+
+    事件：
+    - progress：任务状态或进度变化，数据为完整的任务信息（不含 result）
+    - completed / failed：任务结束，数据为完整的任务信息，随后关闭连接
+
+    断线后重新订阅即可，已结束的任务会立即返回最终事件。
+    """
+    await _get_owned_job(db, job_id, current_user.id)
+
+    async def event_stream():
+        last_marker = None
+        idle_polls = 0
+        while True:
+            # 依赖注入的会话在响应开始发送前就已关闭，每次轮询使用独立会话
+            async with AsyncSessionLocal() as poll_db:
+                job = await poll_db.get(GenerationJob, job_id)
+            if job is None:
+                yield format_sse("failed", {"id": job_id, "error_message": "任务不存在"})
+                return
+            data = GenerationJobResponse.model_validate(job).model_dump(mode="json")
+            if job.is_finished:
+                yield format_sse(job.status, data)
+                return
+            marker = (job.status, job.updated_at, job.retry_count)
+            if marker != last_marker:
+                last_marker = marker
+                idle_polls = 0
+                data.pop("result", None)
+                yield format_sse("progress", data)
+            else:
+                idle_polls += 1
+                if idle_polls >= _KEEPALIVE_POLLS:
+                    idle_polls = 0
+                    yield SSE_KEEPALIVE
+            await asyncio.sleep(_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/{job_id}/retry", response_model=GenerationJobResponse)
+async def retry_job(
+    job_id: int,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session)
+):
+    """手动重试失败的任务，保留已保存的阶段性结果"""
+    job = await _get_owned_job(db, job_id, current_user.id)
+    if not job.can_retry:
+        raise HTTPException(status_code=400, detail=f"任务状态为 {job.status}，无法重试")
+
+    job.status = "pending"
+    job.retry_count = 0
+    job.error_message = None
+    job.error_type = None
+    job.completed_at = None
+    job.result = None
+    await db.commit()
+    await db.refresh(job)
+    notify_generation_jobs()
+
+    logger.info("用户 %s 重试生成任务 %s", current_user.id, job_id)
+    return GenerationJobResponse.model_validate(job)
@@ -20,6 +20,7 @@ from ...schemas.novel import (
     NovelSectionType,
 )
 from ...schemas.user import UserInDB
+from ...services.generation_job_service import JobContext, register_job_handler
 from ...services.llm_service import LLMService
 from ...services.novel_service import NovelService
 from ...services.prompt_service import PromptService
@@ -298,6 +299,13 @@ async def generate_blueprint(
     return BlueprintGenerationResponse(blueprint=blueprint, ai_message=ai_message)
 
 
+@register_job_handler("blueprint_generation")
+async def _blueprint_generation_job(ctx: JobContext) -> BlueprintGenerationResponse:
+    """异步任务：复用同步接口生成蓝图，由生成任务池以独立会话执行。"""
+    ctx.emit("progress", {"phase": "generation"})
+    return await generate_blueprint(ctx.project_id, session=ctx.session, current_user=ctx.user)
+
+
 @router.post("/{project_id}/blueprint/save", response_model=NovelProjectSchema)
 async def save_blueprint(
     project_id: str,
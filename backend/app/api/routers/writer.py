@@ -1,18 +1,20 @@
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import time
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from urllib.parse import quote
 
 from fastapi import APIRouter, Body, Depends, HTTPException
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ...core.config import settings
 from ...core.dependencies import get_current_user
-from ...db.session import get_session
+from ...db.session import AsyncSessionLocal, get_session
 from ...models.novel import Chapter, ChapterOutline
 from ...schemas.novel import (
     DeleteChapterRequest,
@@ -27,18 +29,26 @@ from ...schemas.novel import (
 )
 from ...schemas.user import UserInDB
 from ...services.ai_denoising_service import AIDenoisingService
-from ...services.chapter_context_service import ChapterContextService
+from ...services.chapter_context_service import ChapterContextService, resolve_chapter_window
+from ...services.chapter_version_generator import generate_versions
+from ...services.generation_job_service import JobContext, register_job_handler
 from ...services.chapter_ingest_service import ChapterIngestionService
 from ...services.llm_service import LLMService
 from ...services.novel_service import NovelService
 from ...services.prompt_service import PromptService
-from ...services.vector_store_service import VectorStoreService
+from ...services.single_flight import SingleFlight
+from ...services.vector_store_service import get_vector_store
 from ...utils.json_utils import remove_think_tags, unwrap_markdown_json
+from ...utils.metrics import chapter_generation_first_token_seconds
+from ...utils.sse import SSE_KEEPALIVE, format_sse
 from ...repositories.system_config_repository import SystemConfigRepository
 
 router = APIRouter(prefix="/api/writer", tags=["Writer"])
 logger = logging.getLogger(__name__)
 
+# 流式生成没有事件时发送心跳的间隔（秒）
+_SSE_KEEPALIVE_SECONDS = 15.0
+
 
 async def _load_project_schema(service: NovelService, project_id: str, user_id: int) -> NovelProjectSchema:
     return await service.get_project_schema(project_id, user_id)
@@ -99,19 +109,19 @@ async def _check_prerequisites(
     return True, ""
 
 
-@router.post("/novels/{project_id}/chapters/generate", response_model=NovelProjectSchema)
-async def generate_chapter(
+GenerationEmitter = Callable[[str, Dict[str, Any]], None]
+
+
+async def _validate_generation_request(
+    novel_service: NovelService,
+    session: AsyncSession,
     project_id: str,
     request: GenerateChapterRequest,
-    session: AsyncSession = Depends(get_session),
-    current_user: UserInDB = Depends(get_current_user),
-) -> NovelProjectSchema:
-    novel_service = NovelService(session)
-    prompt_service = PromptService(session)
-    llm_service = LLMService(session)
-
-    project = await novel_service.ensure_project_owner(project_id, current_user.id)
-    logger.info("用户 %s 开始为项目 %s 生成第 %s 章", current_user.id, project_id, request.chapter_number)
+    user_id: int,
+):
+    """校验项目归属、前置章节与章节纲要，返回 (项目, 当前章节纲要)。"""
+    project = await novel_service.ensure_project_owner(project_id, user_id)
+    logger.info("用户 %s 开始为项目 %s 生成第 %s 章", user_id, project_id, request.chapter_number)
 
     # ✅ 新增：检查前置条件
     can_generate, error_msg = await _check_prerequisites(
@@ -125,6 +135,34 @@ async def generate_chapter(
     if not outline:
         logger.warning("项目 %s 未找到第 %s 章纲要，生成流程终止", project_id, request.chapter_number)
         raise HTTPException(status_code=404, detail="蓝图中未找到对应章节纲要")
+    return project, outline
+
+
+async def _generate_chapter_versions(
+    session: AsyncSession,
+    novel_service: NovelService,
+    project,
+    outline,
+    request: GenerateChapterRequest,
+    user_id: int,
+    *,
+    emit: Optional[GenerationEmitter] = None,
+    resume_versions: Optional[Dict[int, Dict]] = None,
+    on_version: Optional[Callable[[int, Dict], None]] = None,
+) -> None:
+    """
+    章节生成主流程：回填前情摘要、RAG 检索、生成多个版本并写入数据库。
+
+    普通接口、流式接口与异步任务共用本流程，emit 不为空时按阶段推送进度与模型增量输出。
+    resume_versions 中已有的版本直接复用（异步任务中断后重试），新生成的版本通过 on_version 回传。
+    """
+    project_id = project.id
+    prompt_service = PromptService(session)
+    llm_service = LLMService(session)
+
+    def _emit(event: str, **data: Any) -> None:
+        if emit is not None:
+            emit(event, data)
 
     chapter = await novel_service.get_or_create_chapter(project_id, request.chapter_number)
     chapter.real_summary = None
@@ -138,26 +176,28 @@ async def generate_chapter(
     latest_prev_number = -1
     previous_summary_text = ""
     previous_tail_excerpt = ""
+    _emit("progress", phase="summaries")
     for existing in project.chapters:
         if existing.chapter_number >= request.chapter_number:
             continue
         if existing.selected_version is None or not existing.selected_version.content:
             continue
         if not existing.real_summary:
+            _emit("progress", phase="summaries", chapter_number=existing.chapter_number)
             summary = await llm_service.get_summary(
                 existing.selected_version.content,
                 temperature=0.15,
-                user_id=current_user.id,
+                user_id=user_id,
                 timeout=180.0,
             )
             existing.real_summary = remove_think_tags(summary)
             await session.commit()
         # ✅ 修复：避免重复调用 get() 导致的潜在 None 引用错误
-        outline = outlines_map.get(existing.chapter_number)
+        previous_outline = outlines_map.get(existing.chapter_number)
         completed_chapters.append(
             {
                 "chapter_number": existing.chapter_number,
-                "title": outline.title if outline else f"第{existing.chapter_number}章",
+                "title": previous_outline.title if previous_outline else f"第{existing.chapter_number}章",
                 "summary": existing.real_summary,
             }
         )
@@ -196,15 +236,8 @@ async def generate_chapter(
         raise HTTPException(status_code=500, detail="缺少写作提示词，请联系管理员配置 'writing' 提示词")
 
     # 初始化向量检索服务，若未配置则自动降级为纯提示词生成
-    vector_store: Optional[VectorStoreService]
-    if not settings.vector_store_enabled:
-        vector_store = None
-    else:
-        try:
-            vector_store = VectorStoreService()
-        except RuntimeError as exc:
-            logger.warning("向量库初始化失败，RAG 检索被禁用: %s", exc)
-            vector_store = None
+    _emit("progress", phase="retrieval")
+    vector_store = get_vector_store()
     context_service = ChapterContextService(llm_service=llm_service, vector_store=vector_store)
 
     outline_title = outline.title or f"第{outline.chapter_number}章"
@@ -213,10 +246,18 @@ async def generate_chapter(
     if request.writing_notes:
         query_parts.append(request.writing_notes)
     rag_query = "\n".join(part for part in query_parts if part)
+    # 只检索当前章节之前（及配置窗口内）的内容，重新生成旧章节时不会混入后文
+    min_chapter, max_chapter = resolve_chapter_window(
+        request.chapter_number,
+        outlines=project.outlines,
+        volumes=project.volumes,
+    )
     rag_context = await context_service.retrieve_for_generation(
         project_id=project_id,
         query_text=rag_query or outline.title or outline.summary or "",
-        user_id=current_user.id,
+        user_id=user_id,
+        min_chapter=min_chapter,
+        max_chapter=max_chapter,
     )
     chunk_count = len(rag_context.chunks) if rag_context and rag_context.chunks else 0
     summary_count = len(rag_context.summaries) if rag_context and rag_context.summaries else 0
@@ -256,16 +297,35 @@ async def generate_chapter(
     prompt_input = "\n\n".join(f"{title}\n{content}" for title, content in prompt_sections if content)
     logger.debug("章节写作提示词：%s\n%s", writer_prompt, prompt_input)
     async def _generate_single_version(idx: int) -> Dict:
+        on_delta = None
+        if emit is not None:
+            started = time.perf_counter()
+            first_token = True
+
+            def on_delta(text: str, attempt: int) -> None:
+                nonlocal first_token
+                if first_token:
+                    first_token = False
+                    elapsed = time.perf_counter() - started
+                    chapter_generation_first_token_seconds.observe(elapsed)
+                    _emit("first_token", version=idx, seconds=round(elapsed, 3))
+                _emit("delta", version=idx, attempt=attempt, text=text)
+
+        _emit("version_start", version=idx)
         try:
-            response = await llm_service.get_llm_response(
-                system_prompt=writer_prompt,
-                conversation_history=[{"role": "user", "content": prompt_input}],
-                temperature=0.9,
-                user_id=current_user.id,
-                timeout=600.0,
-            )
+            # 各版本并发生成，每个版本使用独立会话（配额计数等会在调用中提交）
+            async with AsyncSessionLocal() as version_session:
+                response = await LLMService(version_session).get_llm_response(
+                    system_prompt=writer_prompt,
+                    conversation_history=[{"role": "user", "content": prompt_input}],
+                    temperature=0.9,
+                    user_id=user_id,
+                    timeout=600.0,
+                    on_delta=on_delta,
+                )
             cleaned = remove_think_tags(response)
             normalized = unwrap_markdown_json(cleaned)
+            _emit("version_done", version=idx, length=len(normalized))
             try:
                 return json.loads(normalized)
             except json.JSONDecodeError as parse_err:
@@ -277,7 +337,8 @@ async def generate_chapter(
                     parse_err,
                 )
                 return {"content": normalized}
-        except HTTPException:
+        except HTTPException as exc:
+            _emit("version_error", version=idx, status_code=exc.status_code, detail=exc.detail)
             raise
         except Exception as exc:
             logger.exception(
@@ -287,10 +348,9 @@ async def generate_chapter(
                 idx + 1,
                 exc,
             )
-            raise HTTPException(
-                status_code=500,
-                detail=f"生成章节第 {idx + 1} 个版本时失败: {str(exc)[:200]}"
-            )
+            detail = f"生成章节第 {idx + 1} 个版本时失败: {str(exc)[:200]}"
+            _emit("version_error", version=idx, status_code=500, detail=detail)
+            raise HTTPException(status_code=500, detail=detail)
 
     version_count = await _resolve_version_count(session)
     logger.info(
@@ -299,9 +359,18 @@ async def generate_chapter(
         request.chapter_number,
         version_count,
     )
-    raw_versions = []
-    for idx in range(version_count):
-        raw_versions.append(await _generate_single_version(idx))
+    async def _generate_or_resume(idx: int) -> Dict:
+        if resume_versions and idx in resume_versions:
+            _emit("version_done", version=idx, resumed=True)
+            return resume_versions[idx]
+        variant = await _generate_single_version(idx)
+        if on_version is not None:
+            on_version(idx, variant)
+        return variant
+
+    _emit("progress", phase="generation", version_count=version_count)
+    # 版本之间并发生成，单个版本失败时保存其余成功的版本
+    raw_versions = await generate_versions(version_count, _generate_or_resume)
     contents: List[str] = []
     metadata: List[Dict] = []
     for variant in raw_versions:
@@ -317,6 +386,7 @@ async def generate_chapter(
             contents.append(str(variant))
             metadata.append({"raw": variant})
 
+    _emit("progress", phase="saving")
     await novel_service.replace_chapter_versions(chapter, contents, metadata)
     logger.info(
         "项目 %s 第 %s 章生成完成，已写入 %s 个版本",
@@ -324,9 +394,188 @@ async def generate_chapter(
         request.chapter_number,
         len(contents),
     )
+
+
+# 同一章节的生成请求合并，key 为 (user_id, project_id, chapter_number, 请求参数摘要)
+_chapter_flights = SingleFlight("chapter_generation")
+
+
+def _generation_flight_key(project_id: str, request: GenerateChapterRequest, user_id: int) -> Tuple[Any, ...]:
+    """只有同一用户、参数完全相同的请求才会合并，写作指令不同的请求各自生成。"""
+    payload = json.dumps(request.model_dump(mode="json"), ensure_ascii=False, sort_keys=True)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return user_id, project_id, request.chapter_number, digest
+
+
+async def _generate_chapter_once(
+    project_id: str,
+    request: GenerateChapterRequest,
+    user_id: int,
+    *,
+    emit: Optional[GenerationEmitter] = None,
+    resume_versions: Optional[Dict[int, Dict]] = None,
+    on_version: Optional[Callable[[int, Dict], None]] = None,
+) -> bool:
+    """
+    生成章节；同一用户以相同参数对同一章节的生成已在进行时不再重复生成，等待其完成并共享结果。
+
+    返回 True 表示本次请求合并到了进行中的生成，调用方需告知客户端。
+    生成在独立会话中执行（可能被多个请求共享），调用方读取结果前需使自身会话的缓存失效。
+    合并的请求只收到 coalesced 事件，不会收到进行中生成的增量输出。
+    携带 resume_versions / on_version 的调用（异步任务）依赖自己的恢复状态与回调，不参与合并。
+    """
+    key = _generation_flight_key(project_id, request, user_id)
+    coalesce = resume_versions is None and on_version is None
+    if coalesce and emit is not None and _chapter_flights.in_flight(key):
+        emit("coalesced", {"chapter_number": request.chapter_number})
+
+    async def run() -> None:
+        async with AsyncSessionLocal() as flight_session:
+            flight_service = NovelService(flight_session)
+            project, outline = await _validate_generation_request(
+                flight_service, flight_session, project_id, request, user_id
+            )
+            await _generate_chapter_versions(
+                flight_session,
+                flight_service,
+                project,
+                outline,
+                request,
+                user_id,
+                emit=emit,
+                resume_versions=resume_versions,
+                on_version=on_version,
+            )
+
+    if not coalesce:
+        await run()
+        return False
+    _, shared = await _chapter_flights.do(key, run)
+    if shared:
+        logger.info("项目 %s 第 %s 章的生成请求已合并到进行中的生成", project_id, request.chapter_number)
+    return shared
+
+
+@router.post("/novels/{project_id}/chapters/generate", response_model=NovelProjectSchema)
+async def generate_chapter(
+    project_id: str,
+    request: GenerateChapterRequest,
+    response: Response,
+    session: AsyncSession = Depends(get_session),
+    current_user: UserInDB = Depends(get_current_user),
+) -> NovelProjectSchema:
+    """
+    生成章节。
+
+    同一用户以相同参数生成同一章节的请求已在进行时（重复点击、多个标签页），本次请求等待其完成
+    并返回同一结果，不会重复调用模型，响应头 X-Generation-Coalesced: true 表示发生了合并。
+    """
+    novel_service = NovelService(session)
+    await _validate_generation_request(novel_service, session, project_id, request, current_user.id)
+    if await _generate_chapter_once(project_id, request, current_user.id):
+        response.headers["X-Generation-Coalesced"] = "true"
+    session.expire_all()
     return await _load_project_schema(novel_service, project_id, current_user.id)
 
 
+# 客户端断开后仍在后台完成的流式生成任务，保留引用避免被回收
+_detached_generations: Set[asyncio.Task] = set()
+
+
+@router.post("/novels/{project_id}/chapters/generate/stream")
+async def generate_chapter_stream(
+    project_id: str,
+    request: GenerateChapterRequest,
+    session: AsyncSession = Depends(get_session),
+    current_user: UserInDB = Depends(get_current_user),
+) -> StreamingResponse:
+    """
+    流式生成章节（Server-Sent Events）。
+
+    生成流程与写入结果与 /chapters/generate 完全一致，区别在于过程中推送事件：
+    - progress：阶段进度（summaries / retrieval / generation / saving）
+    - version_start / version_done / version_error：单个版本开始、完成与失败（失败的版本不保存）
+    - first_token：该版本收到首个 token 的耗时
+    - delta：模型增量输出，按 version 区分；attempt 变化表示端点切换，之前的内容应丢弃
+    - coalesced：相同参数的生成已在进行，本次请求等待其完成，不再推送增量输出
+    - done：最终的项目数据（与普通接口的返回值相同）
+    - error：生成失败，包含 status_code 与 detail
+
+    客户端断开连接不会中断生成，结果照常写入数据库。
+    """
+    novel_service = NovelService(session)
+    # 在开始推送前完成校验，归属与前置条件错误仍以普通 HTTP 状态码返回
+    await _validate_generation_request(novel_service, session, project_id, request, current_user.id)
+
+    queue: "asyncio.Queue[Optional[tuple]]" = asyncio.Queue()
+
+    def emit(event: str, data: Dict[str, Any]) -> None:
+        queue.put_nowait((event, data))
+
+    async def run() -> None:
+        # 依赖注入的会话在响应开始发送前就已关闭，流式流程使用独立会话
+        await _generate_chapter_once(project_id, request, current_user.id, emit=emit)
+        async with AsyncSessionLocal() as stream_session:
+            stream_service = NovelService(stream_session)
+            project_schema = await _load_project_schema(stream_service, project_id, current_user.id)
+            emit("done", project_schema.model_dump(mode="json"))
+
+    async def event_stream():
+        task = asyncio.create_task(run())
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=_SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # 摘要回填与检索阶段可能长时间没有输出，发送注释行防止代理断开
+                    yield SSE_KEEPALIVE
+                    continue
+                if item is None:
+                    break
+                yield format_sse(*item)
+            exc = task.exception()
+            if isinstance(exc, HTTPException):
+                yield format_sse("error", {"status_code": exc.status_code, "detail": exc.detail})
+            elif exc is not None:
+                logger.error("项目 %s 第 %s 章流式生成失败: %s", project_id, request.chapter_number, exc)
+                yield format_sse("error", {"status_code": 500, "detail": "章节生成失败，请稍后重试"})
+        finally:
+            if not task.done():
+                logger.info("项目 %s 第 %s 章流式连接已断开，生成继续在后台进行", project_id, request.chapter_number)
+                _detached_generations.add(task)
+                task.add_done_callback(_detached_generations.discard)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@register_job_handler("chapter_generation", GenerateChapterRequest)
+async def _chapter_generation_job(ctx: JobContext) -> NovelProjectSchema:
+    """异步任务：生成章节，已生成的版本保存在 partial 中，任务中断重试时复用。"""
+    novel_service = NovelService(ctx.session)
+    await _validate_generation_request(novel_service, ctx.session, ctx.project_id, ctx.payload, ctx.user.id)
+    versions: Dict[str, Dict] = dict(ctx.partial.get("versions") or {})
+
+    def on_version(idx: int, variant: Dict) -> None:
+        versions[str(idx)] = variant
+        ctx.save_partial("versions", versions)
+
+    await _generate_chapter_once(
+        ctx.project_id,
+        ctx.payload,
+        ctx.user.id,
+        emit=ctx.emit,
+        resume_versions={int(idx): variant for idx, variant in versions.items()},
+        on_version=on_version,
+    )
+    ctx.session.expire_all()
+    return await _load_project_schema(novel_service, ctx.project_id, ctx.user.id)
+
+
 async def _resolve_version_count(session: AsyncSession) -> int:
     repo = SystemConfigRepository(session)
     record = await repo.get_by_key("writer.chapter_versions")
@@ -383,15 +632,7 @@ async def select_chapter_version(
         await session.commit()
 
         # 选定版本后同步向量库，确保后续章节可检索到最新内容
-        vector_store: Optional[VectorStoreService]
-        if not settings.vector_store_enabled:
-            vector_store = None
-        else:
-            try:
-                vector_store = VectorStoreService()
-            except RuntimeError as exc:
-                logger.warning("向量库初始化失败，跳过章节向量同步: %s", exc)
-                vector_store = None
+        vector_store = get_vector_store()
 
         if vector_store:
             ingestion_service = ChapterIngestionService(llm_service=llm_service, vector_store=vector_store)
@@ -617,15 +858,7 @@ async def delete_chapters(
     await novel_service.delete_chapters(project_id, request.chapter_numbers)
 
     # 删除章节时同步清理向量库，避免过时内容被检索
-    vector_store: Optional[VectorStoreService]
-    if not settings.vector_store_enabled:
-        vector_store = None
-    else:
-        try:
-            vector_store = VectorStoreService()
-        except RuntimeError as exc:
-            logger.warning("向量库初始化失败，跳过章节向量删除: %s", exc)
-            vector_store = None
+    vector_store = get_vector_store()
 
     if vector_store:
         ingestion_service = ChapterIngestionService(llm_service=llm_service, vector_store=vector_store)
@@ -669,15 +902,7 @@ async def edit_chapter(
         chapter.real_summary = remove_think_tags(summary)
     await session.commit()
 
-    vector_store: Optional[VectorStoreService]
-    if not settings.vector_store_enabled:
-        vector_store = None
-    else:
-        try:
-            vector_store = VectorStoreService()
-        except RuntimeError as exc:
-            logger.warning("向量库初始化失败，跳过章节向量更新: %s", exc)
-            vector_store = None
+    vector_store = get_vector_store()
 
     if vector_store and chapter.selected_version and chapter.selected_version.content:
         ingestion_service = ChapterIngestionService(llm_service=llm_service, vector_store=vector_store)
@@ -845,3 +1070,25 @@ async def denoise_chapter(
     )
 
     return await _load_project_schema(novel_service, project_id, current_user.id)
+
+
+# ==================== 异步任务 ====================
+# 以下任务类型复用同步接口的实现，由生成任务池以独立会话执行
+
+
+@register_job_handler("chapter_outline", GenerateOutlineRequest)
+async def _chapter_outline_job(ctx: JobContext) -> NovelProjectSchema:
+    ctx.emit("progress", {"phase": "generation"})
+    return await generate_chapter_outline(ctx.project_id, ctx.payload, session=ctx.session, current_user=ctx.user)
+
+
+@register_job_handler("chapter_evaluation", EvaluateChapterRequest)
+async def _chapter_evaluation_job(ctx: JobContext) -> NovelProjectSchema:
+    ctx.emit("progress", {"phase": "evaluation"})
+    return await evaluate_chapter(ctx.project_id, ctx.payload, session=ctx.session, current_user=ctx.user)
+
+
+@register_job_handler("chapter_denoise", DenoiseChapterRequest)
+async def _chapter_denoise_job(ctx: JobContext) -> NovelProjectSchema:
+    ctx.emit("progress", {"phase": "denoise"})
+    return await denoise_chapter(ctx.project_id, ctx.payload, session=ctx.session, current_user=ctx.user)
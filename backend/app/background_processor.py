@@ -19,6 +19,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from app.db.session import AsyncSessionLocal
 from app.services.async_analysis_processor import AsyncAnalysisProcessor
 from app.services.llm_service import LLMService
+from app.services.vector_store_service import close_vector_store, init_vector_store
 
 # ✅ 修复：确保logs目录存在
 log_dir = Path(__file__).parent.parent / 'logs'
@@ -67,14 +68,17 @@ class BackgroundProcessorManager:
             # 配置处理器
             self.processor.max_concurrent = 3  # 最大并发数
             self.processor.poll_interval = 10  # 轮询间隔（秒）
-            self.processor.processing_timeout = 600  # 处理超时（秒）
+            self.processor.processing_timeout = 600  # 心跳超时（秒）
 
             logger.info(f"配置:")
             logger.info(f"  - 最大并发数: {self.processor.max_concurrent}")
             logger.info(f"  - 轮询间隔: {self.processor.poll_interval}秒")
-            logger.info(f"  - 处理超时: {self.processor.processing_timeout}秒")
+            logger.info(f"  - 心跳超时: {self.processor.processing_timeout}秒")
             logger.info("=" * 60)
 
+            # 创建进程级共享的向量库实例
+            await init_vector_store()
+
             # 启动处理器
             self.is_running = True
             await self.processor.start()
@@ -90,6 +94,7 @@ class BackgroundProcessorManager:
         """停止处理器"""
         if self.processor:
             await self.processor.stop()
+        await close_vector_store()
         
         self.is_running = False
         logger.info("=" * 60)
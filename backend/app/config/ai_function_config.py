@@ -64,6 +64,12 @@ class FunctionRouteConfig(BaseModel):
     max_retries: int = 2
     async_mode: bool = False  # 是否异步执行
     required: bool = True  # 是否必须成功（False则失败时返回默认值）
+    # 对冲请求：主模型超过延迟预算仍未返回首个 token 时，并行发起备用请求，先完成者胜出
+    hedge: bool = False
+    hedge_min_delay: float = 2.0  # 延迟预算下限（秒）
+    hedge_max_delay: float = 20.0  # 延迟预算上限（秒），样本不足时直接使用
+    # 响应缓存：低温度的提取类功能对相同输入结果稳定，命中时不再调用模型
+    cache: bool = False
 
 
 # ==================== AI功能配置 ====================
@@ -81,6 +87,7 @@ AI_FUNCTION_ROUTES: Dict[AIFunctionType, FunctionRouteConfig] = {
         timeout=240.0,
         max_retries=2,
         required=True,
+        hedge=True,  # 交互式对话，对冲降低长尾延迟
     ),
 
     # F02: 蓝图生成 - 使用DeepSeek
@@ -137,6 +144,8 @@ AI_FUNCTION_ROUTES: Dict[AIFunctionType, FunctionRouteConfig] = {
         timeout=180.0,
         max_retries=2,
         required=True,
+        hedge=True,
+        cache=True,
     ),
 
     # F06: 基础分析 - 使用DeepSeek
@@ -151,6 +160,7 @@ AI_FUNCTION_ROUTES: Dict[AIFunctionType, FunctionRouteConfig] = {
         timeout=180.0,
         max_retries=2,
         required=True,
+        cache=True,
     ),
 
     # F07: 增强分析 - 使用DeepSeek
@@ -210,6 +220,7 @@ AI_FUNCTION_ROUTES: Dict[AIFunctionType, FunctionRouteConfig] = {
         timeout=30.0,
         max_retries=1,
         required=False,  # 失败返回默认卷名
+        cache=True,  # 卷内章节数据未变化时沿用已生成的卷名
     ),
 
     # F11: AI去味 - 使用Gemini（擅长自然语言处理）
@@ -103,6 +103,40 @@ class Settings(BaseSettings):
         env="EMBEDDING_MODEL_VECTOR_SIZE",
         description="嵌入向量维度，未配置时将自动检测",
     )
+    embedding_batch_size: int = Field(
+        default=64,
+        ge=1,
+        env="EMBEDDING_BATCH_SIZE",
+        description="单次嵌入请求包含的最大文本条数",
+    )
+    embedding_max_concurrency: int = Field(
+        default=4,
+        ge=1,
+        env="EMBEDDING_MAX_CONCURRENCY",
+        description="批量嵌入时同时进行的最大请求数",
+    )
+    embedding_batch_window_ms: float = Field(
+        default=5.0,
+        ge=0,
+        env="EMBEDDING_BATCH_WINDOW_MS",
+        description="跨请求合并嵌入调用的等待窗口（毫秒），0 表示关闭微批合并",
+    )
+    embedding_cache_enabled: bool = Field(
+        default=True,
+        env="EMBEDDING_CACHE_ENABLED",
+        description="是否启用本地嵌入缓存，未变化的文本不再重复调用嵌入接口",
+    )
+    embedding_cache_path: Optional[str] = Field(
+        default=None,
+        env="EMBEDDING_CACHE_PATH",
+        description="嵌入缓存 SQLite 文件路径，留空时使用 storage/embedding_cache.db",
+    )
+    embedding_cache_max_entries: int = Field(
+        default=200000,
+        ge=1,
+        env="EMBEDDING_CACHE_MAX_ENTRIES",
+        description="嵌入缓存最多保留的条目数，超出后按最近使用时间淘汰",
+    )
     ollama_embedding_base_url: Optional[AnyUrl] = Field(
         default=None,
         env="OLLAMA_EMBEDDING_BASE_URL",
@@ -123,6 +157,12 @@ class Settings(BaseSettings):
         env="VECTOR_DB_AUTH_TOKEN",
         description="libsql 访问令牌",
     )
+    vector_db_pool_size: int = Field(
+        default=4,
+        ge=1,
+        env="VECTOR_DB_POOL_SIZE",
+        description="远程 libsql 连接池大小，本地文件库固定为 1",
+    )
     vector_top_k_chunks: int = Field(
         default=5,
         ge=0,
@@ -147,6 +187,149 @@ class Settings(BaseSettings):
         env="VECTOR_CHUNK_OVERLAP",
         description="章节分块重叠字数",
     )
+    vector_scan_page_size: int = Field(
+        default=4096,
+        ge=64,
+        env="VECTOR_SCAN_PAGE_SIZE",
+        description="应用层精确扫描时每页读取的向量条数，控制内存占用",
+    )
+    vector_storage_format: str = Field(
+        default="float32",
+        env="VECTOR_STORAGE_FORMAT",
+        description="向量存储格式：float32 / float16 / int8，压缩格式检索时会做精确重排",
+    )
+    vector_rerank_factor: int = Field(
+        default=4,
+        ge=1,
+        env="VECTOR_RERANK_FACTOR",
+        description="压缩存储时第一轮粗排召回 top_k 的倍数，用于精确重排",
+    )
+    vector_query_cache_ttl: float = Field(
+        default=300.0,
+        ge=0,
+        env="VECTOR_QUERY_CACHE_TTL",
+        description="检索查询向量与检索结果的缓存时间（秒），0 表示关闭",
+    )
+    vector_query_cache_size: int = Field(
+        default=256,
+        ge=1,
+        env="VECTOR_QUERY_CACHE_SIZE",
+        description="检索查询向量与检索结果缓存的最大条目数",
+    )
+    vector_retrieval_mode: str = Field(
+        default="vector",
+        env="VECTOR_RETRIEVAL_MODE",
+        description="章节生成检索方式：vector / lexical / hybrid（向量与本地词法检索排名融合）",
+    )
+    vector_hybrid_rrf_k: int = Field(
+        default=60,
+        ge=1,
+        env="VECTOR_HYBRID_RRF_K",
+        description="混合检索倒数排名融合的平滑常数 k",
+    )
+    vector_lexical_index_max_loaded: int = Field(
+        default=64,
+        ge=1,
+        env="VECTOR_LEXICAL_INDEX_MAX_LOADED",
+        description="内存中最多保留的词法索引数（每个项目的片段与摘要各占一个），超出后淘汰最久未使用的",
+    )
+    vector_query_embedding_timeout: float = Field(
+        default=5.0,
+        ge=0,
+        env="VECTOR_QUERY_EMBEDDING_TIMEOUT",
+        description="混合检索等待查询向量的最长时间（秒），超时直接使用词法结果，0 表示一直等待",
+    )
+    vector_retrieval_window_chapters: int = Field(
+        default=0,
+        ge=0,
+        env="VECTOR_RETRIEVAL_WINDOW_CHAPTERS",
+        description="章节生成时只检索最近 N 章的内容，0 表示检索此前全部章节",
+    )
+    vector_retrieval_window_volumes: int = Field(
+        default=0,
+        ge=0,
+        env="VECTOR_RETRIEVAL_WINDOW_VOLUMES",
+        description="章节生成时只检索最近 K 卷（含当前卷）的内容，0 表示不按分卷限制",
+    )
+    vector_reindex_workers: int = Field(
+        default=4,
+        ge=1,
+        env="VECTOR_REINDEX_WORKERS",
+        description="批量回填向量库时并发处理的章节数",
+    )
+    vector_reindex_embeddings_per_second: float = Field(
+        default=0.0,
+        ge=0,
+        env="VECTOR_REINDEX_EMBEDDINGS_PER_SECOND",
+        description="批量回填时每个嵌入模型的平均嵌入速率上限，0 表示不限速",
+    )
+    vector_reindex_checkpoint_path: Optional[str] = Field(
+        default=None,
+        env="VECTOR_REINDEX_CHECKPOINT_PATH",
+        description="批量回填检查点文件路径，留空时使用 storage/vector_reindex_checkpoint.json",
+    )
+    vector_index_enabled: bool = Field(
+        default=True,
+        env="VECTOR_INDEX_ENABLED",
+        description="是否启用项目级 ANN 索引，关闭后检索退回向量库全量扫描",
+    )
+    vector_index_dir: Optional[str] = Field(
+        default=None,
+        env="VECTOR_INDEX_DIR",
+        description="ANN 索引文件目录，留空时放在本地向量库文件旁或 storage/vector_index",
+    )
+    vector_index_nprobe: int = Field(
+        default=8,
+        ge=1,
+        env="VECTOR_INDEX_NPROBE",
+        description="ANN 检索时探测的聚类数量，越大召回越高、耗时越长",
+    )
+    vector_index_min_train_size: int = Field(
+        default=2048,
+        ge=16,
+        env="VECTOR_INDEX_MIN_TRAIN_SIZE",
+        description="向量条数达到该值后才训练聚类，之前使用精确扫描",
+    )
+    vector_index_max_loaded: int = Field(
+        default=16,
+        ge=1,
+        env="VECTOR_INDEX_MAX_LOADED",
+        description="内存中最多保留的 ANN 索引数（每个项目的片段与摘要各占一个），超出后淘汰最久未使用的",
+    )
+    vector_index_persist_delay: float = Field(
+        default=10.0,
+        ge=0,
+        env="VECTOR_INDEX_PERSIST_DELAY",
+        description="索引改动后延迟写盘的秒数，期间的多次改动合并为一次写入",
+    )
+
+    # -------------------- 章节生成配置 --------------------
+    chapter_version_concurrency: int = Field(
+        default=3,
+        ge=1,
+        env="CHAPTER_VERSION_CONCURRENCY",
+        description="同一章节多个版本的最大并发生成数",
+    )
+
+    # -------------------- 异步生成任务配置 --------------------
+    generation_job_max_concurrent: int = Field(
+        default=4,
+        ge=1,
+        env="GENERATION_JOB_MAX_CONCURRENT",
+        description="每个进程同时执行的生成任务数",
+    )
+    generation_job_poll_interval: float = Field(
+        default=5.0,
+        gt=0,
+        env="GENERATION_JOB_POLL_INTERVAL",
+        description="生成任务池轮询待执行任务的间隔（秒），本进程提交的任务会立即唤醒",
+    )
+    generation_job_heartbeat_timeout: float = Field(
+        default=120.0,
+        ge=5,
+        env="GENERATION_JOB_HEARTBEAT_TIMEOUT",
+        description="执行中的任务超过该时长没有心跳时视为中断，重新领取执行（秒）",
+    )
 
     # -------------------- Linux.do OAuth 配置 --------------------
     linuxdo_client_id: Optional[str] = Field(default=None, env="LINUXDO_CLIENT_ID", description="Linux.do OAuth Client ID")
@@ -173,6 +356,103 @@ class Settings(BaseSettings):
     smtp_password: Optional[str] = Field(default=None, env="SMTP_PASSWORD", description="SMTP 登录密码")
     email_from: Optional[str] = Field(default=None, env="EMAIL_FROM", description="邮件发送方显示名或邮箱")
 
+    # -------------------- 配置缓存 --------------------
+    config_cache_ttl: float = Field(
+        default=60.0,
+        ge=0,
+        env="CONFIG_CACHE_TTL",
+        description="系统配置与凭证在进程内的缓存时间（秒），0 表示不缓存",
+    )
+
+    # -------------------- 提供商限流 --------------------
+    ai_provider_max_concurrent: int = Field(
+        default=10,
+        ge=0,
+        env="AI_PROVIDER_MAX_CONCURRENT",
+        description="ai_providers 表中没有对应记录时，单个 API Key 的默认并发上限（0 表示不限）",
+    )
+    ai_provider_rate_limit_per_minute: int = Field(
+        default=0,
+        ge=0,
+        env="AI_PROVIDER_RATE_LIMIT_PER_MINUTE",
+        description="ai_providers 表中没有对应记录时，单个 API Key 的默认每分钟请求数（0 表示不限）",
+    )
+
+    # -------------------- LLM 连接池配置 --------------------
+    llm_http_max_connections: int = Field(
+        default=100,
+        ge=1,
+        env="LLM_HTTP_MAX_CONNECTIONS",
+        description="每个提供方地址的最大并发连接数",
+    )
+    llm_http_max_keepalive_connections: int = Field(
+        default=20,
+        ge=0,
+        env="LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS",
+        description="每个提供方地址保持的空闲长连接数",
+    )
+    llm_http_keepalive_expiry: float = Field(
+        default=60.0,
+        ge=0,
+        env="LLM_HTTP_KEEPALIVE_EXPIRY",
+        description="空闲长连接的保留时间（秒）",
+    )
+    llm_http2_enabled: bool = Field(
+        default=True,
+        env="LLM_HTTP2_ENABLED",
+        description="是否对提供方启用 HTTP/2（需安装 h2）",
+    )
+    llm_http_max_clients: int = Field(
+        default=256,
+        ge=1,
+        env="LLM_HTTP_MAX_CLIENTS",
+        description="按 (地址, API Key) 缓存的 SDK 客户端数量上限",
+    )
+
+    # -------------------- LLM 端点熔断配置 --------------------
+    llm_breaker_failure_threshold: int = Field(
+        default=3,
+        ge=1,
+        env="LLM_BREAKER_FAILURE_THRESHOLD",
+        description="端点连续失败多少次后打开熔断",
+    )
+    llm_breaker_cooldown_seconds: float = Field(
+        default=30.0,
+        ge=0,
+        env="LLM_BREAKER_COOLDOWN_SECONDS",
+        description="熔断打开后多久放行一次探测请求（秒）",
+    )
+    llm_key_quota_cooldown_seconds: float = Field(
+        default=600.0,
+        ge=0,
+        env="LLM_KEY_QUOTA_COOLDOWN_SECONDS",
+        description="API Key 额度耗尽（insufficient_quota）后降级的时长（秒）",
+    )
+
+    # -------------------- LLM 响应缓存配置 --------------------
+    llm_response_cache_enabled: bool = Field(
+        default=True,
+        env="LLM_RESPONSE_CACHE_ENABLED",
+        description="是否启用 LLM 响应缓存，仅对 AI 功能配置中开启 cache 的功能生效",
+    )
+    llm_response_cache_path: Optional[str] = Field(
+        default=None,
+        env="LLM_RESPONSE_CACHE_PATH",
+        description="LLM 响应缓存 SQLite 文件路径，留空时使用 storage/llm_response_cache.db",
+    )
+    llm_response_cache_max_entries: int = Field(
+        default=20000,
+        ge=1,
+        env="LLM_RESPONSE_CACHE_MAX_ENTRIES",
+        description="LLM 响应缓存最多保留的条目数，超出后按最近使用时间淘汰",
+    )
+    llm_response_cache_max_age_seconds: float = Field(
+        default=7 * 24 * 3600.0,
+        gt=0,
+        env="LLM_RESPONSE_CACHE_MAX_AGE_SECONDS",
+        description="LLM 响应缓存条目的最长保留时间（秒），过期后重新调用模型",
+    )
+
     # -------------------- LLM 备用端点配置 --------------------
     llm_fallback_endpoints: Optional[str] = Field(
         default=None,
@@ -198,6 +478,23 @@ class Settings(BaseSettings):
         if candidate not in {"mysql", "sqlite"}:
             raise ValueError("DB_PROVIDER 仅支持 mysql 或 sqlite")
         return candidate
+
+    @validator("vector_storage_format", pre=True)
+    def _normalize_vector_storage_format(cls, value: Optional[str]) -> str:
+        """限制向量存储格式的取值范围。"""
+        candidate = (value or "float32").strip().lower()
+        if candidate not in {"float32", "float16", "int8"}:
+            raise ValueError("VECTOR_STORAGE_FORMAT 仅支持 float32、float16 或 int8")
+        return candidate
+
+    @validator("vector_retrieval_mode", pre=True)
+    def _normalize_vector_retrieval_mode(cls, value: Optional[str]) -> str:
+        """限制检索方式的取值范围。"""
+        candidate = (value or "vector").strip().lower()
+        if candidate not in {"vector", "lexical", "hybrid"}:
+            raise ValueError("VECTOR_RETRIEVAL_MODE 仅支持 vector、lexical 或 hybrid")
+        return candidate
+
     @validator("embedding_provider", pre=True)
     def _normalize_embedding_provider(cls, value: Optional[str]) -> str:
         """限制嵌入模型提供方的取值范围。"""
@@ -9,7 +9,11 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from .core.config import settings
 from .db.init_db import init_db
+from .services.config_cache import get_config_cache
+from .services.generation_job_service import start_generation_job_processor, stop_generation_job_processor
 from .services.prompt_service import PromptService
+from .services.llm_http_clients import close_llm_http_clients
+from .services.vector_store_service import close_vector_store, init_vector_store
 from .db.session import AsyncSessionLocal
 from .api.routers import api_router
 
@@ -66,18 +70,30 @@ dictConfig(
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 应用启动时初始化数据库，并预热提示词缓存
+    # 应用启动时初始化数据库，并预热提示词与配置缓存
     await init_db()
     async with AsyncSessionLocal() as session:
         prompt_service = PromptService(session)
         await prompt_service.preload()
+        await get_config_cache().preload(session)
 
     # ✅ 修复：启动验证码缓存清理任务
     from .services.auth_service import start_cleanup_task
     start_cleanup_task()
 
+    # 创建应用级共享的向量库实例，建表检查只在启动时执行一次
+    await init_vector_store()
+
+    # 启动异步生成任务池，继续执行上次关闭时中断的任务
+    start_generation_job_processor(AsyncSessionLocal)
+
     yield
 
+    await stop_generation_job_processor()
+    await close_vector_store()
+    # 关闭 LLM / 嵌入提供方的共享连接池
+    await close_llm_http_clients()
+
 
 app = FastAPI(
     title=settings.app_name,
@@ -21,7 +21,7 @@ from .user import User
 from .user_daily_request import UserDailyRequest
 from .system_config import SystemConfig
 from .auto_generator import AutoGeneratorTask, AutoGeneratorLog
-from .async_task import PendingAnalysis, AnalysisNotification
+from .async_task import PendingAnalysis, AnalysisNotification, GenerationJob
 from .story_metrics import ChapterStoryMetrics  # ✅ 修复3：导入新模型
 
 __all__ = [
@@ -47,5 +47,6 @@ __all__ = [
     "AutoGeneratorLog",
     "PendingAnalysis",
     "AnalysisNotification",
+    "GenerationJob",
     "ChapterStoryMetrics",
 ]
@@ -160,3 +160,77 @@ class AnalysisNotification(Base):
         self.is_read = 1
         self.read_at = datetime.now(timezone.utc)
 
+
+
+class GenerationJob(Base):
+    """
+    异步生成任务
+
+    章节生成、大纲生成、蓝图生成、评估、去味等长耗时操作提交后立即返回任务ID，
+    由后台任务池执行。状态流转与 PendingAnalysis 一致：
+    pending -> processing -> completed / failed
+
+    进度与阶段性结果写入 progress，客户端断线重连后可继续轮询或订阅；
+    进程异常退出后，超过心跳超时的 processing 任务会被重新领取，
+    已完成的部分结果（如章节的已生成版本）在重试时复用。
+    领取、心跳与超时回收与 PendingAnalysis 共用 services/task_lease.py。
+    """
+    __tablename__ = "generation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # 关联信息
+    job_type = Column(String(64), nullable=False, index=True, comment="任务类型")
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    project_id = Column(String(36), ForeignKey("novel_projects.id"), nullable=True, index=True)
+
+    # 任务状态
+    status = Column(
+        String(32),
+        nullable=False,
+        default="pending",
+        index=True,
+        comment="pending, processing, completed, failed"
+    )
+
+    # 优先级（1-10，数字越大优先级越高）
+    priority = Column(Integer, default=5, nullable=False, index=True)
+
+    # 重试信息
+    retry_count = Column(Integer, default=0, nullable=False)
+    max_retries = Column(Integer, default=2, nullable=False)
+
+    # 请求参数与进度
+    payload = Column(JSON, nullable=True, comment="请求参数")
+    progress = Column(JSON, nullable=True, comment="当前阶段与阶段性结果")
+
+    # 结果信息
+    result = Column(JSON, nullable=True, comment="任务结果")
+    error_message = Column(Text, nullable=True, comment="错误信息")
+    error_type = Column(String(64), nullable=True, comment="错误类型")
+
+    # 时间信息
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True, comment="开始处理时间")
+    completed_at = Column(DateTime(timezone=True), nullable=True, comment="完成时间")
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # 性能指标
+    duration_seconds = Column(Integer, nullable=True, comment="处理耗时（秒）")
+
+    # 关系
+    project = relationship("NovelProject")
+    user = relationship("User")
+
+    def __repr__(self):
+        return f"<GenerationJob(id={self.id}, job_type={self.job_type}, status={self.status})>"
+
+    @property
+    def is_finished(self) -> bool:
+        """是否已结束（完成或失败）"""
+        return self.status in ("completed", "failed")
+
+    @property
+    def can_retry(self) -> bool:
+        """是否可以手动重试"""
+        return self.status == "failed"
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -47,3 +47,24 @@ class AdminNovelSummary(BaseModel):
     last_edited: str
     completed_chapters: int
     total_chapters: int
+
+
+class VectorReindexRequest(BaseModel):
+    project_ids: Optional[List[str]] = Field(default=None, description="仅回填指定项目，留空表示全部项目")
+    rebuild: bool = Field(default=False, description="忽略已有向量整章重建，更换嵌入模型后使用")
+    workers: Optional[int] = Field(default=None, ge=1, le=64, description="并发章节数，留空使用 VECTOR_REINDEX_WORKERS")
+
+
+class VectorReindexStatus(BaseModel):
+    status: str
+    rebuild: bool
+    total: int
+    processed: int
+    skipped: int
+    failed: int
+    remaining: int
+    embeddings: int
+    elapsed_seconds: float
+    chapters_per_minute: float
+    embeddings_per_second: float
+    error: Optional[str] = None
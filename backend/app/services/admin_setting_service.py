@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models import AdminSetting
 from ..repositories.admin_setting_repository import AdminSettingRepository
+from .config_cache import ADMIN_SETTING, get_config_cache
 
 
 class AdminSettingService:
@@ -14,7 +15,7 @@ class AdminSettingService:
         self.repo = AdminSettingRepository(session)
 
     async def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
-        value = await self.repo.get_value(key)
+        value = await get_config_cache().get_or_load(ADMIN_SETTING, key, lambda: self.repo.get_value(key))
         return value if value is not None else default
 
     async def set(self, key: str, value: str) -> None:
@@ -25,3 +26,4 @@ class AdminSettingService:
             setting = AdminSetting(key=key, value=value)
             await self.repo.add(setting)
         await self.session.commit()
+        get_config_cache().invalidate(ADMIN_SETTING, key)
@@ -2,14 +2,16 @@
 AI Orchestrator - AI功能路由和调度层
 
 根据功能类型自动选择对应的API提供商和模型
-支持fallback和重试机制
+支持fallback、重试与对冲请求（hedging）机制
 """
 
 import asyncio
 import json
 import logging
 import time
-from typing import Dict, List, Optional
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -19,12 +21,14 @@ from ..config.ai_function_config import (
     ProviderConfig,
     get_function_config,
 )
+from ..db.session import AsyncSessionLocal
 from ..models.ai_routing import AIFunctionCallLog
 from ..repositories.ai_routing_repository import (
     AIProviderRepository,
     AIFunctionRouteRepository,
     AIFunctionCallLogRepository,
 )
+from ..services.llm_response_cache import get_llm_response_cache, response_cache_key
 from ..services.llm_service import LLMService
 from ..utils.metrics import (
     ai_calls_total,
@@ -33,10 +37,36 @@ from ..utils.metrics import (
     ai_fallback_total,
     ai_error_total,
     ai_calls_in_progress,
+    ai_hedge_total,
+    ai_hedge_wins_total,
 )
 
 logger = logging.getLogger(__name__)
 
+# 首 token 延迟样本：按 (provider, model) 保留最近若干次，用于推算对冲延迟预算
+_FIRST_TOKEN_SAMPLES: Dict[Tuple[str, str], Deque[float]] = {}
+_FIRST_TOKEN_WINDOW = 200
+# 样本数达到该值后才用 p95 作为预算，之前使用配置的上限
+_MIN_HEDGE_SAMPLES = 20
+
+
+def _record_first_token(provider_config: ProviderConfig, seconds: float) -> None:
+    key = (provider_config.provider, provider_config.model)
+    samples = _FIRST_TOKEN_SAMPLES.get(key)
+    if samples is None:
+        samples = _FIRST_TOKEN_SAMPLES[key] = deque(maxlen=_FIRST_TOKEN_WINDOW)
+    samples.append(seconds)
+
+
+def _hedge_delay(config: FunctionRouteConfig) -> float:
+    """对冲延迟预算：主模型近期首 token 延迟的 p95，限制在配置的上下限之间。"""
+    samples = _FIRST_TOKEN_SAMPLES.get((config.primary.provider, config.primary.model))
+    if not samples or len(samples) < _MIN_HEDGE_SAMPLES:
+        return config.hedge_max_delay
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return min(config.hedge_max_delay, max(config.hedge_min_delay, p95))
+
 
 class AIOrchestrator:
     """AI功能调度器，负责根据功能类型路由到对应的模型"""
@@ -69,6 +99,8 @@ class AIOrchestrator:
         timeout: Optional[float] = None,
         user_id: Optional[int] = None,
         response_format: Optional[str] = "json_object",
+        use_cache: bool = True,
+        cache_validator: Optional[Callable[[str], bool]] = None,
     ) -> str:
         """
         执行AI功能调用
@@ -81,6 +113,8 @@ class AIOrchestrator:
             timeout: 超时时间（可选，默认使用配置中的值）
             user_id: 用户ID
             response_format: 响应格式
+            use_cache: 功能开启响应缓存时是否使用缓存（False 时强制重新调用模型）
+            cache_validator: 校验响应能否被调用方使用，不通过的响应不写入缓存，已缓存的会被删除
             
         Returns:
             LLM响应文本
@@ -108,9 +142,69 @@ class AIOrchestrator:
             f"执行AI功能: {function.value}, 主模型: {config.primary.provider}/{config.primary.model}"
         )
 
+        # 功能开启响应缓存时，按路由的主模型生成缓存键，命中时不再调用模型
+        cache = get_llm_response_cache(function) if use_cache else None
+        model = f"{config.primary.provider}/{config.primary.model}"
+        cache_key = None
+        if cache is not None:
+            cache_key = response_cache_key(function, model, messages, final_temperature, response_format)
+            cached = await cache.get(cache_key, function=function)
+            if cached is not None and cache_validator is not None and not cache_validator(cached):
+                logger.warning(f"AI功能 {function.value} 的缓存响应校验失败，已删除")
+                await cache.delete(cache_key)
+                cached = None
+            if cached is not None:
+                logger.info(f"AI功能 {function.value} 命中响应缓存")
+                return cached
+
+        response = await self._execute_routed(
+            function,
+            config,
+            messages,
+            final_temperature=final_temperature,
+            final_timeout=final_timeout,
+            user_id=user_id,
+            response_format=response_format,
+        )
+        # 可选功能全部失败时返回的默认值不写入缓存
+        if (
+            cache is not None
+            and response != self._get_default_response(function)
+            and (cache_validator is None or cache_validator(response))
+        ):
+            await cache.put(cache_key, function=function, model=model, response=response)
+        return response
+
+    async def _execute_routed(
+        self,
+        function: AIFunctionType,
+        config: FunctionRouteConfig,
+        messages: List[Dict[str, str]],
+        *,
+        final_temperature: float,
+        final_timeout: float,
+        user_id: Optional[int],
+        response_format: Optional[str],
+    ) -> str:
+        """按功能路由依次尝试主模型与备用模型（含对冲、重试与降级）。"""
         # ✅ 使用 try-finally 确保指标一定会被清理
         ai_calls_in_progress.labels(function=function.value).inc()
         try:
+            if config.hedge:
+                response = await self._execute_hedged(
+                    function,
+                    config,
+                    messages,
+                    temperature=final_temperature,
+                    timeout=final_timeout,
+                    user_id=user_id,
+                    response_format=response_format,
+                )
+                if response is not None:
+                    return response
+                # 对冲轮全部失败，按常规流程重试与降级
+                logger.warning(f"功能 {function.value} 对冲请求均失败，转入常规重试")
+
             # 构建尝试列表：主模型 + 备用模型
             attempts = [config.primary] + config.fallbacks
 
@@ -248,6 +342,10 @@ class AIOrchestrator:
 
                     # 如果还有重试机会，等待后重试
                     if retry < max_retries - 1:
+                        if error_type == "rate_limit":
+                            # 限流器已按 Retry-After 暂停该提供商，重试会在队列中等待放行
+                            logger.info("提供商限流，重试请求将排队等待")
+                            continue
                         wait_time = self._calculate_backoff(retry)
                         logger.info(f"等待 {wait_time}s 后重试...")
                         await asyncio.sleep(wait_time)
@@ -282,6 +380,168 @@ class AIOrchestrator:
             # ✅ 确保一定会执行，无论成功还是失败
             ai_calls_in_progress.labels(function=function.value).dec()
 
+    async def _execute_hedged(
+        self,
+        function: AIFunctionType,
+        config: FunctionRouteConfig,
+        messages: List[Dict[str, str]],
+        *,
+        temperature: float,
+        timeout: float,
+        user_id: Optional[int],
+        response_format: Optional[str],
+    ) -> Optional[str]:
+        """
+        对冲执行：主模型超过延迟预算仍未返回首个 token 时，并行请求备用模型
+        （未配置备用模型时再次请求主模型），先成功完成者胜出，另一路被取消。
+        两路各用独立的数据库会话，用量计数与配置读取不会并发使用同一会话，被取消的一路只回滚自己的会话。
+
+        Returns:
+            胜出的响应；两路都失败时返回 None，由调用方走常规重试流程
+        """
+        hedge_config = config.fallbacks[0] if config.fallbacks else config.primary
+        first_token = asyncio.Event()
+        started = time.monotonic()
+
+        def call(provider_config: ProviderConfig, is_fallback: bool) -> "asyncio.Task[str]":
+            async def run() -> str:
+                # 每一路从自己发起时计时，对冲一路的首 token 延迟不包含等待对冲的时间
+                call_started = time.monotonic()
+
+                def on_first_token() -> None:
+                    _record_first_token(provider_config, time.monotonic() - call_started)
+                    first_token.set()
+
+                async with self._isolated_llm_service() as llm_service:
+                    return await self._tracked_invoke(
+                        llm_service,
+                        function,
+                        provider_config,
+                        messages,
+                        is_fallback=is_fallback,
+                        temperature=temperature,
+                        timeout=timeout,
+                        user_id=user_id,
+                        response_format=response_format,
+                        on_first_token=on_first_token,
+                    )
+
+            return asyncio.create_task(run())
+
+        primary = call(config.primary, False)
+        tasks: Dict["asyncio.Task[str]", str] = {primary: "primary"}
+        winner: Optional["asyncio.Task[str]"] = None
+        try:
+            token_waiter = asyncio.create_task(first_token.wait())
+            await asyncio.wait(
+                {primary, token_waiter},
+                timeout=_hedge_delay(config),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            token_waiter.cancel()
+
+            if first_token.is_set() or primary.done():
+                # 主模型在预算内开始输出（或已结束），无需对冲
+                await asyncio.wait({primary})
+                if primary.exception() is None:
+                    winner = primary
+                return None if winner is None else winner.result()
+
+            logger.info(
+                f"功能 {function.value} 主模型 {time.monotonic() - started:.1f}s 未返回首个 token，"
+                f"发起对冲请求: {hedge_config.provider}/{hedge_config.model}"
+            )
+            ai_hedge_total.labels(
+                function=function.value,
+                primary_provider=config.primary.provider,
+                hedge_provider=hedge_config.provider,
+            ).inc()
+            tasks[call(hedge_config, bool(config.fallbacks))] = "hedge"
+
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+            if winner is not None:
+                ai_hedge_wins_total.labels(function=function.value, winner=tasks[winner]).inc()
+            return None if winner is None else winner.result()
+        finally:
+            # 取消仍在进行的另一路请求，释放其限流名额与连接
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 两路都结束后再用调用方的会话写调用日志
+            if winner is not None:
+                winner_config = config.primary if tasks[winner] == "primary" else hedge_config
+                await self._log_call(
+                    function=function,
+                    provider=winner_config.provider,
+                    model=winner_config.model,
+                    status="success",
+                    is_fallback=tasks[winner] == "hedge" and bool(config.fallbacks),
+                    fallback_count=0,
+                    duration_ms=int((time.monotonic() - started) * 1000),
+                    user_id=user_id,
+                    temperature=temperature,
+                    timeout=timeout,
+                    finish_reason="stop",
+                )
+
+    @asynccontextmanager
+    async def _isolated_llm_service(self) -> AsyncIterator[LLMService]:
+        """为对冲的一路创建使用独立会话的 LLMService；未绑定会话的服务直接复用。"""
+        if getattr(self.llm_service, "session", None) is None:
+            yield self.llm_service
+            return
+        async with AsyncSessionLocal() as session:
+            yield LLMService(session)
+
+    async def _tracked_invoke(
+        self,
+        llm_service: LLMService,
+        function: AIFunctionType,
+        provider_config: ProviderConfig,
+        messages: List[Dict[str, str]],
+        *,
+        is_fallback: bool,
+        temperature: float,
+        timeout: float,
+        user_id: Optional[int],
+        response_format: Optional[str],
+        on_first_token: Optional[Callable[[], None]],
+    ) -> str:
+        """单次调用并记录指标；被取消的调用不计入成功或失败。"""
+        call_start = time.time()
+        try:
+            response = await llm_service.invoke(
+                provider=provider_config.provider,
+                model=provider_config.model,
+                messages=messages,
+                temperature=temperature,
+                timeout=timeout,
+                response_format=response_format,
+                user_id=user_id,
+                on_first_token=on_first_token,
+            )
+        except Exception as e:
+            error_type = self._classify_error(e)
+            logger.warning(
+                f"❌ 对冲调用失败: {provider_config.provider}/{provider_config.model}, "
+                f"错误类型: {error_type}, 错误: {str(e)}"
+            )
+            ai_calls_total.labels(function=function.value, provider=provider_config.provider, status="failed").inc()
+            ai_error_total.labels(
+                function=function.value, provider=provider_config.provider, error_type=error_type
+            ).inc()
+            raise
+
+        ai_calls_total.labels(function=function.value, provider=provider_config.provider, status="success").inc()
+        ai_duration_seconds.labels(function=function.value, provider=provider_config.provider).observe(
+            time.time() - call_start
+        )
+        return response
+
     def _get_default_response(self, function: AIFunctionType) -> str:
         """
         为可选功能返回默认响应
@@ -300,6 +560,8 @@ class AIOrchestrator:
         """
         error_str = str(error).lower()
 
+        if getattr(error, "status_code", None) == 429:
+            return "rate_limit"
         if "timeout" in error_str:
             return "timeout"
         elif "rate" in error_str or "limit" in error_str:
@@ -4,7 +4,7 @@ AI Orchestrator 辅助函数
 提供便捷的方法来使用Orchestrator，简化现有代码的集成
 """
 import logging
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -25,6 +25,7 @@ async def call_ai_function(
     timeout: Optional[float] = None,
     user_id: Optional[int] = None,
     response_format: Optional[str] = "json_object",
+    use_cache: bool = True,
 ) -> str:
     """
     便捷方法：调用AI功能
@@ -49,6 +50,7 @@ async def call_ai_function(
         timeout=timeout,
         user_id=user_id,
         response_format=response_format,
+        use_cache=use_cache,
     )
 
 
@@ -120,6 +122,7 @@ async def generate_summary(
     system_prompt: Optional[str] = None,
     temperature: float = 0.15,
     timeout: float = 180.0,
+    use_cache: bool = True,
 ) -> str:
     """
     生成章节摘要
@@ -155,6 +158,7 @@ async def generate_summary(
         timeout=timeout,
         user_id=user_id,
         response_format=None,  # 摘要不需要JSON格式
+        use_cache=use_cache,
     )
 
 
@@ -178,6 +182,7 @@ async def evaluate_chapter(
         timeout=timeout,
         user_id=user_id,
         response_format="json_object",
+        use_cache=False,  # 用户主动重新评估时期望得到新的评估结果
     )
 
 
@@ -232,13 +237,21 @@ class OrchestratorWrapper:
         user_id: Optional[int] = None,
         timeout: float = 300.0,
         response_format: Optional[str] = "json_object",
+        cache_function: Optional[AIFunctionType] = None,
+        use_cache: bool = True,
+        cache_validator: Optional[Callable[[str], bool]] = None,
     ) -> str:
         """
         兼容原有的get_llm_response接口
         自动根据上下文选择合适的AI功能
+
+        与 LLMService 一致，只有显式传入 cache_function 时才使用响应缓存，
+        避免按超时推断出的功能类型误用缓存。
         """
         # 简单的启发式：根据temperature和timeout推断功能类型
-        if timeout >= 600:
+        if cache_function is not None:
+            function = cache_function
+        elif timeout >= 600:
             function = AIFunctionType.CHAPTER_CONTENT_WRITING
         elif timeout >= 360:
             function = AIFunctionType.OUTLINE_GENERATION
@@ -262,6 +275,8 @@ class OrchestratorWrapper:
             timeout=timeout,
             user_id=user_id,
             response_format=response_format,
+            use_cache=cache_function is not None and use_cache,
+            cache_validator=cache_validator,
         )
     
     async def get_summary(
@@ -272,6 +287,7 @@ class OrchestratorWrapper:
         user_id: Optional[int] = None,
         timeout: float = 180.0,
         system_prompt: Optional[str] = None,
+        use_cache: bool = True,
     ) -> str:
         """兼容原有的get_summary接口"""
         return await generate_summary(
@@ -281,6 +297,7 @@ class OrchestratorWrapper:
             system_prompt=system_prompt,
             temperature=temperature,
             timeout=timeout,
+            use_cache=use_cache,
         )
     
     # 其他方法直接委托给原始LLMService
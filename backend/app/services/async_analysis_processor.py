@@ -1,13 +1,15 @@
 """
 异步分析处理器
 
-后台定时扫描pending_analysis表，执行增强分析
+后台定时扫描pending_analysis表，执行增强分析。
+领取、心跳与超时回收与生成任务池共用 task_lease.TaskLease：
+多个进程同时轮询时同一任务只会被领取一次，执行中的任务定时续约，
+超过 processing_timeout 未续约才会被重新领取，被重新领取后旧执行者不会覆盖新状态。
 """
 import asyncio
 import logging
-from datetime import datetime, timezone, timedelta
 from typing import Optional, List, Callable
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import selectinload
 
@@ -20,6 +22,7 @@ from ..utils.metrics import (
     track_duration, enhanced_analysis_duration,
     record_token_usage
 )
+from .task_lease import Claim, TaskLease, lease_now
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +44,8 @@ class AsyncAnalysisProcessor:
         self.is_running = False
         self.max_concurrent = 3  # 最大并发数
         self.poll_interval = 10  # 轮询间隔（秒）
-        self.processing_timeout = 600  # 处理超时（秒）
+        self.processing_timeout = 600  # 心跳超时（秒），超时未续约的任务会被重新领取
+        self._lease = TaskLease(PendingAnalysis, name="增强分析任务")
     
     async def start(self):
         """启动处理器"""
@@ -66,69 +70,60 @@ class AsyncAnalysisProcessor:
         logger.info("异步分析处理器已停止")
     
     async def _process_batch(self):
-        """处理一批待处理任务
+        """领取一批待处理任务并发执行
 
         ✅ 修复：为每个任务创建独立session，避免并发冲突
         """
         try:
-            # 1. 查询待处理任务（使用临时session）
-            async with self.session_maker() as db:
-                pending_tasks = await self._get_pending_tasks(db, limit=self.max_concurrent)
+            # 1. 领取任务（带条件更新，其他进程不会领到同一任务）
+            claims = await self._claim_tasks(limit=self.max_concurrent)
 
-            if not pending_tasks:
+            if not claims:
                 return
 
-            logger.info(f"找到 {len(pending_tasks)} 个待处理任务")
+            logger.info(f"领取 {len(claims)} 个待处理任务")
 
             # 2. 并发处理（每个任务使用独立session）
-            tasks = [self._process_single_task(task.id) for task in pending_tasks]
+            tasks = [self._process_single_task(claim) for claim in claims]
             await asyncio.gather(*tasks, return_exceptions=True)
 
         except Exception as e:
             logger.error(f"批量处理失败: {e}", exc_info=True)
 
-    async def _get_pending_tasks(self, db: AsyncSession, limit: int = 10) -> List[PendingAnalysis]:
-        """获取待处理任务
+    async def _claim_tasks(self, limit: int = 10) -> List[Claim]:
+        """领取待处理任务
+
+        领取 pending 任务与心跳超时的 processing 任务，按优先级降序、创建时间升序；
+        心跳超时且重试次数耗尽的任务直接标记为失败。
 
         参数:
-            db: 数据库session
-            limit: 最大返回数量
+            limit: 最大领取数量
+
+        返回:
+            (任务ID, 领取凭证) 列表
         """
-        # 查询条件：
-        # 1. status = 'pending'
-        # 2. 或者 status = 'processing' 但超时（started_at < now - timeout）
-        timeout_threshold = datetime.now(timezone.utc) - timedelta(seconds=self.processing_timeout)
-
-        stmt = select(PendingAnalysis).where(
-            or_(
-                PendingAnalysis.status == 'pending',
-                and_(
-                    PendingAnalysis.status == 'processing',
-                    PendingAnalysis.started_at < timeout_threshold
-                )
-            )
-        ).order_by(
-            PendingAnalysis.priority.desc(),
-            PendingAnalysis.created_at.asc()
-        ).limit(limit)
+        async with self.session_maker() as db:
+            claimed, exhausted = await self._lease.claim(db, limit, stale_after=self.processing_timeout)
+        for row in exhausted:
+            logger.error(f"任务 {row.id} 执行中断且已达到最大重试次数，标记为失败")
+        return claimed
 
-        result = await db.execute(stmt)
-        return list(result.scalars().all())
-    
-    async def _process_single_task(self, pending_id: int):
+    async def _process_single_task(self, claim: Claim):
         """处理单个任务
 
         ✅ 修复：使用独立session，避免并发冲突
         ✅ 修复：预加载关系，避免MissingGreenlet错误
 
         参数:
-            pending_id: 待处理任务ID
+            claim: 领取凭证 (任务ID, started_at)，状态写入只在仍持有该凭证时生效
         """
+        pending_id, token = claim
         # 为每个任务创建独立的session
         async with self.session_maker() as db:
+            pending = None
+            heartbeat = None
             try:
                 # 1. 加载任务（✅ 预加载chapter、task和selected_version关系）
-                from ..models.novel import ChapterVersion
                 stmt = (
                     select(PendingAnalysis)
                     .where(PendingAnalysis.id == pending_id)
@@ -144,10 +139,14 @@ class AsyncAnalysisProcessor:
                     logger.warning(f"任务 {pending_id} 不存在")
                     return
 
-                # 2. 更新状态为processing
-                pending.status = 'processing'
-                pending.started_at = datetime.now(timezone.utc)
-                await db.commit()
+                # 2. 执行期间定时续约，避免长耗时分析被误判为超时而重复执行
+                heartbeat = asyncio.create_task(
+                    self._lease.keep_alive(
+                        self.session_maker,
+                        claim,
+                        interval=max(1.0, self.processing_timeout / 10),
+                    )
+                )
 
                 # 3. 发送开始通知
                 await self._send_notification(
@@ -162,62 +161,83 @@ class AsyncAnalysisProcessor:
                 with track_duration(enhanced_analysis_duration, mode='enhanced', feature='async_full'):
                     result = await self._execute_analysis(db, pending)
 
-                # 5. 保存结果
-                if result:
-                    pending.status = 'completed'
-                    pending.result = result
-                    pending.completed_at = datetime.now(timezone.utc)
-                    pending.duration_seconds = pending.elapsed_seconds
+                if not result:
+                    raise Exception("分析结果为空")
 
-                    # 发送完成通知
-                    await self._send_notification(
-                        db=db,
-                        pending=pending,
-                        notification_type='completed',
-                        title=f'第 {pending.chapter.chapter_number} 章增强分析已完成',
-                        message='角色状态、世界观等信息已更新',
-                        data=result
-                    )
+                # 5. 保存结果（任务已被重新领取时不覆盖新执行者的状态）
+                await db.commit()
+                now = lease_now()
+                saved = await self._lease.update_owned(
+                    self.session_maker,
+                    claim,
+                    {
+                        "status": "completed",
+                        "result": result,
+                        "completed_at": now,
+                        "updated_at": now,
+                        "duration_seconds": int((now - token).total_seconds()),
+                    },
+                )
+                if not saved:
+                    logger.warning(f"任务 {pending_id} 已被重新领取，不再写入本次结果")
+                    return
 
-                    await db.commit()
-                    record_success('enhanced', 'async_analysis')
-                    logger.info(f"任务 {pending_id} 处理成功")
+                # 发送完成通知
+                await self._send_notification(
+                    db=db,
+                    pending=pending,
+                    notification_type='completed',
+                    title=f'第 {pending.chapter.chapter_number} 章增强分析已完成',
+                    message='角色状态、世界观等信息已更新',
+                    data=result
+                )
 
-                    # ✅ 6. 记录剧情指标（用于自动分卷）
-                    await self._record_story_metrics(db, pending, result)
+                record_success('enhanced', 'async_analysis')
+                logger.info(f"任务 {pending_id} 处理成功")
 
-                    # ✅ 7. 评估是否需要自动分卷
-                    await self._evaluate_volume_split(db, pending)
-                else:
-                    raise Exception("分析结果为空")
+                # ✅ 6. 记录剧情指标（用于自动分卷）
+                await self._record_story_metrics(db, pending, result)
+
+                # ✅ 7. 评估是否需要自动分卷
+                await self._evaluate_volume_split(db, pending)
 
             except Exception as e:
-                # 处理失败
-                pending.status = 'failed'
-                pending.error_message = str(e)
-                pending.error_type = type(e).__name__
-                pending.retry_count += 1
-                pending.completed_at = datetime.now(timezone.utc)
+                # 处理失败：可以重试时退回pending，否则标记为failed
+                retry_count = (pending.retry_count if pending else 0) + 1
+                can_retry = pending is not None and retry_count < pending.max_retries
+                now = lease_now()
+                await self._lease.update_owned(
+                    self.session_maker,
+                    claim,
+                    {
+                        "status": "pending" if can_retry else "failed",
+                        "error_message": str(e),
+                        "error_type": type(e).__name__,
+                        "retry_count": retry_count,
+                        "completed_at": now,
+                        "updated_at": now,
+                    },
+                )
 
                 # 发送失败通知
-                await self._send_notification(
-                    db=db,
-                    pending=pending,
-                    notification_type='failed',
-                    title=f'第 {pending.chapter.chapter_number} 章增强分析失败',
-                    message=f'错误: {str(e)}'
-                )
+                if pending is not None:
+                    await self._send_notification(
+                        db=db,
+                        pending=pending,
+                        notification_type='failed',
+                        title=f'第 {pending.chapter.chapter_number} 章增强分析失败',
+                        message=f'错误: {str(e)}'
+                    )
 
                 record_failure('enhanced', 'async_analysis', e)
                 logger.error(f"任务 {pending_id} 处理失败: {e}", exc_info=True)
 
-                # 如果可以重试，重置为pending
-                if pending.can_retry:
-                    pending.status = 'pending'
-                    logger.info(f"任务 {pending_id} 将重试 ({pending.retry_count}/{pending.max_retries})")
+                if can_retry:
+                    logger.info(f"任务 {pending_id} 将重试 ({retry_count}/{pending.max_retries})")
+            finally:
+                if heartbeat is not None:
+                    heartbeat.cancel()
 
-                await db.commit()
-    
     async def _execute_analysis(self, db: AsyncSession, pending: PendingAnalysis) -> Optional[dict]:
         """执行增强分析
 
@@ -18,6 +18,7 @@ from sqlalchemy.orm import selectinload
 from ..models.auto_generator import AutoGeneratorLog, AutoGeneratorTask
 from ..models.novel import Chapter, ChapterOutline, BlueprintCharacter, NovelProject as Project, NovelBlueprint, Volume
 from ..schemas.novel import GenerateChapterRequest, BugFixMode
+from .chapter_version_generator import generate_versions
 from .novel_service import NovelService
 from ..utils.metrics import (
     track_duration, chapter_generation_duration,
@@ -437,9 +438,8 @@ class AutoGeneratorService:
             # 导入必要的服务和工具
             from .prompt_service import PromptService
             from .llm_service import LLMService
-            from .chapter_context_service import ChapterContextService
-            from .vector_store_service import VectorStoreService
-            from ..core.config import settings
+            from .chapter_context_service import ChapterContextService, resolve_chapter_window
+            from .vector_store_service import get_vector_store
             from ..utils.json_utils import remove_think_tags, unwrap_markdown_json
             from ..repositories.system_config_repository import SystemConfigRepository
             import json
@@ -543,19 +543,20 @@ class AutoGeneratorService:
                 raise ValueError("缺少写作提示词")
 
             # RAG 检索
-            vector_store = None
-            if settings.vector_store_enabled:
-                try:
-                    vector_store = VectorStoreService()
-                except Exception as e:
-                    logger.warning(f"Failed to initialize VectorStoreService: {e}")
-                    vector_store = None
+            vector_store = get_vector_store()
 
             context_service = ChapterContextService(llm_service=llm_service, vector_store=vector_store)
+            min_chapter, max_chapter = resolve_chapter_window(
+                next_chapter_number,
+                outlines=project.outlines,
+                volumes=project.volumes,
+            )
             rag_context = await context_service.retrieve_for_generation(
                 project_id=task.project_id,
                 query_text=f"{outline.title}\n{outline.summary}",
                 user_id=task.user_id,
+                min_chapter=min_chapter,
+                max_chapter=max_chapter,
             )
 
             # 构建提示词
@@ -576,30 +577,32 @@ class AutoGeneratorService:
 
             # 生成版本
             version_count = task.generation_config.get("version_count", 2)
-            raw_versions = []
-
             # ✅ 使用AI路由系统生成章节内容
+            from ..db.session import AsyncSessionLocal
             from ..services.ai_orchestrator_helper import generate_chapter_content
 
-            for idx in range(version_count):
-                # 记录任务日志
-                await cls._log(
-                    db,
-                    task.id,
-                    "info",
-                    f"正在生成第 {next_chapter_number} 章的第 {idx + 1} 个版本（使用 SiliconFlow DeepSeek-V3）..."
-                )
+            # 记录任务日志
+            await cls._log(
+                db,
+                task.id,
+                "info",
+                f"正在并发生成第 {next_chapter_number} 章的 {version_count} 个版本（使用 SiliconFlow DeepSeek-V3）..."
+            )
 
+            async def _generate_single_version(idx: int) -> Dict:
                 logger.info(
                     f"开始调用AI功能: CHAPTER_CONTENT_WRITING, 章节: {next_chapter_number}, 版本: {idx + 1}"
                 )
 
-                response = await generate_chapter_content(
-                    db_session=db,
-                    system_prompt=writer_prompt,
-                    user_prompt=prompt_input,
-                    user_id=task.user_id,
-                )
+                # 各版本并发生成，每个版本使用独立会话，调用日志随该会话提交
+                async with AsyncSessionLocal() as version_db:
+                    response = await generate_chapter_content(
+                        db_session=version_db,
+                        system_prompt=writer_prompt,
+                        user_prompt=prompt_input,
+                        user_id=task.user_id,
+                    )
+                    await version_db.commit()
 
                 logger.info(
                     f"AI功能调用成功: CHAPTER_CONTENT_WRITING, 章节: {next_chapter_number}, 版本: {idx + 1}"
@@ -608,10 +611,20 @@ class AutoGeneratorService:
                 cleaned = remove_think_tags(response)
                 normalized = unwrap_markdown_json(cleaned)
                 try:
-                    raw_versions.append(json.loads(normalized))
+                    return json.loads(normalized)
                 except (json.JSONDecodeError, ValueError) as e:
                     logger.debug(f"Failed to parse JSON response, using raw content: {e}")
-                    raw_versions.append({"content": normalized})
+                    return {"content": normalized}
+
+            # 单个版本失败时保存其余成功的版本，全部失败才抛出异常
+            raw_versions = await generate_versions(version_count, _generate_single_version)
+            if len(raw_versions) < version_count:
+                await cls._log(
+                    db,
+                    task.id,
+                    "warning",
+                    f"第 {next_chapter_number} 章有 {version_count - len(raw_versions)} 个版本生成失败，已保存其余 {len(raw_versions)} 个版本"
+                )
 
             # 提取内容
             contents = []
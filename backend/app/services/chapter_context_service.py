@@ -6,16 +6,36 @@ from __future__ import annotations
 所有关键步骤均包含中文注释，方便团队理解 RAG 流程。
 """
 
+import asyncio
+import hashlib
 import logging
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, TypeVar
 
 from ..core.config import settings
 from ..services.llm_service import LLMService
+from ..utils.ttl_cache import TTLCache
+from .lexical_index import LexicalDocument, ProjectLexicalIndex, get_lexical_index_manager, reciprocal_rank_fusion
 from .vector_store_service import RetrievedChunk, RetrievedSummary, VectorStoreService
 
 logger = logging.getLogger(__name__)
 
+RETRIEVAL_VECTOR = "vector"
+RETRIEVAL_LEXICAL = "lexical"
+RETRIEVAL_HYBRID = "hybrid"
+
+T = TypeVar("T", RetrievedChunk, RetrievedSummary)
+
+# 进程级缓存：同一章节多版本生成、重试或重新生成时复用查询向量与检索结果
+_QUERY_EMBEDDING_CACHE: TTLCache[List[float]] = TTLCache(
+    maxsize=settings.vector_query_cache_size,
+    ttl=settings.vector_query_cache_ttl,
+)
+_RETRIEVAL_CACHE: TTLCache[Tuple[List[RetrievedChunk], List[RetrievedSummary]]] = TTLCache(
+    maxsize=settings.vector_query_cache_size,
+    ttl=settings.vector_query_cache_ttl,
+)
+
 
 @dataclass
 class ChapterRAGContext:
@@ -45,6 +65,41 @@ class ChapterRAGContext:
         return lines
 
 
+def resolve_chapter_window(
+    chapter_number: int,
+    *,
+    outlines: Sequence[Any] = (),
+    volumes: Sequence[Any] = (),
+    window_chapters: Optional[int] = None,
+    window_volumes: Optional[int] = None,
+) -> Tuple[Optional[int], int]:
+    """计算生成第 ``chapter_number`` 章时允许检索的章节闭区间 (min_chapter, max_chapter)。
+
+    上界固定为前一章，重新生成较早章节时不会引入其后的剧情；
+    下界由最近 N 章与最近 K 卷两种窗口共同决定，取较窄者，均未配置时不设下界。
+    """
+    window_chapters = settings.vector_retrieval_window_chapters if window_chapters is None else window_chapters
+    window_volumes = settings.vector_retrieval_window_volumes if window_volumes is None else window_volumes
+
+    lower_bounds: List[int] = []
+    if window_chapters > 0:
+        lower_bounds.append(chapter_number - window_chapters)
+    if window_volumes > 0:
+        # 章节所属卷以大纲为准，volume_id 映射到卷序号
+        volume_numbers: Dict[Any, int] = {volume.id: volume.volume_number for volume in volumes}
+        chapter_volumes = {
+            outline.chapter_number: volume_numbers[outline.volume_id]
+            for outline in outlines
+            if outline.volume_id in volume_numbers
+        }
+        current = chapter_volumes.get(chapter_number)
+        if current is not None:
+            first_volume = current - window_volumes + 1
+            starts = [number for number, volume in chapter_volumes.items() if volume >= first_volume]
+            lower_bounds.append(min(starts))
+    return (max(lower_bounds) if lower_bounds else None), chapter_number - 1
+
+
 class ChapterContextService:
     """章节上下文服务，整合查询、格式化与容错逻辑。"""
 
@@ -65,37 +120,233 @@ class ChapterContextService:
         user_id: int,
         top_k_chunks: Optional[int] = None,
         top_k_summaries: Optional[int] = None,
+        min_chapter: Optional[int] = None,
+        max_chapter: Optional[int] = None,
+        mode: Optional[str] = None,
     ) -> ChapterRAGContext:
-        """根据章节摘要构造检索向量，并返回 RAG 上下文。"""
+        """根据章节摘要构造检索向量，并返回 RAG 上下文。
+
+        ``min_chapter`` / ``max_chapter`` 限定检索的章节闭区间，可由 :func:`resolve_chapter_window` 计算。
+        ``mode`` 为 vector / lexical / hybrid，缺省读取 VECTOR_RETRIEVAL_MODE；
+        向量检索不可用（嵌入失败或混合模式下超时）时返回本地词法检索结果。
+        """
         query = self._normalize(query_text)
         if not settings.vector_store_enabled or not self._vector_store:
             logger.error("向量库未启用或初始化失败，跳过检索: project=%s", project_id)
             return ChapterRAGContext(query=query, chunks=[], summaries=[])
 
-        # get_embedding 会自动根据配置选择正确的模型
-        embedding = await self._llm_service.get_embedding(query, user_id=user_id)
-        if not embedding:
-            logger.warning("检索查询向量生成失败: project=%s chapter_query=%s", project_id, query)
-            return ChapterRAGContext(query=query, chunks=[], summaries=[])
-
-        chunks = await self._vector_store.query_chunks(
-            project_id=project_id,
-            embedding=embedding,
-            top_k=top_k_chunks,
-        )
-        summaries = await self._vector_store.query_summaries(
-            project_id=project_id,
-            embedding=embedding,
-            top_k=top_k_summaries,
+        mode = mode or settings.vector_retrieval_mode
+        # 词法检索不依赖嵌入模型，结果缓存键中的模型留空
+        model_key = "" if mode == RETRIEVAL_LEXICAL else await self._llm_service.get_embedding_model_key()
+        query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()
+        top_k_chunks = top_k_chunks or settings.vector_top_k_chunks
+        top_k_summaries = top_k_summaries or settings.vector_top_k_summaries
+        # 项目向量数据变化后版本号递增，旧的检索结果自然失效
+        result_key = (
+            project_id,
+            self._vector_store.project_generation(project_id),
+            model_key,
+            query_hash,
+            top_k_chunks,
+            top_k_summaries,
+            min_chapter,
+            max_chapter,
+            mode,
         )
+        cached = _RETRIEVAL_CACHE.get(result_key)
+        if cached is not None:
+            chunks, summaries = cached
+            logger.info(
+                "章节上下文命中缓存: project=%s chunks=%d summaries=%d",
+                project_id,
+                len(chunks),
+                len(summaries),
+            )
+            return ChapterRAGContext(query=query, chunks=list(chunks), summaries=list(summaries))
+
+        search_kwargs = {
+            "project_id": project_id,
+            "query": query,
+            "top_k_chunks": top_k_chunks,
+            "top_k_summaries": top_k_summaries,
+            "min_chapter": min_chapter,
+            "max_chapter": max_chapter,
+        }
+        embedding_task: Optional["asyncio.Future[List[float]]"] = None
+        if mode != RETRIEVAL_LEXICAL:
+            # 先发出查询向量请求，等待期间完成本地词法检索
+            embedding_task = asyncio.ensure_future(
+                self._query_embedding(query=query, model_key=model_key, query_hash=query_hash, user_id=user_id)
+            )
+        lexical = await self._lexical_search(**search_kwargs) if mode != RETRIEVAL_VECTOR else None
+
+        embedding: List[float] = []
+        if embedding_task is not None:
+            timeout = settings.vector_query_embedding_timeout if mode == RETRIEVAL_HYBRID else 0
+            try:
+                # shield：超时后请求继续完成并写入查询向量缓存，供下次检索使用
+                embedding = await asyncio.wait_for(asyncio.shield(embedding_task), timeout or None)
+            except asyncio.TimeoutError:
+                logger.warning("查询向量超时(%.1fs)，使用词法检索结果: project=%s", timeout, project_id)
+
+        if mode == RETRIEVAL_LEXICAL:
+            chunks, summaries = lexical  # type: ignore[misc]
+        elif not embedding:
+            # 嵌入失败或超时时退回词法结果，降级结果不缓存，下次仍会尝试向量检索
+            chunks, summaries = lexical if lexical is not None else await self._lexical_search(**search_kwargs)
+            logger.warning(
+                "向量检索不可用，使用词法检索结果: project=%s chunks=%d summaries=%d",
+                project_id,
+                len(chunks),
+                len(summaries),
+            )
+            return ChapterRAGContext(query=query, chunks=list(chunks), summaries=list(summaries))
+        else:
+            chunks, summaries = await asyncio.gather(
+                self._vector_store.query_chunks(
+                    project_id=project_id,
+                    embedding=embedding,
+                    top_k=top_k_chunks,
+                    min_chapter=min_chapter,
+                    max_chapter=max_chapter,
+                ),
+                self._vector_store.query_summaries(
+                    project_id=project_id,
+                    embedding=embedding,
+                    top_k=top_k_summaries,
+                    min_chapter=min_chapter,
+                    max_chapter=max_chapter,
+                ),
+            )
+            if lexical is not None:
+                chunks = self._fuse(chunks, lexical[0], top_k_chunks, key=self._chunk_key)
+                summaries = self._fuse(summaries, lexical[1], top_k_summaries, key=lambda item: item.chapter_number)
+
+        if chunks or summaries:
+            # 空结果可能来自查询失败，不缓存
+            _RETRIEVAL_CACHE.set(result_key, (chunks, summaries))
         logger.info(
-            "章节上下文检索完成: project=%s chunks=%d summaries=%d query_preview=%s",
+            "章节上下文检索完成: project=%s mode=%s range=%s-%s chunks=%d summaries=%d query_preview=%s",
             project_id,
+            mode,
+            min_chapter if min_chapter is not None else "",
+            max_chapter if max_chapter is not None else "",
             len(chunks),
             len(summaries),
             query[:80],
         )
-        return ChapterRAGContext(query=query, chunks=chunks, summaries=summaries)
+        return ChapterRAGContext(query=query, chunks=list(chunks), summaries=list(summaries))
+
+    async def _query_embedding(self, *, query: str, model_key: str, query_hash: str, user_id: int) -> List[float]:
+        """获取查询向量，优先读取进程级缓存；失败时返回空列表。"""
+        embedding_key = (model_key, query_hash)
+        embedding = _QUERY_EMBEDDING_CACHE.get(embedding_key)
+        if embedding is not None:
+            return embedding
+        try:
+            # get_embedding 会自动根据配置选择正确的模型
+            embedding = await self._llm_service.get_embedding(query, user_id=user_id)
+        except Exception as exc:  # noqa: BLE001 - 查询向量失败时由词法检索兜底
+            logger.warning("检索查询向量生成异常: %s", exc)
+            return []
+        if not embedding:
+            logger.warning("检索查询向量生成失败: chapter_query=%s", query[:80])
+            return []
+        _QUERY_EMBEDDING_CACHE.set(embedding_key, embedding)
+        return embedding
+
+    async def _lexical_search(
+        self,
+        *,
+        project_id: str,
+        query: str,
+        top_k_chunks: int,
+        top_k_summaries: int,
+        min_chapter: Optional[int],
+        max_chapter: Optional[int],
+    ) -> Tuple[List[RetrievedChunk], List[RetrievedSummary]]:
+        """在本地词法索引中检索片段与摘要，score 为 1 / (1 + BM25)，越小越相关。"""
+        chunk_index = await self._lexical_index("rag_chunks", project_id)
+        summary_index = await self._lexical_index("rag_summaries", project_id)
+        chunks: List[RetrievedChunk] = []
+        summaries: List[RetrievedSummary] = []
+        if chunk_index is not None:
+            for doc_id, score in chunk_index.search(
+                query, top_k_chunks, min_chapter=min_chapter, max_chapter=max_chapter
+            ):
+                document = chunk_index.get(doc_id)
+                chunks.append(
+                    RetrievedChunk(
+                        content=document.text,
+                        chapter_number=document.chapter_number,
+                        chapter_title=document.title,
+                        score=1.0 / (1.0 + score),
+                        metadata=dict(document.metadata),
+                    )
+                )
+        if summary_index is not None:
+            for doc_id, score in summary_index.search(
+                query, top_k_summaries, min_chapter=min_chapter, max_chapter=max_chapter
+            ):
+                document = summary_index.get(doc_id)
+                summaries.append(
+                    RetrievedSummary(
+                        chapter_number=document.chapter_number,
+                        title=document.title or "",
+                        summary=document.text,
+                        score=1.0 / (1.0 + score),
+                    )
+                )
+        return chunks, summaries
+
+    async def _lexical_index(self, table: str, project_id: str) -> Optional[ProjectLexicalIndex]:
+        store = self._vector_store
+
+        async def load_documents() -> Optional[List[LexicalDocument]]:
+            rows = await store.fetch_documents(table, project_id)  # type: ignore[union-attr]
+            if rows is None:
+                return None
+            return [
+                LexicalDocument(
+                    id=str(row.get("id")),
+                    chapter_number=int(row.get("chapter_number") or 0),
+                    title=row.get("title"),
+                    text=row.get("text") or "",
+                    metadata=row.get("metadata") or {},
+                )
+                for row in rows
+            ]
+
+        async def fingerprint_documents() -> Optional[str]:
+            return await store.fingerprint_documents(table, project_id)  # type: ignore[union-attr]
+
+        return await get_lexical_index_manager().get_or_build(
+            table,
+            project_id,
+            load_documents=load_documents,
+            fingerprint_documents=fingerprint_documents,
+        )
+
+    @staticmethod
+    def _chunk_key(chunk: RetrievedChunk) -> Hashable:
+        return chunk.metadata.get("chunk_id") or (chunk.chapter_number, chunk.content)
+
+    @staticmethod
+    def _fuse(vector_hits: Sequence[T], lexical_hits: Sequence[T], top_k: int, *, key: Callable[[T], Hashable]) -> List[T]:
+        """按倒数排名融合两路结果，score 改写为 1 - 归一化融合得分（两路均排第一时为 0）。"""
+        rrf_k = settings.vector_hybrid_rrf_k
+        items: Dict[Hashable, T] = {}
+        for item in list(vector_hits) + list(lexical_hits):
+            items.setdefault(key(item), item)
+        fused = reciprocal_rank_fusion(
+            [[key(item) for item in vector_hits], [key(item) for item in lexical_hits]],
+            k=rrf_k,
+        )
+        results: List[T] = []
+        for item_key, fused_score in fused[:top_k]:
+            item = replace(items[item_key], score=1.0 - fused_score * (rrf_k + 1) / 2)
+            results.append(item)
+        return results
 
     @staticmethod
     def _normalize(text: str) -> str:
@@ -106,4 +357,5 @@ class ChapterContextService:
 __all__ = [
     "ChapterContextService",
     "ChapterRAGContext",
+    "resolve_chapter_window",
 ]
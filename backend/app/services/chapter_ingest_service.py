@@ -6,12 +6,14 @@ from __future__ import annotations
 全部注释使用中文，方便团队成员阅读理解。
 """
 
+import hashlib
 import logging
 from typing import Dict, List, Optional, Sequence
 
 from ..core.config import settings
+from ..services.lexical_index import LexicalDocument, get_lexical_index_manager
 from ..services.llm_service import LLMService
-from ..services.vector_store_service import VectorStoreService
+from ..services.vector_store_service import VectorStoreService, get_vector_store
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +33,7 @@ class ChapterIngestionService:
         vector_store: Optional[VectorStoreService] = None,
     ) -> None:
         self._llm_service = llm_service
-        self._vector_store = vector_store or VectorStoreService()
+        self._vector_store = vector_store or get_vector_store()
         self._text_splitter = self._init_text_splitter()
 
     async def ingest_chapter(
@@ -43,34 +45,59 @@ class ChapterIngestionService:
         content: str,
         summary: Optional[str],
         user_id: int,
-    ) -> None:
-        """将章节正文与摘要写入向量库，供后续 RAG 检索使用。"""
-        if not settings.vector_store_enabled:
+        rebuild: bool = False,
+    ) -> Optional[int]:
+        """将章节正文与摘要写入向量库，供后续 RAG 检索使用。
+
+        ``rebuild`` 为 True 时忽略已有向量、整章重新嵌入（例如更换嵌入模型后）。
+        写入成功时返回本次写入的片段与摘要向量条数，跳过或写入失败时返回 None。
+        """
+        if not settings.vector_store_enabled or self._vector_store is None:
             logger.warning("向量库未启用，跳过章节向量写入: project=%s chapter=%s", project_id, chapter_number)
-            return
+            return None
         if not content.strip():
             logger.warning("章节正文为空，跳过向量写入: project=%s chapter=%s", project_id, chapter_number)
-            return
+            return None
 
         chunks = self._split_into_chunks(content)
         if not chunks:
             logger.warning("章节正文切分后为空，跳过向量写入: project=%s chapter=%s", project_id, chapter_number)
-            return
+            return None
+
+        cleaned_summary = summary.strip() if summary else ""
+        chunk_ids = self._build_chunk_ids(project_id, chapter_number, chunks)
+
+        # 与向量库中已有片段比对：内容未变的片段 id 不变，无需重新嵌入或写入
+        state = None if rebuild else await self._vector_store.get_chapter_state(project_id, chapter_number)
+        existing = state.chunks if state is not None else {}
+        current_ids = set(chunk_ids)
+        added = [index for index, chunk_id in enumerate(chunk_ids) if chunk_id not in existing]
+        stale_ids = [chunk_id for chunk_id in existing if chunk_id not in current_ids]
+        moved = [
+            {"id": chunk_id, "chunk_index": index, "chapter_title": title}
+            for index, chunk_id in enumerate(chunk_ids)
+            if chunk_id in existing and existing[chunk_id] != (index, title)
+        ]
+        summary_changed = bool(cleaned_summary) and (
+            state is None or state.summary != cleaned_summary or state.summary_title != title
+        )
+        delete_summary = state is not None and not cleaned_summary and state.summary is not None
 
         logger.info(
-            "开始写入章节向量: project=%s chapter=%s chunks=%d",
+            "开始写入章节向量: project=%s chapter=%s chunks=%d added=%d removed=%d",
             project_id,
             chapter_number,
             len(chunks),
+            len(added),
+            len(stale_ids),
         )
-        await self._vector_store.delete_by_chapters(project_id, [chapter_number])
+
+        # 新增片段与摘要一起批量生成向量，摘要位于末尾
+        texts = [chunks[index] for index in added] + ([cleaned_summary] if summary_changed else [])
+        embeddings = await self._llm_service.get_embeddings(texts, user_id=user_id) if texts else []
 
         chunk_records = []
-        for index, chunk_text in enumerate(chunks):
-            embedding = await self._llm_service.get_embedding(
-                chunk_text,
-                user_id=user_id,
-            )
+        for index, embedding in zip(added, embeddings):
             if not embedding:
                 logger.warning(
                     "生成章节片段向量失败，已跳过: project=%s chapter=%s chunk=%s",
@@ -79,7 +106,7 @@ class ChapterIngestionService:
                     index,
                 )
                 continue
-            record_id = f"{project_id}:{chapter_number}:{index}"
+            record_id = chunk_ids[index]
             chunk_records.append(
                 {
                     "id": record_id,
@@ -87,60 +114,85 @@ class ChapterIngestionService:
                     "chapter_number": chapter_number,
                     "chunk_index": index,
                     "chapter_title": title,
-                    "content": chunk_text,
+                    "content": chunks[index],
                     "embedding": embedding,
                     "metadata": {
                         "chunk_id": record_id,
-                        "length": len(chunk_text),
+                        "length": len(chunks[index]),
                     },
                 }
             )
 
-        if chunk_records:
-            await self._vector_store.upsert_chunks(records=chunk_records)
+        summary_records = []
+        if summary_changed:
+            summary_embedding = embeddings[len(added)] if len(embeddings) > len(added) else []
+            if summary_embedding:
+                summary_records.append(
+                    {
+                        "id": f"{project_id}:{chapter_number}:summary",
+                        "project_id": project_id,
+                        "chapter_number": chapter_number,
+                        "title": title,
+                        "summary": cleaned_summary,
+                        "embedding": summary_embedding,
+                    }
+                )
+            else:
+                logger.warning(
+                    "生成章节摘要向量失败，已跳过: project=%s chapter=%s",
+                    project_id,
+                    chapter_number,
+                )
+
+        if added and not chunk_records:
+            # 新片段全部嵌入失败时不写入，整章替换会清空该章的检索数据
+            logger.error("章节片段向量全部生成失败，已保留旧数据: project=%s chapter=%s", project_id, chapter_number)
+            return None
+
+        if state is None:
+            # 重建模式或无法读取现存状态时整章替换，删除旧向量与写入新向量在同一事务中完成
+            written = await self._vector_store.replace_chapter(
+                project_id=project_id,
+                chapter_number=chapter_number,
+                chunk_records=chunk_records,
+                summary_records=summary_records,
+            )
+        else:
+            written = await self._vector_store.sync_chapter(
+                project_id=project_id,
+                chapter_number=chapter_number,
+                chunk_records=chunk_records,
+                stale_chunk_ids=stale_ids,
+                moved_chunks=moved,
+                summary_records=summary_records,
+                delete_summary=delete_summary,
+            )
+        if written:
+            self._sync_lexical_index(
+                project_id=project_id,
+                chapter_number=chapter_number,
+                chunk_records=chunk_records,
+                summary_records=summary_records,
+                stale_chunk_ids=stale_ids,
+                moved_chunks=moved,
+                replace=state is None,
+                delete_summary=delete_summary,
+            )
             logger.info(
-                "章节正文向量写入完成: project=%s chapter=%s 成功片段=%d",
+                "章节向量写入完成: project=%s chapter=%s 新增片段=%d 删除片段=%d 摘要=%d",
                 project_id,
                 chapter_number,
                 len(chunk_records),
+                len(stale_ids),
+                len(summary_records),
             )
-
-        if summary:
-            cleaned_summary = summary.strip()
-            if cleaned_summary:
-                summary_embedding = await self._llm_service.get_embedding(
-                    cleaned_summary,
-                    user_id=user_id,
-                )
-                if summary_embedding:
-                    summary_id = f"{project_id}:{chapter_number}:summary"
-                    await self._vector_store.upsert_summaries(
-                        records=[
-                            {
-                                "id": summary_id,
-                                "project_id": project_id,
-                                "chapter_number": chapter_number,
-                                "title": title,
-                                "summary": cleaned_summary,
-                                "embedding": summary_embedding,
-                            }
-                        ]
-                    )
-                    logger.info(
-                        "章节摘要向量写入完成: project=%s chapter=%s",
-                        project_id,
-                        chapter_number,
-                    )
-                else:
-                    logger.warning(
-                        "生成章节摘要向量失败，已跳过: project=%s chapter=%s",
-                        project_id,
-                        chapter_number,
-                    )
+            return len(chunk_records) + len(summary_records)
+        logger.error("章节向量写入失败，已保留旧数据: project=%s chapter=%s", project_id, chapter_number)
+        return None
 
     async def delete_chapters(self, project_id: str, chapter_numbers: Sequence[int]) -> None:
         """从向量库中删除指定章节的所有片段与摘要。"""
-        if not settings.vector_store_enabled or not chapter_numbers:
+        if not settings.vector_store_enabled or self._vector_store is None or not chapter_numbers:
             return
         logger.info(
             "准备删除章节向量: project=%s chapters=%s",
@@ -148,6 +200,72 @@ class ChapterIngestionService:
             list(chapter_numbers),
         )
         await self._vector_store.delete_by_chapters(project_id, list(chapter_numbers))
+        manager = get_lexical_index_manager()
+        for table in ("rag_chunks", "rag_summaries"):
+            index = manager.get_loaded(table, project_id)
+            if index is not None:
+                index.remove_chapters(chapter_numbers)
+
+    @staticmethod
+    def _sync_lexical_index(
+        *,
+        project_id: str,
+        chapter_number: int,
+        chunk_records: Sequence[Dict],
+        summary_records: Sequence[Dict],
+        stale_chunk_ids: Sequence[str],
+        moved_chunks: Sequence[Dict],
+        replace: bool,
+        delete_summary: bool,
+    ) -> None:
+        """将本次写入同步到已加载的词法索引；未加载的索引会在下次检索时从向量库构建。"""
+        manager = get_lexical_index_manager()
+        chunk_index = manager.get_loaded("rag_chunks", project_id)
+        if chunk_index is not None:
+            if replace:
+                chunk_index.remove_chapters([chapter_number])
+            else:
+                chunk_index.remove_ids(stale_chunk_ids)
+                chunk_index.update_titles({item["id"]: item["chapter_title"] for item in moved_chunks})
+            chunk_index.add(
+                LexicalDocument(
+                    id=record["id"],
+                    chapter_number=chapter_number,
+                    title=record["chapter_title"],
+                    text=record["content"],
+                    metadata=record["metadata"],
+                )
+                for record in chunk_records
+            )
+        summary_index = manager.get_loaded("rag_summaries", project_id)
+        if summary_index is not None:
+            if replace or delete_summary:
+                summary_index.remove_chapters([chapter_number])
+            summary_index.add(
+                LexicalDocument(
+                    id=record["id"],
+                    chapter_number=chapter_number,
+                    title=record["title"],
+                    text=record["summary"],
+                )
+                for record in summary_records
+            )
+
+    @staticmethod
+    def _build_chunk_ids(project_id: str, chapter_number: int, chunks: Sequence[str]) -> List[str]:
+        """按片段内容哈希生成 id，插入或删除段落不会改变其他片段的 id。
+
+        同一章节内完全相同的片段按出现顺序追加序号以保证唯一。
+        """
+        seen: Dict[str, int] = {}
+        ids: List[str] = []
+        for chunk_text in chunks:
+            digest = hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()[:16]
+            occurrence = seen.get(digest, 0)
+            seen[digest] = occurrence + 1
+            suffix = f"-{occurrence}" if occurrence else ""
+            ids.append(f"{project_id}:{chapter_number}:{digest}{suffix}")
+        return ids
 
     def _split_into_chunks(self, text: str) -> List[str]:
         """按照配置的 chunk 大小与重叠度切分章节正文。"""
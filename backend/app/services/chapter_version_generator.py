@@ -0,0 +1,54 @@
+"""
+章节多版本并发生成
+
+写作接口与自动生成器都需要为同一章节生成多个版本。各版本的提示词相同、互不依赖，
+因此并发发起，墙钟时间接近单个版本；并发数受 chapter_version_concurrency 约束，
+每个 API Key 的并发与速率仍由提供商限流器兜底。
+
+单个版本失败不影响其他版本，成功的版本按原顺序返回；全部失败时抛出第一个版本的异常。
+调用方需为每个版本使用独立的数据库会话，AsyncSession 不支持并发操作。
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def generate_versions(
+    version_count: int,
+    generate_one: Callable[[int], Awaitable[T]],
+    *,
+    concurrency: Optional[int] = None,
+) -> List[T]:
+    """并发调用 generate_one(0..version_count-1)，返回成功的结果（保持版本顺序）。"""
+    semaphore = asyncio.Semaphore(max(1, concurrency or settings.chapter_version_concurrency))
+
+    async def run(idx: int) -> T:
+        async with semaphore:
+            return await generate_one(idx)
+
+    results = await asyncio.gather(*(run(idx) for idx in range(version_count)), return_exceptions=True)
+
+    succeeded: List[T] = []
+    errors: List[BaseException] = []
+    for idx, result in enumerate(results):
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            logger.warning("第 %s 个版本生成失败，已跳过: %s", idx + 1, result)
+            errors.append(result)
+        else:
+            succeeded.append(result)
+    if not succeeded and errors:
+        raise errors[0]
+    if errors:
+        logger.info("共 %s 个版本，成功 %s 个", version_count, len(succeeded))
+    return succeeded
+
+
+__all__ = ["generate_versions"]
@@ -0,0 +1,94 @@
+"""
+进程级配置 / 凭证缓存
+
+LLM 调用热路径上读取的 system_configs、admin_settings、用户自定义 LLM 配置
+与 AI 提供商凭证在首次读取后缓存在内存中，命中时不再查询数据库。
+管理员 / 用户修改配置的写入路径调用 invalidate 使对应条目立即失效；
+TTL 用于兜底其他进程（多 worker 部署）写入的变更。启动时 preload 预先加载
+全部 system_configs 与 admin_settings。
+"""
+import logging
+from typing import Awaitable, Callable, Hashable, Optional, Tuple, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..models import AdminSetting, SystemConfig
+from ..utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 缓存命名空间
+SYSTEM_CONFIG = "system_config"
+ADMIN_SETTING = "admin_setting"
+USER_LLM_CONFIG = "user_llm_config"
+PROVIDER_CREDENTIAL = "provider_credential"
+PROVIDER_LIMITS = "provider_limits"
+
+_MAX_ENTRIES = 4096
+
+
+class ConfigCache:
+    """按 (命名空间, 键) 缓存配置值，不存在的键同样缓存以免反复查询。"""
+
+    def __init__(self, *, ttl: float, maxsize: int = _MAX_ENTRIES) -> None:
+        # 值包装为单元素元组，区分"未缓存"与"缓存了 None"
+        self._cache: TTLCache[Tuple[object]] = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    async def get_or_load(self, namespace: str, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        cached = self._cache.get((namespace, key))
+        if cached is not None:
+            return cached[0]  # type: ignore[return-value]
+        value = await loader()
+        self._cache.set((namespace, key), (value,))
+        return value
+
+    def set(self, namespace: str, key: Hashable, value: object) -> None:
+        self._cache.set((namespace, key), (value,))
+
+    def invalidate(self, namespace: str, key: Optional[Hashable] = None) -> None:
+        """使单个键失效；未指定键时清空整个命名空间。"""
+        if key is not None:
+            self._cache.pop((namespace, key))
+            return
+        for cache_key in [item for item in self._cache.keys() if item[0] == namespace]:
+            self._cache.pop(cache_key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    async def preload(self, session: AsyncSession) -> int:
+        """加载全部 system_configs 与 admin_settings，返回条目数。"""
+        configs = (await session.execute(select(SystemConfig))).scalars().all()
+        admin_settings = (await session.execute(select(AdminSetting))).scalars().all()
+        for record in configs:
+            self.set(SYSTEM_CONFIG, record.key, record.value)
+        for record in admin_settings:
+            self.set(ADMIN_SETTING, record.key, record.value)
+        logger.info("配置缓存预热完成: system_configs=%d admin_settings=%d", len(configs), len(admin_settings))
+        return len(configs) + len(admin_settings)
+
+
+_cache = ConfigCache(ttl=settings.config_cache_ttl)
+
+
+def get_config_cache() -> ConfigCache:
+    """返回进程内共享的配置缓存。"""
+    return _cache
+
+
+__all__ = [
+    "ADMIN_SETTING",
+    "PROVIDER_CREDENTIAL",
+    "PROVIDER_LIMITS",
+    "SYSTEM_CONFIG",
+    "USER_LLM_CONFIG",
+    "ConfigCache",
+    "get_config_cache",
+]
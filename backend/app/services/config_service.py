@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..repositories.system_config_repository import SystemConfigRepository
 from ..models import SystemConfig
 from ..schemas.config import SystemConfigCreate, SystemConfigRead, SystemConfigUpdate
+from .config_cache import SYSTEM_CONFIG, get_config_cache
 
 
 class ConfigService:
@@ -30,6 +31,7 @@ class ConfigService:
             instance = SystemConfig(**payload.model_dump())
             await self.repo.add(instance)
         await self.session.commit()
+        get_config_cache().invalidate(SYSTEM_CONFIG, payload.key)
         return SystemConfigRead.model_validate(instance)
 
     async def patch_config(self, key: str, payload: SystemConfigUpdate) -> Optional[SystemConfigRead]:
@@ -38,6 +40,7 @@ class ConfigService:
             return None
         await self.repo.update_fields(instance, **payload.model_dump(exclude_unset=True))
         await self.session.commit()
+        get_config_cache().invalidate(SYSTEM_CONFIG, key)
         return SystemConfigRead.model_validate(instance)
 
     async def remove_config(self, key: str) -> bool:
@@ -46,4 +49,5 @@ class ConfigService:
             return False
         await self.repo.delete(instance)
         await self.session.commit()
+        get_config_cache().invalidate(SYSTEM_CONFIG, key)
         return True
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+"""
+跨请求的嵌入微批调度器：把并发到达的单条嵌入请求合并为一次多输入请求。
+
+同一（提供方, 模型, 连接）下的请求在 EMBEDDING_BATCH_WINDOW_MS 窗口内累积，
+达到 EMBEDDING_BATCH_SIZE 条时立即发送；结果按文本回填给各个等待方，
+相同文本在同一批次中只请求一次。发送并发受 EMBEDDING_MAX_CONCURRENCY 限制，
+从而降低提供方的限流压力。
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from ..utils.metrics import embedding_batcher_batch_size
+
+logger = logging.getLogger(__name__)
+
+SendBatch = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class _PendingBatch:
+    """正在累积中的批次。"""
+
+    def __init__(self, send: SendBatch) -> None:
+        self.send = send
+        self.futures: Dict[str, "asyncio.Future[List[float]]"] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class EmbeddingMicroBatcher:
+    """按键聚合嵌入请求，绑定创建时所在的事件循环。"""
+
+    def __init__(self, *, max_batch_size: int, max_wait: float, max_concurrency: int) -> None:
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._pending: Dict[Hashable, _PendingBatch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    async def submit(self, key: Hashable, text: str, send: SendBatch) -> List[float]:
+        """提交单条文本，等待所在批次完成后返回其向量；失败时返回空列表。
+
+        ``send`` 仅在该文本开启新批次时被采用，同一键下的请求需保证可互换。
+        """
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _PendingBatch(send)
+            self._pending[key] = batch
+            batch.timer = self._loop.call_later(self.max_wait, self._flush, key, batch)
+        future = batch.futures.get(text)
+        if future is None:
+            future = self._loop.create_future()
+            batch.futures[text] = future
+            if len(batch.futures) >= self.max_batch_size:
+                self._flush(key, batch)
+        # 调用方取消时不影响同批次中等待同一文本的其他请求
+        return await asyncio.shield(future)
+
+    def _flush(self, key: Hashable, batch: _PendingBatch) -> None:
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = self._loop.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: _PendingBatch) -> None:
+        texts = list(batch.futures)
+        embedding_batcher_batch_size.observe(len(texts))
+        vectors: List[List[float]]
+        async with self._semaphore:
+            try:
+                vectors = await batch.send(texts)
+            except Exception as exc:  # pragma: no cover - send 内部已处理常见错误
+                logger.error("嵌入批次发送失败: size=%d error=%s", len(texts), exc, exc_info=True)
+                vectors = []
+        if len(vectors) != len(texts):
+            vectors = [[] for _ in texts]
+        for text, vector in zip(texts, vectors):
+            future = batch.futures[text]
+            if not future.done():
+                future.set_result(vector)
+
+
+_batcher: Optional[EmbeddingMicroBatcher] = None
+
+
+def get_embedding_batcher(*, max_batch_size: int, max_wait: float, max_concurrency: int) -> EmbeddingMicroBatcher:
+    """返回当前事件循环共享的调度器，事件循环变化时重新创建。"""
+    global _batcher
+    loop = asyncio.get_running_loop()
+    if _batcher is None or _batcher.loop is not loop:
+        _batcher = EmbeddingMicroBatcher(
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            max_concurrency=max_concurrency,
+        )
+    return _batcher
+
+
+__all__ = ["EmbeddingMicroBatcher", "get_embedding_batcher"]
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+"""
+内容寻址的嵌入向量缓存：以（嵌入模型, 规范化文本哈希）为键，将向量持久化到本地 SQLite。
+
+章节编辑、版本切换或重新入库时，大部分片段文本并未变化，命中缓存即可跳过网络调用。
+缓存条目数受 EMBEDDING_CACHE_MAX_ENTRIES 限制，超出后按最近使用时间淘汰。
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..utils.metrics import embedding_cache_evictions_total, embedding_cache_requests_total
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """统一 Unicode 形式并折叠空白，避免仅排版不同的文本重复嵌入。"""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def content_key(model: str, text: str) -> str:
+    """生成缓存键：模型名与规范化文本共同参与哈希。"""
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """基于 SQLite 的嵌入缓存，所有磁盘操作在线程池中执行，不阻塞事件循环。"""
+
+    def __init__(self, path: Path, *, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    async def get_many(self, model: str, texts: Sequence[str]) -> Dict[int, List[float]]:
+        """批量查询缓存，返回 {输入下标: 向量}，未命中的下标不出现在结果中。"""
+        if not texts:
+            return {}
+        keys = [content_key(model, text) for text in texts]
+        try:
+            found = await asyncio.to_thread(self._get_many_sync, keys)
+        except sqlite3.Error as exc:
+            logger.warning("读取嵌入缓存失败，本次全部视为未命中: %s", exc)
+            found = {}
+
+        result = {index: found[key] for index, key in enumerate(keys) if key in found}
+        hits = len(result)
+        embedding_cache_requests_total.labels(result="hit").inc(hits)
+        embedding_cache_requests_total.labels(result="miss").inc(len(keys) - hits)
+        return result
+
+    async def put_many(self, model: str, items: Sequence[Tuple[str, Sequence[float]]]) -> None:
+        """写入（文本, 向量）列表，空向量会被忽略。"""
+        rows = [
+            (content_key(model, text), model, len(embedding), array("f", embedding).tobytes())
+            for text, embedding in items
+            if embedding
+        ]
+        if not rows:
+            return
+        try:
+            evicted = await asyncio.to_thread(self._put_many_sync, rows)
+        except sqlite3.Error as exc:
+            logger.warning("写入嵌入缓存失败: %s", exc)
+            return
+        if evicted:
+            embedding_cache_evictions_total.inc(evicted)
+            logger.debug("嵌入缓存超出上限，已淘汰 %d 条最久未使用的记录", evicted)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dimension INTEGER NOT NULL,
+                    embedding BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used)"
+            )
+            conn.commit()
+            self._conn = conn
+            logger.info("嵌入缓存已就绪: path=%s max_entries=%d", self.path, self.max_entries)
+        return self._conn
+
+    def _get_many_sync(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            conn = self._connection()
+            # SQLite 默认最多 999 个绑定参数，分段查询
+            for start in range(0, len(keys), 500):
+                segment = keys[start:start + 500]
+                placeholders = ",".join("?" for _ in segment)
+                rows = conn.execute(
+                    f"SELECT key, dimension, embedding FROM embedding_cache WHERE key IN ({placeholders})",
+                    segment,
+                ).fetchall()
+                for key, dimension, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    if len(vector) == dimension:
+                        found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embedding_cache SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                conn.commit()
+        return found
+
+    def _put_many_sync(self, rows: List[Tuple[str, str, int, bytes]]) -> int:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                """
+                INSERT INTO embedding_cache (key, model, dimension, embedding, last_used)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    dimension = excluded.dimension,
+                    embedding = excluded.embedding,
+                    last_used = excluded.last_used
+                """,
+                [(key, model, dimension, blob, now) for key, model, dimension, blob in rows],
+            )
+            total = conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+            overflow = total - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    """
+                    DELETE FROM embedding_cache WHERE key IN (
+                        SELECT key FROM embedding_cache ORDER BY last_used ASC LIMIT ?
+                    )
+                    """,
+                    (overflow,),
+                )
+            conn.commit()
+        return max(0, overflow)
+
+
+_CACHES: Dict[Path, EmbeddingCache] = {}
+
+
+def get_embedding_cache(path: Path, *, max_entries: int) -> EmbeddingCache:
+    """按文件路径返回进程内共享的缓存实例。"""
+    cache = _CACHES.get(path)
+    if cache is None:
+        cache = EmbeddingCache(path, max_entries=max_entries)
+        _CACHES[path] = cache
+    return cache
+
+
+__all__ = [
+    "EmbeddingCache",
+    "content_key",
+    "get_embedding_cache",
+    "normalize_text",
+]
@@ -0,0 +1,203 @@
+"""
+LLM 端点熔断与健康评分
+
+每个端点（Base URL + API Key + 模型）维护一个熔断器，状态在进程内所有请求间共享：
+- closed：正常使用，按 EWMA 首 token 延迟与错误率打分，分数低者优先
+- open：连续失败达到阈值后打开，冷却期内直接跳过，不再为死端点白等一个超时
+- half_open：冷却期结束后放行一个探测请求，成功则关闭熔断，失败则重新打开
+
+用户端点与备用端点分组排序，备用端点始终排在用户端点之后。组内按以下优先级挑选：
+未熔断 > 未被限流降级 > 进行中请求最少 > 健康分最低。用户配置多个 API Key 时，
+并发请求因此分摊到各个 Key 上（最少进行中请求），而不是全部压在第一个 Key 上；
+触发 429 的 Key 在 Retry-After 内降级，额度耗尽的 Key 降级更长时间。
+"""
+import hashlib
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from ..core.config import settings
+from ..utils.metrics import llm_endpoint_breaker_transitions_total
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# EWMA 平滑系数
+_ALPHA = 0.3
+# 错误率对分数的放大倍数：错误率 50% 的端点相当于延迟翻 3 倍
+_ERROR_WEIGHT = 4.0
+
+
+def endpoint_id(endpoint: Mapping[str, Any]) -> str:
+    """端点标识：不包含 API Key 明文。"""
+    raw = "|".join(str(endpoint.get(name) or "") for name in ("base_url", "api_key", "model"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class EndpointHealth:
+    id: str
+    host: str
+    model: Optional[str]
+    state: str = STATE_CLOSED
+    consecutive_failures: int = 0
+    opened_at: float = 0.0
+    # 半开状态下探测请求的放行凭证，None 表示没有探测请求在进行
+    probe_ticket: Optional[int] = None
+    in_flight: int = 0
+    throttled_until: float = 0.0
+    ewma_latency: Optional[float] = None
+    ewma_error_rate: float = 0.0
+    successes: int = 0
+    failures: int = 0
+    last_error: Optional[str] = None
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def score(self) -> float:
+        """越低越好；没有样本的端点视为 0，优先尝试。"""
+        return (self.ewma_latency or 0.0) * (1.0 + _ERROR_WEIGHT * self.ewma_error_rate)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "host": self.host,
+            "model": self.model,
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "throttled": self.throttled_until > time.monotonic(),
+            "score": round(self.score, 3),
+            "ewma_latency_seconds": None if self.ewma_latency is None else round(self.ewma_latency, 3),
+            "ewma_error_rate": round(self.ewma_error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class EndpointHealthRegistry:
+    """端点熔断器集合。"""
+
+    def __init__(self, *, failure_threshold: int, cooldown: float) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = max(0.0, cooldown)
+        self._endpoints: Dict[str, EndpointHealth] = {}
+        self._tickets = itertools.count(1)
+
+    def get(self, endpoint: Mapping[str, Any]) -> EndpointHealth:
+        key = endpoint_id(endpoint)
+        health = self._endpoints.get(key)
+        if health is None:
+            host = urlparse(str(endpoint.get("base_url") or "")).hostname or "default"
+            health = self._endpoints[key] = EndpointHealth(id=key, host=host, model=endpoint.get("model"))
+        return health
+
+    def order(self, groups: Sequence[Sequence[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """按组拼接端点，组内依次按熔断、限流降级、进行中请求数与健康分排序。"""
+        now = time.monotonic()
+
+        def rank(endpoint: Dict[str, Any]) -> Tuple[bool, bool, int, float]:
+            health = self.get(endpoint)
+            return health.state == STATE_OPEN, health.throttled_until > now, health.in_flight, health.score
+
+        ordered: List[Dict[str, Any]] = []
+        for group in groups:
+            ordered.extend(sorted(group, key=rank))
+        return ordered
+
+    def allow(self, endpoint: Mapping[str, Any]) -> Optional[int]:
+        """
+        判断本次请求能否使用该端点；冷却结束的熔断端点放行一个探测请求。
+
+        放行时返回凭证（正整数），请求结束后需原样传给 release；不放行时返回 None。
+        """
+        health = self.get(endpoint)
+        if health.state == STATE_OPEN:
+            if time.monotonic() - health.opened_at < self.cooldown:
+                return None
+            self._transition(health, STATE_HALF_OPEN)
+        ticket = next(self._tickets)
+        if health.state == STATE_HALF_OPEN:
+            if health.probe_ticket is not None:
+                return None
+            health.probe_ticket = ticket
+        health.in_flight += 1
+        return ticket
+
+    def release(self, endpoint: Mapping[str, Any], ticket: int) -> None:
+        """allow 放行的请求结束（包括未计入成败的结果与取消）时调用，释放进行中计数；探测请求结束时释放探测名额。"""
+        health = self.get(endpoint)
+        health.in_flight = max(0, health.in_flight - 1)
+        if health.probe_ticket == ticket:
+            health.probe_ticket = None
+
+    def record_throttled(self, endpoint: Mapping[str, Any], seconds: float) -> None:
+        """端点返回 429 时降级到组内末尾（熔断之前），不计入失败。"""
+        health = self.get(endpoint)
+        health.throttled_until = max(health.throttled_until, time.monotonic() + seconds)
+        health.updated_at = time.time()
+
+    def record_success(self, endpoint: Mapping[str, Any], latency: float) -> None:
+        health = self.get(endpoint)
+        health.successes += 1
+        health.consecutive_failures = 0
+        health.ewma_latency = latency if health.ewma_latency is None else (
+            _ALPHA * latency + (1 - _ALPHA) * health.ewma_latency
+        )
+        health.ewma_error_rate = (1 - _ALPHA) * health.ewma_error_rate
+        health.updated_at = time.time()
+        if health.state != STATE_CLOSED:
+            self._transition(health, STATE_CLOSED)
+
+    def record_failure(self, endpoint: Mapping[str, Any], error: str) -> None:
+        health = self.get(endpoint)
+        health.failures += 1
+        health.consecutive_failures += 1
+        health.ewma_error_rate = _ALPHA + (1 - _ALPHA) * health.ewma_error_rate
+        health.last_error = error[:200]
+        health.updated_at = time.time()
+        if health.state == STATE_HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+            health.opened_at = time.monotonic()
+            if health.state != STATE_OPEN:
+                self._transition(health, STATE_OPEN)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [health.as_dict() for health in self._endpoints.values()]
+
+    def clear(self) -> None:
+        self._endpoints.clear()
+
+    @staticmethod
+    def _transition(health: EndpointHealth, state: str) -> None:
+        logger.info("LLM 端点熔断状态变化: host=%s model=%s %s -> %s", health.host, health.model, health.state, state)
+        health.state = state
+        llm_endpoint_breaker_transitions_total.labels(host=health.host, state=state).inc()
+
+
+_registry = EndpointHealthRegistry(
+    failure_threshold=settings.llm_breaker_failure_threshold,
+    cooldown=settings.llm_breaker_cooldown_seconds,
+)
+
+
+def get_endpoint_health() -> EndpointHealthRegistry:
+    """返回进程内共享的端点熔断器集合。"""
+    return _registry
+
+
+__all__ = [
+    "STATE_CLOSED",
+    "STATE_HALF_OPEN",
+    "STATE_OPEN",
+    "EndpointHealth",
+    "EndpointHealthRegistry",
+    "endpoint_id",
+    "get_endpoint_health",
+]
@@ -0,0 +1,350 @@
+"""
+异步生成任务池
+
+长耗时的生成操作（章节生成、大纲生成、蓝图生成、评估、去味）提交为 GenerationJob 后立即返回，
+由本进程内的任务池执行，工作方式沿用 AsyncAnalysisProcessor：
+1. 轮询 generation_jobs 表领取 pending 任务（提交新任务时立即唤醒，不必等待轮询）
+2. 每个任务使用独立 session 执行，最多 max_concurrent 个并发
+3. 执行期间定时写入心跳与进度（阶段、事件、阶段性结果）
+4. 心跳超时的 processing 任务视为进程退出或卡死，重新领取并复用已保存的阶段性结果
+
+任务类型由各路由模块通过 register_job_handler 注册，处理函数接收 JobContext。
+领取、心跳与超时回收与增强分析共用 task_lease.TaskLease，被重新领取后旧执行者的写入不会覆盖新状态。
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Type
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ..core.config import settings
+from ..models.async_task import GenerationJob
+from ..repositories.user_repository import UserRepository
+from ..schemas.user import UserInDB
+from ..utils.metrics import generation_jobs_in_progress, generation_jobs_total, track_in_progress
+from .task_lease import Claim, TaskLease, lease_now
+
+logger = logging.getLogger(__name__)
+
+# progress 中保留的最近事件数
+_MAX_EVENTS = 50
+
+
+class JobContext:
+    """任务执行上下文：数据库会话、提交者、请求参数与进度记录。"""
+
+    def __init__(
+        self,
+        job_id: int,
+        session: AsyncSession,
+        user: UserInDB,
+        project_id: Optional[str],
+        payload: Optional[BaseModel],
+        progress: Optional[Dict[str, Any]],
+    ) -> None:
+        self.job_id = job_id
+        self.session = session
+        self.user = user
+        self.project_id = project_id
+        self.payload = payload
+        self._progress: Dict[str, Any] = dict(progress or {})
+        self._progress.setdefault("events", [])
+        # 阶段性结果，任务重试时原样交还给处理函数
+        self.partial: Dict[str, Any] = dict(self._progress.get("partial") or {})
+        self._dirty = False
+
+    def emit(self, event: str, data: Dict[str, Any]) -> None:
+        """记录进度事件，签名与章节生成流程的 emit 回调一致。"""
+        if event == "delta":
+            # 增量文本只累计字数，不逐段写库
+            received = self._progress.setdefault("received_chars", {})
+            key = str(data.get("version", 0))
+            received[key] = received.get(key, 0) + len(data.get("text") or "")
+        else:
+            if event == "progress":
+                self._progress["phase"] = data.get("phase")
+            self._progress["events"] = [*self._progress["events"], {"event": event, **data}][-_MAX_EVENTS:]
+        self._dirty = True
+
+    def save_partial(self, key: str, value: Any) -> None:
+        """保存阶段性结果，进程退出后重新领取时可从 partial 中恢复。"""
+        self.partial[key] = value
+        self._progress["partial"] = self.partial
+        self._dirty = True
+
+    def take_progress(self) -> Optional[Dict[str, Any]]:
+        """返回待写入的进度快照，没有变化时返回 None。"""
+        if not self._dirty:
+            return None
+        self._dirty = False
+        return jsonable_encoder(self._progress)
+
+
+JobHandler = Callable[[JobContext], Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class JobType:
+    handler: JobHandler
+    payload_model: Optional[Type[BaseModel]] = None
+    requires_project: bool = True
+
+
+_JOB_TYPES: Dict[str, JobType] = {}
+
+
+def register_job_handler(
+    job_type: str,
+    payload_model: Optional[Type[BaseModel]] = None,
+    *,
+    requires_project: bool = True,
+) -> Callable[[JobHandler], JobHandler]:
+    """注册任务类型，处理函数的返回值会序列化后写入 result。"""
+
+    def decorator(handler: JobHandler) -> JobHandler:
+        _JOB_TYPES[job_type] = JobType(handler, payload_model, requires_project)
+        return handler
+
+    return decorator
+
+
+def get_job_type(job_type: str) -> Optional[JobType]:
+    return _JOB_TYPES.get(job_type)
+
+
+def list_job_types() -> List[str]:
+    return sorted(_JOB_TYPES)
+
+
+class GenerationJobProcessor:
+    """进程内任务池，绑定创建时所在的事件循环。"""
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        *,
+        max_concurrent: int,
+        poll_interval: float,
+        heartbeat_timeout: float,
+    ) -> None:
+        self.session_maker = session_maker
+        self.max_concurrent = max(1, max_concurrent)
+        self.poll_interval = poll_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        # 心跳间隔取超时时间的 1/10，保证超时前至少写入多次
+        self.heartbeat_interval = max(0.5, heartbeat_timeout / 10)
+        self.is_running = False
+        self._lease = TaskLease(GenerationJob, name="生成任务")
+        self._wake = asyncio.Event()
+        self._running: Set[asyncio.Task] = set()
+
+    def notify(self) -> None:
+        """有新任务提交或任务结束时唤醒领取循环。"""
+        self._wake.set()
+
+    async def start(self) -> None:
+        if self.is_running:
+            logger.warning("生成任务池已在运行中")
+            return
+        self.is_running = True
+        logger.info("生成任务池已启动: 最大并发=%d", self.max_concurrent)
+        while self.is_running:
+            try:
+                free = self.max_concurrent - len(self._running)
+                if free > 0:
+                    for claim in await self._claim(free):
+                        task = asyncio.create_task(self._run(claim))
+                        self._running.add(task)
+                        task.add_done_callback(self._on_done)
+            except Exception as e:
+                logger.error(f"领取生成任务失败: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def stop(self) -> None:
+        """停止领取并中断执行中的任务，中断的任务退回 pending，下次启动时继续。"""
+        self.is_running = False
+        self._wake.set()
+        tasks = list(self._running)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("生成任务池已停止")
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        self._wake.set()
+
+    async def _claim(self, limit: int) -> List[Claim]:
+        """领取待执行与心跳超时的任务，返回 (任务ID, 领取凭证) 列表。"""
+        async with self.session_maker() as db:
+            claimed, exhausted = await self._lease.claim(
+                db,
+                limit,
+                stale_after=self.heartbeat_timeout,
+                columns=(GenerationJob.job_type,),
+            )
+        for row in exhausted:
+            generation_jobs_total.labels(job_type=row.job_type, status="failed").inc()
+        return claimed
+
+    async def _run(self, claim: Claim) -> None:
+        job_id, token = claim
+        started = time.monotonic()
+        async with self.session_maker() as db:
+            job = await db.get(GenerationJob, job_id)
+            if job is None:
+                return
+            job_type = get_job_type(job.job_type)
+            if job_type is None:
+                await self._finish(job_id, token, "failed", error_type="UnknownJobType", error_message=f"未知任务类型: {job.job_type}")
+                return
+            user = await UserRepository(db).get(id=job.user_id)
+            if user is None:
+                await self._finish(job_id, token, "failed", error_type="UserNotFound", error_message="任务提交者不存在")
+                return
+            try:
+                payload = job_type.payload_model.model_validate(job.payload or {}) if job_type.payload_model else None
+            except Exception as exc:
+                await self._finish(job_id, token, "failed", error_type="InvalidPayload", error_message=str(exc)[:500])
+                return
+            ctx = JobContext(job_id, db, UserInDB.model_validate(user), job.project_id, payload, job.progress)
+            name = job.job_type
+            logger.info("开始执行生成任务 %s: type=%s user=%s", job_id, name, job.user_id)
+
+            heartbeat = asyncio.create_task(
+                self._lease.keep_alive(
+                    self.session_maker,
+                    claim,
+                    interval=self.heartbeat_interval,
+                    progress=ctx.take_progress,
+                )
+            )
+            try:
+                with track_in_progress(generation_jobs_in_progress):
+                    result = await job_type.handler(ctx)
+            except asyncio.CancelledError:
+                # 服务关闭：退回 pending，保留阶段性结果，重启后继续
+                await self._finish(job_id, token, "pending", progress=ctx.take_progress(), completed=False)
+                raise
+            except HTTPException as exc:
+                await db.rollback()
+                await self._finish(
+                    job_id, token, "failed",
+                    progress=ctx.take_progress(),
+                    error_type=f"HTTP{exc.status_code}",
+                    error_message=str(exc.detail)[:2000],
+                    duration=time.monotonic() - started,
+                )
+                generation_jobs_total.labels(job_type=name, status="failed").inc()
+                logger.warning("生成任务 %s 失败: %s", job_id, exc.detail)
+            except Exception as exc:
+                await db.rollback()
+                logger.error(f"生成任务 {job_id} 执行异常: {exc}", exc_info=True)
+                await self._finish(
+                    job_id, token, "failed",
+                    progress=ctx.take_progress(),
+                    error_type=type(exc).__name__,
+                    error_message=str(exc)[:2000],
+                    duration=time.monotonic() - started,
+                )
+                generation_jobs_total.labels(job_type=name, status="failed").inc()
+            else:
+                await self._finish(
+                    job_id, token, "completed",
+                    progress=ctx.take_progress(),
+                    result=jsonable_encoder(result),
+                    duration=time.monotonic() - started,
+                )
+                generation_jobs_total.labels(job_type=name, status="completed").inc()
+                logger.info("生成任务 %s 完成，耗时 %.1fs", job_id, time.monotonic() - started)
+            finally:
+                heartbeat.cancel()
+
+    async def _finish(
+        self,
+        job_id: int,
+        token: datetime,
+        status: str,
+        *,
+        progress: Optional[Dict[str, Any]] = None,
+        result: Any = None,
+        error_type: Optional[str] = None,
+        error_message: Optional[str] = None,
+        duration: Optional[float] = None,
+        completed: bool = True,
+    ) -> None:
+        now = lease_now()
+        values: Dict[str, Any] = {"status": status, "updated_at": now}
+        if progress is not None:
+            values["progress"] = progress
+        if completed:
+            values.update(
+                result=result,
+                error_type=error_type,
+                error_message=error_message,
+                completed_at=now,
+                duration_seconds=int(duration) if duration is not None else None,
+            )
+        await self._lease.update_owned(self.session_maker, (job_id, token), values)
+
+
+_processor: Optional[GenerationJobProcessor] = None
+_processor_task: Optional[asyncio.Task] = None
+
+
+def get_generation_job_processor() -> Optional[GenerationJobProcessor]:
+    return _processor
+
+
+def notify_generation_jobs() -> None:
+    """提交任务后调用，唤醒本进程的任务池；未启动任务池时由其他进程轮询领取。"""
+    if _processor is not None:
+        _processor.notify()
+
+
+def start_generation_job_processor(session_maker: async_sessionmaker) -> GenerationJobProcessor:
+    """应用启动时创建任务池并在后台运行。"""
+    global _processor, _processor_task
+    _processor = GenerationJobProcessor(
+        session_maker,
+        max_concurrent=settings.generation_job_max_concurrent,
+        poll_interval=settings.generation_job_poll_interval,
+        heartbeat_timeout=settings.generation_job_heartbeat_timeout,
+    )
+    _processor_task = asyncio.create_task(_processor.start())
+    return _processor
+
+
+async def stop_generation_job_processor() -> None:
+    """应用关闭时停止任务池。"""
+    global _processor, _processor_task
+    processor, task = _processor, _processor_task
+    _processor, _processor_task = None, None
+    if processor is not None:
+        await processor.stop()
+    if task is not None:
+        await asyncio.gather(task, return_exceptions=True)
+
+
+__all__ = [
+    "GenerationJobProcessor",
+    "JobContext",
+    "JobType",
+    "get_generation_job_processor",
+    "get_job_type",
+    "list_job_types",
+    "notify_generation_jobs",
+    "register_job_handler",
+    "start_generation_job_processor",
+    "stop_generation_job_processor",
+]
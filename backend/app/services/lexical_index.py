@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+"""
+项目级本地词法索引：基于字符二元组的倒排表 + BM25 打分，无需嵌入即可检索。
+
+中文没有天然分词边界，连续汉字按相邻二元组切分（单字成词时保留单字），
+拉丁字母与数字按整词切分。索引驻留内存，首次使用时从向量库读取文本构建，
+之后由 ChapterIngestionService 在写入/删除章节向量时增量维护；
+查询只涉及内存中的倒排表，可在嵌入请求返回前给出结果。
+已加载的索引数受 VECTOR_LEXICAL_INDEX_MAX_LOADED 限制，超出后淘汰最久未使用的，下次使用时重建。
+"""
+
+import asyncio
+import logging
+import math
+import re
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from ..core.config import settings
+from .vector_index import ids_fingerprint
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+
+# BM25 参数
+_K1 = 1.2
+_B = 0.75
+
+# 已加载索引与向量库核对指纹的间隔（秒），用于发现其他进程写入的数据
+_VERIFY_INTERVAL = 300.0
+
+
+def tokenize(text: str) -> List[str]:
+    """将文本切分为检索词：汉字二元组 + 英文/数字整词。"""
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    tokens: List[str] = []
+    for match in _TOKEN_RE.finditer(normalized):
+        run = match.group()
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[idx:idx + 2] for idx in range(len(run) - 1))
+    return tokens
+
+
+@dataclass
+class LexicalDocument:
+    """索引中的一条文本及其回显所需的字段。"""
+
+    id: str
+    chapter_number: int
+    title: Optional[str]
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class ProjectLexicalIndex:
+    """单个项目、单张表的 BM25 倒排索引。"""
+
+    def __init__(self) -> None:
+        self._docs: Dict[str, LexicalDocument] = {}
+        self._lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self.checked_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._docs)
+
+    def get(self, doc_id: str) -> Optional[LexicalDocument]:
+        return self._docs.get(doc_id)
+
+    def add(self, documents: Iterable[LexicalDocument]) -> None:
+        """写入或覆盖文档。"""
+        for document in documents:
+            if document.id in self._docs:
+                self._remove(document.id)
+            counts = Counter(tokenize(document.text))
+            self._docs[document.id] = document
+            self._lengths[document.id] = sum(counts.values())
+            self._total_length += self._lengths[document.id]
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[document.id] = tf
+
+    def remove_ids(self, ids: Iterable[str]) -> int:
+        removed = 0
+        for doc_id in ids:
+            if doc_id in self._docs:
+                self._remove(doc_id)
+                removed += 1
+        return removed
+
+    def remove_chapters(self, chapter_numbers: Iterable[int]) -> int:
+        targets = set(chapter_numbers)
+        return self.remove_ids([doc_id for doc_id, doc in self._docs.items() if doc.chapter_number in targets])
+
+    def update_titles(self, titles: Dict[str, Optional[str]]) -> None:
+        """片段内容未变、仅章节标题变化时原地更新。"""
+        for doc_id, title in titles.items():
+            document = self._docs.get(doc_id)
+            if document is not None:
+                document.title = title
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        *,
+        min_chapter: Optional[int] = None,
+        max_chapter: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """返回 (id, BM25 得分) 列表，按得分降序排列。"""
+        if not self._docs or top_k <= 0:
+            return []
+        total = len(self._docs)
+        average_length = self._total_length / total or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1.0 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                chapter = self._docs[doc_id].chapter_number
+                if (min_chapter is not None and chapter < min_chapter) or (
+                    max_chapter is not None and chapter > max_chapter
+                ):
+                    continue
+                norm = tf + _K1 * (1.0 - _B + _B * self._lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (_K1 + 1.0) / norm
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
+
+    def _remove(self, doc_id: str) -> None:
+        document = self._docs.pop(doc_id)
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in set(tokenize(document.text)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+
+
+DocumentLoader = Callable[[], Awaitable[Optional[List[LexicalDocument]]]]
+FingerprintLoader = Callable[[], Awaitable[Optional[str]]]
+
+
+class LexicalIndexManager:
+    """管理各项目的词法索引：懒加载、增量维护、定期核对与按最近使用淘汰。"""
+
+    def __init__(self, *, max_loaded: int) -> None:
+        self.max_loaded = max(1, max_loaded)
+        self._indexes: "OrderedDict[Tuple[str, str], ProjectLexicalIndex]" = OrderedDict()
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    def get_loaded(self, table: str, project_id: str) -> Optional[ProjectLexicalIndex]:
+        return self._indexes.get((table, project_id))
+
+    def drop(self, table: str, project_id: str) -> None:
+        self._indexes.pop((table, project_id), None)
+        lock = self._locks.get((table, project_id))
+        if lock is not None and not lock.locked():
+            del self._locks[(table, project_id)]
+
+    def clear(self) -> None:
+        self._indexes.clear()
+
+    async def get_or_build(
+        self,
+        table: str,
+        project_id: str,
+        *,
+        load_documents: DocumentLoader,
+        fingerprint_documents: FingerprintLoader,
+    ) -> Optional[ProjectLexicalIndex]:
+        """返回项目索引，未加载时从向量库构建；距上次核对超过间隔时比对指纹，不一致则重建。"""
+        key = (table, project_id)
+        index = self._indexes.get(key)
+        if index is not None and time.monotonic() - index.checked_at < _VERIFY_INTERVAL:
+            self._indexes.move_to_end(key)
+            return index
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(key)
+            if index is not None and time.monotonic() - index.checked_at >= _VERIFY_INTERVAL:
+                expected = await fingerprint_documents()
+                # 增量维护不取锁，先在事件循环中取 id 快照，再到线程中排序与摘要
+                if expected is not None and await asyncio.to_thread(ids_fingerprint, index.ids) != expected:
+                    logger.info("词法索引与向量库不一致，准备重建: table=%s project=%s", table, project_id)
+                    index = None
+                    self.drop(table, project_id)
+                elif index is not None:
+                    index.checked_at = time.monotonic()
+            if index is None:
+                documents = await load_documents()
+                if documents is None:
+                    return None
+                index = ProjectLexicalIndex()
+                # 大项目分词建表耗时可达秒级，放到线程中执行避免阻塞事件循环
+                await asyncio.to_thread(index.add, documents)
+                self._indexes[key] = index
+                logger.info("词法索引构建完成: table=%s project=%s size=%d", table, project_id, len(index))
+                self._evict(keep=key)
+            self._indexes.move_to_end(key)
+            return index
+
+    def _evict(self, *, keep: Tuple[str, str]) -> None:
+        while len(self._indexes) > self.max_loaded:
+            oldest = next(iter(self._indexes))
+            if oldest == keep:
+                break
+            self.drop(*oldest)
+            logger.info("词法索引超出数量上限，已淘汰: table=%s project=%s", *oldest)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], *, k: int = 60) -> List[Tuple[Hashable, float]]:
+    """倒数排名融合：各路结果按 1 / (k + 名次) 累加，返回 (键, 融合得分) 降序列表。"""
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+_manager = LexicalIndexManager(max_loaded=settings.vector_lexical_index_max_loaded)
+
+
+def get_lexical_index_manager() -> LexicalIndexManager:
+    """返回进程内共享的词法索引管理器。"""
+    return _manager
+
+
+__all__ = [
+    "LexicalDocument",
+    "LexicalIndexManager",
+    "ProjectLexicalIndex",
+    "get_lexical_index_manager",
+    "reciprocal_rank_fusion",
+    "tokenize",
+]
@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import LLMConfig
 from ..repositories.llm_config_repository import LLMConfigRepository
 from ..schemas.llm_config import LLMConfigCreate, LLMConfigRead
+from .config_cache import USER_LLM_CONFIG, get_config_cache
 
 
 class LLMConfigService:
@@ -26,6 +27,7 @@ class LLMConfigService:
             instance = LLMConfig(user_id=user_id, **data)
             await self.repo.add(instance)
         await self.session.commit()
+        get_config_cache().invalidate(USER_LLM_CONFIG, user_id)
         return LLMConfigRead.model_validate(instance)
 
     async def get_config(self, user_id: int) -> Optional[LLMConfigRead]:
@@ -38,4 +40,5 @@ class LLMConfigService:
             return False
         await self.repo.delete(instance)
         await self.session.commit()
+        get_config_cache().invalidate(USER_LLM_CONFIG, user_id)
         return True
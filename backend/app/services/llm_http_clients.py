@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+"""
+LLM / 嵌入提供方共享的 HTTP 连接池
+
+SDK 客户端按 (base_url, api_key) 缓存，同一 base_url 下的客户端共用一个长连接的
+httpx.AsyncClient（keep-alive，安装 h2 时启用 HTTP/2），避免每次调用都重新建立
+TCP 连接与 TLS 握手。连接池绑定创建时的事件循环，在应用生命周期结束时统一关闭；
+事件循环变化时旧注册表在其所属循环中关闭，所属循环已结束则直接丢弃。
+
+每个请求从发出到收到响应头的耗时记录在 llm_http_ttfb_seconds，
+按本次请求是否新建了连接区分，可直接观察连接复用的效果。
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from ..core.config import settings
+from ..utils.metrics import llm_http_connections_opened_total, llm_http_ttfb_seconds
+
+logger = logging.getLogger(__name__)
+
+try:  # pragma: no cover - 运行环境未安装时兼容
+    from ollama import AsyncClient as OllamaAsyncClient
+except ImportError:  # pragma: no cover - Ollama 为可选依赖
+    OllamaAsyncClient = None
+
+try:  # pragma: no cover - HTTP/2 依赖 h2 包
+    import h2  # noqa: F401
+
+    _HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - 未安装时退回 HTTP/1.1
+    _HTTP2_AVAILABLE = False
+
+# 请求扩展字段中保存计时状态的键
+_STATE_KEY = "arboris_timing"
+
+
+async def _on_request(request: httpx.Request) -> None:
+    """记录请求开始时间，并通过 httpcore trace 扩展感知是否新建了连接。"""
+    state: Dict[str, Any] = {"started": time.perf_counter(), "new_connection": False}
+
+    async def trace(event: str, info: Dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.started":
+            state["new_connection"] = True
+
+    request.extensions["trace"] = trace
+    request.extensions[_STATE_KEY] = state
+
+
+async def _on_response(response: httpx.Response) -> None:
+    """收到响应头时（流式响应的正文尚未读取）记录首字节耗时。"""
+    state = response.request.extensions.get(_STATE_KEY)
+    if not state:
+        return
+    host = response.request.url.host or "unknown"
+    if state["new_connection"]:
+        llm_http_connections_opened_total.labels(host=host).inc()
+    llm_http_ttfb_seconds.labels(
+        host=host,
+        connection="new" if state["new_connection"] else "reused",
+    ).observe(time.perf_counter() - state["started"])
+
+
+_EVENT_HOOKS = {"request": [_on_request], "response": [_on_response]}
+
+
+class LLMHttpClientRegistry:
+    """进程内共享的提供方客户端，绑定创建时所在的事件循环。"""
+
+    def __init__(
+        self,
+        *,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        http2: bool,
+        max_clients: int,
+    ) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._limits = httpx.Limits(
+            max_connections=max(1, max_connections),
+            max_keepalive_connections=max(0, max_keepalive_connections),
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._http2 = http2 and _HTTP2_AVAILABLE
+        if http2 and not _HTTP2_AVAILABLE:
+            logger.info("未安装 h2，LLM 连接池使用 HTTP/1.1")
+        self._max_clients = max(1, max_clients)
+        self._pools: Dict[str, httpx.AsyncClient] = {}
+        self._openai: "OrderedDict[Tuple[Optional[str], str], AsyncOpenAI]" = OrderedDict()
+        self._ollama: Dict[Optional[str], Any] = {}
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def http_client(self, base_url: Optional[str]) -> httpx.AsyncClient:
+        """返回 base_url 对应的长连接池，不同 API Key 共用同一组连接。"""
+        key = (base_url or "").rstrip("/")
+        client = self._pools.get(key)
+        if client is None or client.is_closed:
+            client = DefaultAsyncHttpxClient(limits=self._limits, http2=self._http2, event_hooks=_EVENT_HOOKS)
+            self._pools[key] = client
+        return client
+
+    def openai(self, api_key: str, base_url: Optional[str]) -> AsyncOpenAI:
+        """返回 OpenAI 兼容客户端；超出数量上限时淘汰最久未用的（连接池不受影响）。"""
+        key = (base_url, api_key)
+        client = self._openai.get(key)
+        if client is None or client._client.is_closed:
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client(base_url))
+            self._openai[key] = client
+        self._openai.move_to_end(key)
+        while len(self._openai) > self._max_clients:
+            self._openai.popitem(last=False)
+        return client
+
+    def ollama(self, host: Optional[str]) -> Any:
+        """返回 Ollama 客户端；其内部自建 httpx 连接池，按 host 缓存复用。"""
+        if OllamaAsyncClient is None:  # pragma: no cover - 调用方已检查依赖
+            raise RuntimeError("缺少 ollama 依赖")
+        client = self._ollama.get(host)
+        if client is None:
+            client = OllamaAsyncClient(host=host, limits=self._limits, event_hooks=_EVENT_HOOKS)
+            self._ollama[host] = client
+        return client
+
+    async def aclose(self) -> None:
+        """关闭全部连接池。"""
+        clients = self.discard()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as exc:  # pragma: no cover - 关闭失败仅记录
+                logger.warning("关闭 LLM 连接池失败: %s", exc)
+
+    def discard(self) -> List[httpx.AsyncClient]:
+        """移除全部客户端并返回其连接池，不等待关闭；所属事件循环已结束时连接随之失效。"""
+        clients = [*self._pools.values(), *(client._client for client in self._ollama.values())]
+        self._pools.clear()
+        self._openai.clear()
+        self._ollama.clear()
+        return clients
+
+
+_registry: Optional[LLMHttpClientRegistry] = None
+
+
+def get_llm_http_clients() -> LLMHttpClientRegistry:
+    """返回当前事件循环共享的客户端注册表，事件循环变化时重新创建。"""
+    global _registry
+    loop = asyncio.get_running_loop()
+    if _registry is None or _registry.loop is not loop:
+        if _registry is not None:
+            _retire(_registry)
+        _registry = LLMHttpClientRegistry(
+            max_connections=settings.llm_http_max_connections,
+            max_keepalive_connections=settings.llm_http_max_keepalive_connections,
+            keepalive_expiry=settings.llm_http_keepalive_expiry,
+            http2=settings.llm_http2_enabled,
+            max_clients=settings.llm_http_max_clients,
+        )
+    return _registry
+
+
+def _retire(registry: LLMHttpClientRegistry) -> None:
+    """释放被替换的注册表：旧事件循环仍在其他线程运行时在其中关闭，否则丢弃引用。"""
+    old_loop = registry.loop
+    if old_loop.is_running() and not old_loop.is_closed():
+        asyncio.run_coroutine_threadsafe(registry.aclose(), old_loop)
+    else:
+        registry.discard()
+
+
+async def close_llm_http_clients() -> None:
+    """应用关闭时释放连接池。"""
+    global _registry
+    registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
+
+
+__all__ = ["LLMHttpClientRegistry", "close_llm_http_clients", "get_llm_http_clients"]
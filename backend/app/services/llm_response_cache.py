@@ -0,0 +1,222 @@
+"""
+LLM 响应缓存：以（功能, 模型, 系统提示词哈希, 用户提示词哈希, 温度, 响应格式）为键，将模型输出持久化到本地 SQLite。
+
+摘要提取、基础分析、卷名生成等低温度功能在章节重新生成、重新选择版本或任务重试时
+会以完全相同的输入再次调用，命中缓存即可立即返回且不消耗 Token。
+是否缓存由 AI 功能配置中的 cache 开关决定，调用方可传入 use_cache=False 跳过。
+条目数受 LLM_RESPONSE_CACHE_MAX_ENTRIES 限制（按最近使用时间淘汰），
+超过 LLM_RESPONSE_CACHE_MAX_AGE_SECONDS 的条目视为过期。
+"""
+
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from ..config.ai_function_config import AIFunctionType, get_function_config
+from ..core.config import settings
+from ..utils.metrics import llm_response_cache_evictions_total, llm_response_cache_requests_total
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def response_cache_key(
+    function: AIFunctionType,
+    model: str,
+    messages: Sequence[Dict[str, str]],
+    temperature: float,
+    response_format: Optional[str],
+) -> str:
+    """生成缓存键：系统提示词与其余消息分别哈希，与功能、模型、温度、响应格式共同参与。"""
+    system_prompt = "\x00".join(msg["content"] for msg in messages if msg["role"] == "system")
+    user_prompt = "\x00".join(f"{msg['role']}:{msg['content']}" for msg in messages if msg["role"] != "system")
+    parts = [
+        function.value,
+        model,
+        _digest(system_prompt),
+        _digest(user_prompt),
+        f"{temperature:.4f}",
+        response_format or "",
+    ]
+    return _digest("\x00".join(parts))
+
+
+class LLMResponseCache:
+    """基于 SQLite 的响应缓存，所有磁盘操作在线程池中执行，不阻塞事件循环。"""
+
+    def __init__(self, path: Path, *, max_entries: int, max_age: float) -> None:
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    async def get(self, key: str, *, function: AIFunctionType) -> Optional[str]:
+        """查询缓存，未命中或已过期时返回 None。"""
+        try:
+            response = await asyncio.to_thread(self._get_sync, key)
+        except sqlite3.Error as exc:
+            logger.warning("读取 LLM 响应缓存失败，本次视为未命中: %s", exc)
+            response = None
+        llm_response_cache_requests_total.labels(
+            function=function.value, result="hit" if response is not None else "miss"
+        ).inc()
+        return response
+
+    async def put(self, key: str, *, function: AIFunctionType, model: str, response: str) -> None:
+        """写入缓存，空响应会被忽略。"""
+        if not response or not response.strip():
+            return
+        try:
+            evicted = await asyncio.to_thread(self._put_sync, key, function.value, model, response)
+        except sqlite3.Error as exc:
+            logger.warning("写入 LLM 响应缓存失败: %s", exc)
+            return
+        if evicted:
+            llm_response_cache_evictions_total.inc(evicted)
+            logger.debug("LLM 响应缓存已淘汰 %d 条过期或最久未使用的记录", evicted)
+
+    async def delete(self, key: str) -> None:
+        """删除缓存条目，用于调用方校验失败的响应。"""
+        try:
+            await asyncio.to_thread(self._delete_sync, key)
+        except sqlite3.Error as exc:
+            logger.warning("删除 LLM 响应缓存失败: %s", exc)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    key TEXT PRIMARY KEY,
+                    function TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used ON llm_response_cache(last_used)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_created_at ON llm_response_cache(created_at)"
+            )
+            conn.commit()
+            self._conn = conn
+            logger.info(
+                "LLM 响应缓存已就绪: path=%s max_entries=%d max_age=%.0fs",
+                self.path,
+                self.max_entries,
+                self.max_age,
+            )
+        return self._conn
+
+    def _get_sync(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if now - created_at > self.max_age:
+                conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE llm_response_cache SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+        return response
+
+    def _delete_sync(self, key: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+            conn.commit()
+
+    def _put_sync(self, key: str, function: str, model: str, response: str) -> int:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """
+                INSERT INTO llm_response_cache (key, function, model, response, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    response = excluded.response,
+                    created_at = excluded.created_at,
+                    last_used = excluded.last_used
+                """,
+                (key, function, model, response, now, now),
+            )
+            evicted = conn.execute(
+                "DELETE FROM llm_response_cache WHERE created_at < ?", (now - self.max_age,)
+            ).rowcount
+            total = conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+            overflow = total - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    """
+                    DELETE FROM llm_response_cache WHERE key IN (
+                        SELECT key FROM llm_response_cache ORDER BY last_used ASC LIMIT ?
+                    )
+                    """,
+                    (overflow,),
+                )
+                evicted += overflow
+            conn.commit()
+        return evicted
+
+
+_CACHES: Dict[Path, LLMResponseCache] = {}
+
+
+def get_llm_response_cache(function: AIFunctionType) -> Optional[LLMResponseCache]:
+    """返回进程内共享的缓存实例；全局关闭或该功能未开启缓存时返回 None。"""
+    if not settings.llm_response_cache_enabled:
+        return None
+    config = get_function_config(function)
+    if config is None or not config.cache:
+        return None
+    path = (
+        Path(settings.llm_response_cache_path).expanduser().resolve()
+        if settings.llm_response_cache_path
+        else Path(__file__).resolve().parents[2] / "storage" / "llm_response_cache.db"
+    )
+    cache = _CACHES.get(path)
+    if cache is None:
+        cache = LLMResponseCache(
+            path,
+            max_entries=settings.llm_response_cache_max_entries,
+            max_age=settings.llm_response_cache_max_age_seconds,
+        )
+        _CACHES[path] = cache
+    return cache
+
+
+__all__ = [
+    "LLMResponseCache",
+    "get_llm_response_cache",
+    "response_cache_key",
+]
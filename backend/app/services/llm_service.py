@@ -1,18 +1,46 @@
+import asyncio
+import hashlib
 import logging
+import math
 import os
-from typing import Any, Dict, List, Optional
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
 
 import httpx
 from fastapi import HTTPException, status
-from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, BadRequestError, InternalServerError
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    BadRequestError,
+    InternalServerError,
+    RateLimitError,
+)
 
 from ..core.config import settings
-from ..config.ai_function_config import get_provider_base_url, get_provider_env_key
+from ..config.ai_function_config import AIFunctionType, PROVIDER_CONFIGS, get_provider_base_url, get_provider_env_key
+from ..db.session import AsyncSessionLocal
 from ..repositories.llm_config_repository import LLMConfigRepository
 from ..repositories.system_config_repository import SystemConfigRepository
 from ..repositories.user_repository import UserRepository
 from ..services.admin_setting_service import AdminSettingService
+from ..services.config_cache import (
+    PROVIDER_CREDENTIAL,
+    PROVIDER_LIMITS,
+    SYSTEM_CONFIG,
+    USER_LLM_CONFIG,
+    get_config_cache,
+)
+from ..services.embedding_batcher import get_embedding_batcher
+from ..services.embedding_cache import EmbeddingCache, get_embedding_cache
+from ..services.endpoint_health import endpoint_id, get_endpoint_health
+from ..services.llm_http_clients import get_llm_http_clients
+from ..services.llm_response_cache import get_llm_response_cache, response_cache_key
 from ..services.prompt_service import PromptService
+from ..services.provider_limiter import ProviderLimiter, ProviderLimits, get_provider_limiter, parse_retry_after
+from ..services.single_flight import SingleFlight
 from ..services.usage_service import UsageService
 from ..utils.llm_tool import ChatMessage, LLMClient
 
@@ -23,6 +51,9 @@ try:  # pragma: no cover - 运行环境未安装时兼容
 except ImportError:  # pragma: no cover - Ollama 为可选依赖
     OllamaAsyncClient = None
 
+# 章节摘要请求合并，key 为 (user_id, temperature, 提示词与正文摘要)
+_summary_flights = SingleFlight("chapter_summary")
+
 
 class LLMService:
     """封装与大模型交互的所有逻辑，包括配额控制与配置选择。"""
@@ -47,14 +78,43 @@ class LLMService:
         user_id: Optional[int] = None,
         timeout: float = 300.0,
         response_format: Optional[str] = "json_object",
+        on_delta: Optional[Callable[[str, int], None]] = None,
+        cache_function: Optional[AIFunctionType] = None,
+        use_cache: bool = True,
+        cache_validator: Optional[Callable[[str], bool]] = None,
     ) -> str:
+        """
+        流式调用模型并返回完整响应。
+
+        on_delta 在收到每段增量内容时调用，参数为 (增量文本, 尝试序号)。端点中途失败
+        切换到下一个端点时尝试序号加一，调用方应丢弃之前序号已收到的内容。
+        cache_function 指定调用所属的 AI 功能，该功能开启了响应缓存时相同输入直接返回缓存结果
+        （命中时 on_delta 一次收到完整内容），use_cache=False 跳过缓存。
+        cache_validator 校验响应能否被调用方使用，校验不通过的响应不写入缓存，已缓存的会被删除。
+        """
         messages = [{"role": "system", "content": system_prompt}, *conversation_history]
-        return await self._stream_and_collect(
+
+        async def call() -> str:
+            return await self._stream_and_collect(
+                messages,
+                temperature=temperature,
+                user_id=user_id,
+                timeout=timeout,
+                response_format=response_format,
+                on_delta=on_delta,
+            )
+
+        if cache_function is None or not use_cache:
+            return await call()
+        return await self._cached_completion(
+            cache_function,
             messages,
             temperature=temperature,
-            user_id=user_id,
-            timeout=timeout,
             response_format=response_format,
+            user_id=user_id,
+            call=call,
+            on_hit=(lambda text: on_delta(text, 0)) if on_delta else None,
+            validate=cache_validator,
         )
 
     async def invoke(
@@ -67,6 +127,7 @@ class LLMService:
         timeout: float = 300.0,
         response_format: Optional[str] = None,
         user_id: Optional[int] = None,
+        on_first_token: Optional[Callable[[], None]] = None,
     ) -> str:
         """
         统一的LLM调用接口，支持指定provider和model
@@ -79,6 +140,7 @@ class LLMService:
             timeout: 超时时间
             response_format: 响应格式
             user_id: 用户ID（用于配额控制）
+            on_first_token: 收到首个非空内容时的回调（用于对冲请求计时）
 
         Returns:
             LLM响应文本
@@ -87,32 +149,12 @@ class LLMService:
         base_url = get_provider_base_url(provider)
         env_key = get_provider_env_key(provider)
 
-        # ✅ 优先从环境变量获取API Key (使用os.getenv)
-        api_key = os.getenv(env_key)
-
-        # ✅ 如果os.getenv没有获取到,尝试从dotenv加载后再次获取
-        if not api_key:
-            try:
-                from dotenv import load_dotenv
-                load_dotenv()  # 重新加载.env文件
-                api_key = os.getenv(env_key)
-                if api_key:
-                    logger.info(f"从.env文件重新加载了 {env_key}")
-            except Exception as e:
-                logger.warning(f"重新加载.env文件失败: {e}")
-
-        # ✅ 如果环境变量没有，尝试从数据库配置获取（统一处理所有provider）
-        if not api_key and self.db_session:
-            try:
-                from ..repositories.ai_routing_repository import AIProviderRepository
-                provider_repo = AIProviderRepository(self.db_session)
-                provider_obj = await provider_repo.get_by_name(provider)
-                if provider_obj and provider_obj.metadata:
-                    import json
-                    metadata = json.loads(provider_obj.metadata)
-                    api_key = metadata.get("api_key")
-            except Exception as e:
-                logger.warning(f"从数据库获取API Key失败: {e}")
+        # ✅ 优先从环境变量获取API Key (使用os.getenv)，缺失时读取缓存的 .env / 数据库凭证
+        api_key = os.getenv(env_key) or await get_config_cache().get_or_load(
+            PROVIDER_CREDENTIAL,
+            provider,
+            lambda: self._load_provider_api_key(provider, env_key),
+        )
 
         if not api_key:
             raise HTTPException(
@@ -133,39 +175,41 @@ class LLMService:
 
         # 使用现有的调用逻辑
         chat_messages = [ChatMessage(role=msg["role"], content=msg["content"]) for msg in messages]
+        limiter = await self._get_provider_limiter(provider, api_key)
 
         try:
-            client = LLMClient(
-                api_key=endpoint_config["api_key"],
-                base_url=endpoint_config.get("base_url")
-            )
+            # 按提供商与 API Key 限制并发和速率，排队等待而不是撞上 429
+            async with limiter.slot():
+                client = self._open_chat_client(endpoint_config["api_key"], endpoint_config.get("base_url"))
 
-            full_response = ""
-            finish_reason = None
+                full_response = ""
+                finish_reason = None
 
-            # ✅ 修复：安全累积chunk内容，容错处理不同类型的chunk
-            async for chunk in client.stream_chat(
-                messages=chat_messages,
-                model=endpoint_config["model"],
-                temperature=temperature,
-                timeout=timeout,
-                response_format=response_format,
-            ):
-                # 处理不同类型的chunk
-                if isinstance(chunk, str):
-                    # Legacy string chunks
-                    full_response += chunk
-                elif isinstance(chunk, dict):
-                    # Structured chunks with metadata
-                    content = chunk.get("content", "")
-                    if content:
-                        full_response += content
-                    # 记录finish reason（如果有）
-                    if "finish_reason" in chunk:
-                        finish_reason = chunk["finish_reason"]
-                else:
-                    # 其他类型，尝试转换为字符串
-                    full_response += str(chunk)
+                # ✅ 修复：安全累积chunk内容，容错处理不同类型的chunk
+                async for chunk in client.stream_chat(
+                    messages=chat_messages,
+                    model=endpoint_config["model"],
+                    temperature=temperature,
+                    timeout=timeout,
+                    response_format=response_format,
+                ):
+                    # 处理不同类型的chunk
+                    if isinstance(chunk, str):
+                        # Legacy string chunks
+                        full_response += chunk
+                    elif isinstance(chunk, dict):
+                        # Structured chunks with metadata
+                        content = chunk.get("content", "")
+                        if content:
+                            if on_first_token is not None and not full_response:
+                                on_first_token()
+                            full_response += content
+                        # 记录finish reason（如果有）
+                        if "finish_reason" in chunk:
+                            finish_reason = chunk["finish_reason"]
+                    else:
+                        # 其他类型，尝试转换为字符串
+                        full_response += str(chunk)
 
             # 记录使用量
             if user_id:
@@ -177,6 +221,14 @@ class LLMService:
             )
             return full_response
 
+        except RateLimitError as e:
+            # 按 Retry-After 暂停该 Key 的后续请求，重试时在限流器中排队
+            delay = limiter.penalize(parse_retry_after(getattr(e.response, "headers", None)))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"{provider} API 限流: {str(e)}",
+                headers={"Retry-After": str(math.ceil(delay))},
+            ) from e
         except Exception as e:
             logger.error(f"{provider} API 调用失败: {str(e)}")
             raise HTTPException(
@@ -184,6 +236,67 @@ class LLMService:
                 detail=f"{provider} API 调用失败: {str(e)}"
             )
 
+    @staticmethod
+    def _endpoint_provider(base_url: Optional[str]) -> str:
+        """按 Base URL 识别提供商，未登记的地址以主机名作为限流维度。"""
+        normalized = (base_url or "").rstrip("/")
+        for name, config in PROVIDER_CONFIGS.items():
+            if normalized == config["base_url"].rstrip("/"):
+                return name
+        return urlparse(normalized).hostname or "default"
+
+    async def _get_provider_limiter(self, provider: str, api_key: str) -> ProviderLimiter:
+        limits = await get_config_cache().get_or_load(
+            PROVIDER_LIMITS, provider, lambda: self._load_provider_limits(provider)
+        )
+        return get_provider_limiter(provider, api_key, limits)
+
+    async def _load_provider_limits(self, provider: str) -> ProviderLimits:
+        """读取 ai_providers 中的并发与速率上限，没有记录时使用全局默认值。"""
+        if self.db_session:
+            try:
+                from ..repositories.ai_routing_repository import AIProviderRepository
+                provider_obj = await AIProviderRepository(self.db_session).get_by_name(provider)
+            except Exception as e:
+                logger.warning(f"读取 {provider} 限流配置失败: {e}")
+                provider_obj = None
+            if provider_obj is not None:
+                return ProviderLimits(
+                    max_concurrent=provider_obj.max_concurrent,
+                    rate_limit_per_minute=provider_obj.rate_limit_per_minute,
+                )
+        return ProviderLimits(
+            max_concurrent=settings.ai_provider_max_concurrent,
+            rate_limit_per_minute=settings.ai_provider_rate_limit_per_minute,
+        )
+
+    async def _load_provider_api_key(self, provider: str, env_key: str) -> Optional[str]:
+        """环境变量缺失时的凭证来源：重新加载 .env，再读取 ai_providers 中的配置。"""
+        api_key = None
+        # ✅ 如果os.getenv没有获取到,尝试从dotenv加载后再次获取
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()  # 重新加载.env文件
+            api_key = os.getenv(env_key)
+            if api_key:
+                logger.info(f"从.env文件重新加载了 {env_key}")
+        except Exception as e:
+            logger.warning(f"重新加载.env文件失败: {e}")
+
+        # ✅ 如果环境变量没有，尝试从数据库配置获取（统一处理所有provider）
+        if not api_key and self.db_session:
+            try:
+                from ..repositories.ai_routing_repository import AIProviderRepository
+                provider_repo = AIProviderRepository(self.db_session)
+                provider_obj = await provider_repo.get_by_name(provider)
+                if provider_obj and provider_obj.provider_metadata:
+                    import json
+                    metadata = json.loads(provider_obj.provider_metadata)
+                    api_key = metadata.get("api_key")
+            except Exception as e:
+                logger.warning(f"从数据库获取API Key失败: {e}")
+        return api_key
+
     async def get_summary(
         self,
         chapter_content: str,
@@ -192,6 +305,7 @@ class LLMService:
         user_id: Optional[int] = None,
         timeout: float = 180.0,
         system_prompt: Optional[str] = None,
+        use_cache: bool = True,
     ) -> str:
         if not system_prompt:
             prompt_service = PromptService(self.session)
@@ -203,7 +317,76 @@ class LLMService:
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": chapter_content},
         ]
-        return await self._stream_and_collect(messages, temperature=temperature, user_id=user_id, timeout=timeout)
+        # 写作接口与自动生成器可能同时为同一章节回填摘要，相同内容的并发请求只调用一次模型
+        digest = hashlib.sha256(f"{system_prompt}\0{chapter_content}".encode("utf-8")).hexdigest()
+
+        async def collect() -> str:
+            # 共享的调用使用独立会话，不依赖首个调用方的会话（其提交、回滚或关闭不影响其他等待者）
+            async with AsyncSessionLocal() as session:
+                return await LLMService(session)._stream_and_collect(
+                    messages, temperature=temperature, user_id=user_id, timeout=timeout
+                )
+
+        async def call() -> str:
+            summary, _ = await _summary_flights.do((user_id, temperature, digest), collect)
+            return summary
+
+        if not use_cache:
+            return await call()
+        return await self._cached_completion(
+            AIFunctionType.SUMMARY_EXTRACTION,
+            messages,
+            temperature=temperature,
+            response_format=None,
+            user_id=user_id,
+            call=call,
+        )
+
+    async def _cached_completion(
+        self,
+        function: AIFunctionType,
+        messages: List[Dict[str, str]],
+        *,
+        temperature: float,
+        response_format: Optional[str],
+        user_id: Optional[int],
+        call: Callable[[], Awaitable[str]],
+        on_hit: Optional[Callable[[str], None]] = None,
+        validate: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """按功能的缓存开关查询响应缓存，未命中时调用 call 并写入缓存；validate 不通过的响应不缓存。"""
+        cache = get_llm_response_cache(function)
+        if cache is None:
+            return await call()
+        model = await self._cache_model(user_id)
+        key = response_cache_key(function, model, messages, temperature, response_format)
+        cached = await cache.get(key, function=function)
+        if cached is not None and validate is not None and not validate(cached):
+            # 旧版本写入或校验规则变化后失效的条目，删除后重新调用模型
+            logger.warning("LLM 响应缓存条目校验失败，已删除: function=%s", function.value)
+            await cache.delete(key)
+            cached = None
+        if cached is not None:
+            logger.info("LLM 响应缓存命中: function=%s model=%s user_id=%s", function.value, model, user_id)
+            if on_hit is not None:
+                on_hit(cached)
+            return cached
+        response = await call()
+        if validate is None or validate(response):
+            await cache.put(key, function=function, model=model, response=response)
+        return response
+
+    async def _cache_model(self, user_id: Optional[int]) -> str:
+        """缓存键使用的模型名：用户自定义模型优先，其次为系统默认模型。不触发每日次数计数。"""
+        if user_id:
+            config = await get_config_cache().get_or_load(
+                USER_LLM_CONFIG, user_id, lambda: self._load_user_llm_config(user_id)
+            )
+            if config and config[0]:
+                return f"{config[1] or ''}|{config[2] or ''}"
+        base_url = await self._get_config_value("llm.base_url")
+        model = await self._get_config_value("llm.model")
+        return f"{base_url or ''}|{model or ''}"
 
     async def _stream_and_collect(
         self,
@@ -213,24 +396,51 @@ class LLMService:
         user_id: Optional[int],
         timeout: float,
         response_format: Optional[str] = None,
+        on_delta: Optional[Callable[[str, int], None]] = None,
     ) -> str:
         # 获取用户配置的端点列表（可能包含多个 API Key）
         user_endpoints = await self._resolve_llm_config(user_id)
 
-        # 构建端点列表：用户端点 + 备用端点
-        endpoints = user_endpoints
         fallback_endpoints = self._parse_fallback_endpoints()
-        endpoints.extend(fallback_endpoints)
+
+        # 每个 API Key 独立限流，多 Key 用户的并发上限随 Key 数量叠加；
+        # 先取好限流器，排序与放行之间不再让出事件循环，并发请求才能按进行中请求数分摊到各个 Key
+        limiters: Dict[str, ProviderLimiter] = {}
+        for endpoint_config in [*user_endpoints, *fallback_endpoints]:
+            limiters[endpoint_id(endpoint_config)] = await self._get_provider_limiter(
+                self._endpoint_provider(endpoint_config.get("base_url")), endpoint_config["api_key"]
+            )
+
+        # 构建端点列表：用户端点 + 备用端点，各组内按熔断、限流降级、进行中请求数与健康分排序
+        health = get_endpoint_health()
+        endpoints = health.order([user_endpoints, fallback_endpoints])
 
         chat_messages = [ChatMessage(role=msg["role"], content=msg["content"]) for msg in messages]
 
         last_error = None
+        skipped = 0
+        attempt = -1
 
         # 尝试每个端点
         for idx, endpoint_config in enumerate(endpoints):
             is_fallback = idx > 0
             endpoint_label = f"备用端点{idx}" if is_fallback else "主端点"
 
+            limiter = limiters[endpoint_id(endpoint_config)]
+
+            # 熔断中的端点直接跳过，冷却结束后只放行一个探测请求
+            ticket = health.allow(endpoint_config)
+            if ticket is None:
+                skipped += 1
+                logger.info(
+                    "跳过熔断中的%s: model=%s base_url=%s",
+                    endpoint_label,
+                    endpoint_config.get("model"),
+                    endpoint_config.get("base_url"),
+                )
+                continue
+            attempt += 1
+
             logger.info(
                 "尝试 %s: model=%s base_url=%s user_id=%s messages=%d",
                 endpoint_label,
@@ -241,31 +451,59 @@ class LLMService:
             )
 
             try:
-                client = LLMClient(
-                    api_key=endpoint_config["api_key"],
-                    base_url=endpoint_config.get("base_url")
+                async with limiter.slot():
+                    client = self._open_chat_client(endpoint_config["api_key"], endpoint_config.get("base_url"))
+
+                    full_response = ""
+                    finish_reason = None
+                    started = time.perf_counter()
+                    first_token_latency = None
+
+                    async for part in client.stream_chat(
+                        messages=chat_messages,
+                        model=endpoint_config.get("model"),
+                        temperature=temperature,
+                        timeout=int(timeout),
+                        response_format=response_format,
+                    ):
+                        if part.get("content"):
+                            if first_token_latency is None:
+                                first_token_latency = time.perf_counter() - started
+                            full_response += part["content"]
+                            if on_delta is not None:
+                                on_delta(part["content"], attempt)
+                        if part.get("finish_reason"):
+                            finish_reason = part["finish_reason"]
+
+                # 成功获取响应，以首 token 延迟作为端点健康分
+                health.record_success(
+                    endpoint_config,
+                    first_token_latency if first_token_latency is not None else time.perf_counter() - started,
                 )
-
-                full_response = ""
-                finish_reason = None
-
-                async for part in client.stream_chat(
-                    messages=chat_messages,
-                    model=endpoint_config.get("model"),
-                    temperature=temperature,
-                    timeout=int(timeout),
-                    response_format=response_format,
-                ):
-                    if part.get("content"):
-                        full_response += part["content"]
-                    if part.get("finish_reason"):
-                        finish_reason = part["finish_reason"]
-
-                # 成功获取响应
                 if is_fallback:
                     logger.info(f"✅ {endpoint_label} 调用成功，已切换到备用端点")
                 return full_response
 
+            except RateLimitError as exc:
+                delay = limiter.penalize(parse_retry_after(getattr(exc.response, "headers", None)))
+                # 额度耗尽的 Key 短时间内不会恢复，降级更久，让其他 Key 承接流量
+                if getattr(exc, "code", None) == "insufficient_quota":
+                    health.record_throttled(endpoint_config, max(delay, settings.llm_key_quota_cooldown_seconds))
+                else:
+                    health.record_throttled(endpoint_config, delay)
+                logger.warning(
+                    "%s 被限流: model=%s retry_after=%.1fs",
+                    endpoint_label,
+                    endpoint_config.get("model"),
+                    delay,
+                )
+                last_error = exc
+
+                # 如果还有备用端点，继续尝试
+                if idx < len(endpoints) - 1:
+                    logger.info(f"切换到下一个端点...")
+                    continue
+
             except BadRequestError as exc:
                 detail = "请求参数错误或 API key 无效"
                 response = getattr(exc, "response", None)
@@ -311,6 +549,7 @@ class LLMService:
                     endpoint_config.get("model"),
                     detail,
                 )
+                health.record_failure(endpoint_config, detail)
                 last_error = exc
 
                 # 如果还有备用端点，继续尝试
@@ -333,6 +572,7 @@ class LLMService:
                     endpoint_config.get("model"),
                     detail,
                 )
+                health.record_failure(endpoint_config, detail)
                 last_error = exc
 
                 # 如果还有备用端点，继续尝试
@@ -340,13 +580,30 @@ class LLMService:
                     logger.info(f"切换到下一个端点...")
                     continue
 
+            finally:
+                health.release(endpoint_config, ticket)
+
         # 所有端点都失败了
-        logger.error("所有 LLM 端点均调用失败，共尝试 %d 个端点", len(endpoints))
+        if last_error is None and skipped:
+            logger.error("所有 LLM 端点均处于熔断状态，共 %d 个端点", skipped)
+            raise HTTPException(
+                status_code=503,
+                detail="所有 AI 服务端点暂时熔断，请稍后重试",
+            )
+        logger.error("所有 LLM 端点均调用失败，共尝试 %d 个端点", len(endpoints) - skipped)
         raise HTTPException(
             status_code=503,
             detail=f"所有 AI 服务端点均不可用，请稍后重试。最后错误: {str(last_error)}"
         ) from last_error
 
+    @staticmethod
+    def _open_chat_client(api_key: Optional[str], base_url: Optional[str]) -> LLMClient:
+        """基于共享连接池创建对话客户端，避免每次调用重新建连。"""
+        key = api_key or os.environ.get("OPENAI_API_KEY")
+        base_url = base_url or os.environ.get("OPENAI_API_BASE")
+        client = get_llm_http_clients().openai(key, base_url) if key else None
+        return LLMClient(api_key=key, base_url=base_url, client=client)
+
     async def _resolve_llm_config(self, user_id: Optional[int]) -> List[Dict[str, Optional[str]]]:
         """解析 LLM 配置，返回端点列表
 
@@ -355,16 +612,19 @@ class LLMService:
         endpoints = []
 
         if user_id:
-            config = await self.llm_repo.get_by_user(user_id)
-            if config and config.llm_provider_api_key:
+            config = await get_config_cache().get_or_load(
+                USER_LLM_CONFIG, user_id, lambda: self._load_user_llm_config(user_id)
+            )
+            if config and config[0]:
+                api_key_str, provider_url, provider_model = config
                 # 解析多个 API Key（逗号分隔）
-                api_keys = [key.strip() for key in config.llm_provider_api_key.split(",") if key.strip()]
+                api_keys = [key.strip() for key in api_key_str.split(",") if key.strip()]
 
                 for api_key in api_keys:
                     endpoints.append({
                         "api_key": api_key,
-                        "base_url": config.llm_provider_url,
-                        "model": config.llm_provider_model,
+                        "base_url": provider_url,
+                        "model": provider_model,
                     })
 
                 if endpoints:
@@ -388,6 +648,15 @@ class LLMService:
 
         return [{"api_key": api_key, "base_url": base_url, "model": model}]
 
+    async def _load_user_llm_config(
+        self, user_id: int
+    ) -> Optional[Tuple[Optional[str], Optional[str], Optional[str]]]:
+        """读取用户自定义配置，返回 (API Key, Base URL, 模型) 供缓存使用。"""
+        config = await self.llm_repo.get_by_user(user_id)
+        if not config:
+            return None
+        return config.llm_provider_api_key, config.llm_provider_url, config.llm_provider_model
+
     async def get_embedding(
         self,
         text: str,
@@ -396,91 +665,215 @@ class LLMService:
         model: Optional[str] = None,
     ) -> List[float]:
         """生成文本向量，用于章节 RAG 检索，支持 openai 与 ollama 双提供方。"""
+        embeddings = await self.get_embeddings([text], user_id=user_id, model=model)
+        return embeddings[0] if embeddings else []
+
+    async def get_embeddings(
+        self,
+        texts: Sequence[str],
+        *,
+        user_id: Optional[int] = None,
+        model: Optional[str] = None,
+    ) -> List[List[float]]:
+        """批量生成文本向量，返回结果与输入一一对应，失败的条目为空列表。
+
+        先查询本地嵌入缓存，仅对未命中的文本发起请求。请求按 EMBEDDING_BATCH_SIZE
+        切分为多输入请求（OpenAI ``input=[...]``、Ollama ``/api/embed``），并以
+        EMBEDDING_MAX_CONCURRENCY 限制并发；配置读取与客户端创建在整批调用中只执行一次。
+        """
+        if not texts:
+            return []
+
+        provider, target_model = await self._resolve_embedding_model(model)
+        cache = self._get_embedding_cache()
+        cache_model = f"{provider}:{target_model}"
+        embeddings: List[List[float]] = [[] for _ in texts]
+        if cache is not None:
+            for index, vector in (await cache.get_many(cache_model, texts)).items():
+                embeddings[index] = vector
+
+        missing = [index for index, vector in enumerate(embeddings) if not vector]
+        if missing:
+            fetched = await self._request_embeddings(
+                [texts[index] for index in missing],
+                provider=provider,
+                model=target_model,
+                user_id=user_id,
+            )
+            for index, vector in zip(missing, fetched):
+                embeddings[index] = vector
+            if cache is not None:
+                await cache.put_many(cache_model, [(texts[index], embeddings[index]) for index in missing])
+
+        dimension = next((len(vector) for vector in embeddings if vector), 0)
+        if not dimension:
+            vector_size_str = await self._get_config_value("embedding.model_vector_size")
+            if vector_size_str:
+                dimension = int(vector_size_str)
+        if dimension:
+            self._embedding_dimensions[target_model] = dimension
+        return embeddings
+
+    async def _request_embeddings(
+        self,
+        texts: List[str],
+        *,
+        provider: str,
+        model: str,
+        user_id: Optional[int],
+    ) -> List[List[float]]:
+        """调用嵌入提供方。
+
+        开启微批窗口时，文本交给进程级调度器与其他并发请求合并发送；
+        否则按批次切分后在本次调用内并发请求。
+        """
+        api_key, base_url = await self._resolve_embedding_connection(provider, user_id)
+        if provider == "ollama" and OllamaAsyncClient is None:
+            logger.error("未安装 ollama 依赖，无法调用本地嵌入模型。")
+            raise HTTPException(status_code=500, detail="缺少 Ollama 依赖，请先安装 ollama 包。")
+
+        if settings.embedding_batch_window_ms > 0:
+            batcher = get_embedding_batcher(
+                max_batch_size=settings.embedding_batch_size,
+                max_wait=settings.embedding_batch_window_ms / 1000,
+                max_concurrency=settings.embedding_max_concurrency,
+            )
+
+            async def send(batch: List[str]) -> List[List[float]]:
+                client = self._open_embedding_client(provider, api_key, base_url)
+                return await self._send_embedding_batch(
+                    client, batch, provider=provider, model=model, base_url=base_url, user_id=user_id
+                )
+
+            key = (provider, model, base_url, api_key)
+            return list(await asyncio.gather(*(batcher.submit(key, text, send) for text in texts)))
+
+        batch_size = max(1, settings.embedding_batch_size)
+        batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+        semaphore = asyncio.Semaphore(max(1, settings.embedding_max_concurrency))
+        client = self._open_embedding_client(provider, api_key, base_url)
+
+        async def run(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._send_embedding_batch(
+                    client, batch, provider=provider, model=model, base_url=base_url, user_id=user_id
+                )
+
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    @staticmethod
+    def _open_embedding_client(provider: str, api_key: Optional[str], base_url: Optional[str]) -> Any:
+        # 客户端来自共享连接池，由应用生命周期统一关闭
+        registry = get_llm_http_clients()
+        if provider == "ollama":
+            return registry.ollama(base_url)
+        return registry.openai(api_key, base_url)
+
+    async def _send_embedding_batch(
+        self,
+        client: Any,
+        batch: List[str],
+        *,
+        provider: str,
+        model: str,
+        base_url: Optional[str],
+        user_id: Optional[int],
+    ) -> List[List[float]]:
+        """发送单个多输入请求，失败或数量不一致时返回等长的空向量列表。"""
+        request_batch = self._embed_batch_with_ollama if provider == "ollama" else self._embed_batch_with_openai
+        try:
+            vectors = await request_batch(client, batch, model)
+        except Exception as exc:  # pragma: no cover - 网络、鉴权或本地服务失败
+            logger.error(
+                "嵌入请求失败: provider=%s model=%s base_url=%s user_id=%s size=%d error=%s",
+                provider,
+                model,
+                base_url,
+                user_id,
+                len(batch),
+                exc,
+                exc_info=True,
+            )
+            return [[] for _ in batch]
+        if len(vectors) != len(batch):
+            logger.warning(
+                "嵌入返回数量与输入不一致: model=%s expected=%d actual=%d",
+                model,
+                len(batch),
+                len(vectors),
+            )
+            return [[] for _ in batch]
+        return vectors
+
+    async def get_embedding_model_key(self, model: Optional[str] = None) -> str:
+        """返回当前生效的嵌入模型标识（``provider:model``），可用作缓存键的一部分。"""
+        provider, target_model = await self._resolve_embedding_model(model)
+        return f"{provider}:{target_model}"
+
+    async def _resolve_embedding_model(self, model: Optional[str]) -> Tuple[str, str]:
+        """读取嵌入提供方与模型名称。"""
         provider = await self._get_config_value("embedding.provider") or "openai"
         default_model = (
             await self._get_config_value("ollama.embedding_model") or "nomic-embed-text:latest"
             if provider == "ollama"
             else await self._get_config_value("embedding.model") or "text-embedding-3-large"
         )
-        target_model = model or default_model
+        return provider, model or default_model
 
+    async def _resolve_embedding_connection(
+        self,
+        provider: str,
+        user_id: Optional[int],
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """读取嵌入服务的 API Key 与 Base URL，仅在需要真正发起请求时调用。"""
         if provider == "ollama":
-            if OllamaAsyncClient is None:
-                logger.error("未安装 ollama 依赖，无法调用本地嵌入模型。")
-                raise HTTPException(status_code=500, detail="缺少 Ollama 依赖，请先安装 ollama 包。")
-
             base_url = (
                 await self._get_config_value("ollama.embedding_base_url")
                 or await self._get_config_value("embedding.base_url")
             )
-            client = OllamaAsyncClient(host=base_url)
-            try:
-                response = await client.embeddings(model=target_model, prompt=text)
-                embedding: Optional[List[float]]
-                if isinstance(response, dict):
-                    embedding = response.get("embedding")
-                else:
-                    embedding = getattr(response, "embedding", None)
-                if not embedding:
-                    logger.warning("Ollama 返回空向量: model=%s", target_model)
-                    return []
-                if not isinstance(embedding, list):
-                    embedding = list(embedding)
-            except Exception as exc:  # pragma: no cover - 本地服务调用失败
-                logger.error(
-                    "Ollama 嵌入请求失败: model=%s base_url=%s error=%s",
-                    target_model,
-                    base_url,
-                    exc,
-                    exc_info=True,
-                )
-                return []
-            finally:
-                # 关闭客户端连接，避免资源泄漏
-                if hasattr(client, 'close'):
-                    try:
-                        await client.close()
-                    except Exception:
-                        pass  # 忽略关闭时的错误
+            return None, base_url
+
+        api_key = await self._get_config_value("embedding.api_key")
+        base_url = await self._get_config_value("embedding.base_url")
+        if not api_key or not base_url:
+            endpoints = await self._resolve_llm_config(user_id)
+            api_key = api_key or endpoints[0]["api_key"]
+            base_url = base_url or endpoints[0].get("base_url")
+        return api_key, base_url
+
+    @staticmethod
+    def _get_embedding_cache() -> Optional[EmbeddingCache]:
+        if not settings.embedding_cache_enabled:
+            return None
+        path = (
+            Path(settings.embedding_cache_path).expanduser().resolve()
+            if settings.embedding_cache_path
+            else Path(__file__).resolve().parents[2] / "storage" / "embedding_cache.db"
+        )
+        return get_embedding_cache(path, max_entries=settings.embedding_cache_max_entries)
+
+    @staticmethod
+    async def _embed_batch_with_openai(client: AsyncOpenAI, batch: List[str], model: str) -> List[List[float]]:
+        response = await client.embeddings.create(input=batch, model=model)
+        if not response.data:
+            logger.warning("OpenAI 嵌入请求返回空数据: model=%s", model)
+            return []
+        # 按 index 还原输入顺序，部分兼容服务不保证返回顺序
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return [list(item.embedding) for item in ordered]
+
+    @staticmethod
+    async def _embed_batch_with_ollama(client: Any, batch: List[str], model: str) -> List[List[float]]:
+        response = await client.embed(model=model, input=batch)
+        if isinstance(response, dict):
+            embeddings = response.get("embeddings")
         else:
-            config = await self._resolve_llm_config(user_id)
-            api_key = await self._get_config_value("embedding.api_key") or config["api_key"]
-            base_url = await self._get_config_value("embedding.base_url") or config.get("base_url")
-            client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-            try:
-                response = await client.embeddings.create(
-                    input=text,
-                    model=target_model,
-                )
-                if not response.data:
-                    logger.warning("OpenAI 嵌入请求返回空数据: model=%s user_id=%s", target_model, user_id)
-                    return []
-                embedding = response.data[0].embedding
-            except Exception as exc:  # pragma: no cover - 网络或鉴权失败
-                logger.error(
-                    "OpenAI 嵌入请求失败: model=%s base_url=%s user_id=%s error=%s",
-                    target_model,
-                    base_url,
-                    user_id,
-                    exc,
-                    exc_info=True,
-                )
-                return []
-            finally:
-                # 关闭客户端连接，避免资源泄漏
-                await client.close()
-
-        if not isinstance(embedding, list):
-            embedding = list(embedding)
-
-        dimension = len(embedding)
-        if not dimension:
-            vector_size_str = await self._get_config_value("embedding.model_vector_size")
-            if vector_size_str:
-                dimension = int(vector_size_str)
-        if dimension:
-            self._embedding_dimensions[target_model] = dimension
-        return embedding
+            embeddings = getattr(response, "embeddings", None)
+        if not embeddings:
+            logger.warning("Ollama 返回空向量: model=%s", model)
+            return []
+        return [list(vector) for vector in embeddings]
 
     async def get_embedding_dimension(self, model: Optional[str] = None) -> Optional[int]:
         """获取嵌入向量维度，优先返回缓存结果，其次读取配置。"""
@@ -509,13 +902,17 @@ class LLMService:
         await self.session.commit()
 
     async def _get_config_value(self, key: str) -> Optional[str]:
-        record = await self.system_config_repo.get_by_key(key)
-        if record:
-            return record.value
+        value = await get_config_cache().get_or_load(SYSTEM_CONFIG, key, lambda: self._load_config_value(key))
+        if value is not None:
+            return value
         # 兼容环境变量，首次迁移时无需立即写入数据库
         env_key = key.upper().replace(".", "_")
         return os.getenv(env_key)
 
+    async def _load_config_value(self, key: str) -> Optional[str]:
+        record = await self.system_config_repo.get_by_key(key)
+        return record.value if record else None
+
     def _parse_fallback_endpoints(self) -> List[Dict[str, str]]:
         """解析备用端点配置
 
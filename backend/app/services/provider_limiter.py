@@ -0,0 +1,239 @@
+"""
+AI 提供商并发与速率限制
+
+按 (提供商, API Key) 维护一个限流器，同时约束：
+- 并发：同时进行中的请求数不超过 ai_providers.max_concurrent
+- 速率：令牌桶按 ai_providers.rate_limit_per_minute 匀速补充，桶容量等于并发上限，
+  允许短时突发但长期速率不超过上限
+- 退避：收到 429 时按 Retry-After 暂停该 Key 的新请求，暂停期间不再发出注定失败的请求
+
+等待方按到达顺序排队（FIFO），前一个未放行时后来者不会插队。
+排队长度与等待耗时导出到 Prometheus，便于观察是否持续顶在提供商上限。
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Deque, Dict, Mapping, Optional, Tuple
+
+from ..utils.metrics import (
+    ai_provider_queue_depth,
+    ai_provider_throttled_total,
+    ai_provider_wait_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+# 429 未携带 Retry-After 时的最短暂停时间（秒）
+_DEFAULT_PENALTY = 1.0
+# Retry-After 的上限，避免异常响应把 Key 长时间锁死
+_MAX_PENALTY = 300.0
+
+
+@dataclass(frozen=True)
+class ProviderLimits:
+    """提供商限流参数，0 或 None 表示不限制。"""
+
+    max_concurrent: Optional[int] = None
+    rate_limit_per_minute: Optional[int] = None
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """解析 retry-after-ms / Retry-After（秒数或 HTTP 日期），返回需等待的秒数。"""
+    if not headers:
+        return None
+    raw_ms = headers.get("retry-after-ms")
+    if raw_ms:
+        try:
+            return max(0.0, float(raw_ms) / 1000)
+        except ValueError:
+            pass
+    raw = headers.get("retry-after")
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(raw)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class ProviderLimiter:
+    """单个 (提供商, API Key) 的并发闸门 + 令牌桶，绑定创建时所在的事件循环。"""
+
+    def __init__(self, provider: str, limits: ProviderLimits) -> None:
+        self.provider = provider
+        self._loop = asyncio.get_running_loop()
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self._active = 0
+        self._blocked_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._updated = time.monotonic()
+        self.limits = limits
+        self._tokens = float(self._capacity)
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def _capacity(self) -> int:
+        return max(1, self.limits.max_concurrent or 1)
+
+    def configure(self, limits: ProviderLimits) -> None:
+        """更新限流参数（管理员修改提供商配置后生效）。"""
+        if limits == self.limits:
+            return
+        self._refill()
+        self.limits = limits
+        self._tokens = min(self._tokens, float(self._capacity))
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self) -> None:
+        start = time.monotonic()
+        if not self._waiters and self._try_take():
+            ai_provider_wait_seconds.labels(provider=self.provider).observe(0.0)
+            return
+        waiter: "asyncio.Future[None]" = self._loop.create_future()
+        self._waiters.append(waiter)
+        ai_provider_queue_depth.labels(provider=self.provider).inc()
+        self._schedule()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 已被放行但调用方放弃，归还名额
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                self._dispatch()
+            raise
+        finally:
+            ai_provider_queue_depth.labels(provider=self.provider).dec()
+        ai_provider_wait_seconds.labels(provider=self.provider).observe(time.monotonic() - start)
+
+    def release(self) -> None:
+        self._active = max(0, self._active - 1)
+        self._dispatch()
+
+    def penalize(self, retry_after: Optional[float]) -> float:
+        """收到 429 后暂停新请求，返回实际暂停的秒数。"""
+        rate = self.limits.rate_limit_per_minute
+        delay = retry_after if retry_after is not None else max(_DEFAULT_PENALTY, 60.0 / rate if rate else 0.0)
+        delay = min(delay, _MAX_PENALTY)
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        # 提供商已判定超限，清空令牌避免恢复后瞬间突发
+        self._refill()
+        self._tokens = min(self._tokens, 0.0)
+        ai_provider_throttled_total.labels(provider=self.provider).inc()
+        logger.warning("提供商 %s 触发限流，暂停 %.1fs", self.provider, delay)
+        self._schedule()
+        return delay
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        rate = self.limits.rate_limit_per_minute
+        if rate:
+            self._tokens = min(float(self._capacity), self._tokens + (now - self._updated) * rate / 60.0)
+        self._updated = now
+
+    def _try_take(self) -> bool:
+        if time.monotonic() < self._blocked_until:
+            return False
+        if self.limits.max_concurrent and self._active >= self.limits.max_concurrent:
+            return False
+        if self.limits.rate_limit_per_minute:
+            self._refill()
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+        self._active += 1
+        return True
+
+    def _dispatch(self) -> None:
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if not self._try_take():
+                break
+            self._waiters.popleft()
+            waiter.set_result(None)
+        self._schedule()
+
+    def _schedule(self) -> None:
+        """队列非空且受时间约束（令牌不足或 Retry-After）时，定时唤醒队首。"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._waiters:
+            return
+        now = time.monotonic()
+        rate = self.limits.rate_limit_per_minute
+        if self._blocked_until > now:
+            delay = self._blocked_until - now
+        elif rate and self._tokens < 1.0:
+            delay = (1.0 - self._tokens) * 60.0 / rate
+        else:
+            # 只受并发约束，等待 release 触发
+            return
+        self._timer = self._loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+
+_limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+
+
+def _key_fingerprint(api_key: Optional[str]) -> str:
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def get_provider_limiter(provider: str, api_key: Optional[str], limits: ProviderLimits) -> ProviderLimiter:
+    """返回 (提供商, API Key) 对应的限流器，限流参数变化时就地更新。"""
+    key = (provider, _key_fingerprint(api_key))
+    limiter = _limiters.get(key)
+    if limiter is None or limiter.loop is not asyncio.get_running_loop():
+        limiter = ProviderLimiter(provider, limits)
+        _limiters[key] = limiter
+    else:
+        limiter.configure(limits)
+    return limiter
+
+
+__all__ = [
+    "ProviderLimiter",
+    "ProviderLimits",
+    "get_provider_limiter",
+    "parse_retry_after",
+]
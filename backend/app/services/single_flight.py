@@ -0,0 +1,68 @@
+"""
+请求合并（single-flight）
+
+相同操作、相同参数的并发调用只执行一次，后到的调用等待进行中的执行并共享其结果（或异常）。
+用于避免重复点击、多个标签页或自动生成器与写作接口同时触发同一次昂贵的 LLM 调用。
+
+共享的执行在独立的 asyncio.Task 中运行：单个调用方被取消不会影响其他等待者，
+只有全部等待者都已离开时才取消执行。因此执行函数不应依赖某个调用方的数据库会话，
+需要写库时自行创建会话。合并仅在当前进程内生效。
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from ..utils.metrics import coalesced_requests_total
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按 key 合并并发调用，operation 用于日志与监控标签。"""
+
+    def __init__(self, operation: str) -> None:
+        self.operation = operation
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """执行 fn 或加入进行中的同 key 执行，返回 (结果, 是否为合并的调用)。"""
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.create_task(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _task, key=key, flight=flight: self._forget(key, flight))
+        else:
+            coalesced_requests_total.labels(operation=self.operation).inc()
+            logger.info("%s 已有相同请求在执行，合并等待: %s", self.operation, key)
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+        return result, shared
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+
+__all__ = ["SingleFlight"]
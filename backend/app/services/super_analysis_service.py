@@ -18,6 +18,7 @@ from typing import Optional, Tuple, Dict, List
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .llm_service import LLMService
+from ..config.ai_function_config import AIFunctionType
 from ..utils.json_utils import remove_think_tags, unwrap_markdown_json
 from ..utils.metrics import (
     track_duration, track_in_progress,
@@ -138,7 +139,10 @@ class SuperAnalysisService:
                         conversation_history=[{"role": "user", "content": prompt}],
                         temperature=0.3,
                         user_id=user_id,
-                        timeout=180.0
+                        timeout=180.0,
+                        # 章节内容未变化时直接复用上次的分析结果；解析或校验失败的响应不缓存
+                        cache_function=AIFunctionType.BASIC_ANALYSIS,
+                        cache_validator=self._is_valid_basic_response,
                     )
 
                     result = self._parse_json_response(response)
@@ -255,6 +259,10 @@ class SuperAnalysisService:
             logger.error(f"原始响应: {response[:500]}...")
             return {}
     
+    def _is_valid_basic_response(self, response: str) -> bool:
+        """原始响应能否解析为合法的基础分析结果，用于决定是否写入响应缓存。"""
+        return self._validate_basic_result(self._parse_json_response(response))
+
     def _validate_basic_result(self, result: dict) -> bool:
         """✅ 验证基础分析结果（解决问题 #8）"""
         if not isinstance(result, dict):
@@ -0,0 +1,136 @@
+"""
+数据库任务表的领取、心跳与超时回收
+
+增强分析（PendingAnalysis，AsyncAnalysisProcessor 执行）与异步生成任务
+（GenerationJob，GenerationJobProcessor 执行）共用这套租约逻辑。任务表需包含
+status / priority / retry_count / max_retries / started_at / updated_at / created_at 列：
+1. 领取：挑选 pending 与心跳超时的 processing 记录，按优先级与创建时间排序，
+   以带条件的 UPDATE 抢占，多个进程同时轮询时同一任务只会被一个执行者领到
+2. 心跳：执行期间定时刷新 updated_at（可附带进度），超过 stale_after 未刷新视为执行者已退出或卡死
+3. 回收：心跳超时的任务重试次数加一后重新领取，达到上限时直接标记失败
+4. 写入：以领取时写入的 started_at 作为凭证，被重新领取后旧执行者的写入不会覆盖新状态
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+# 领取凭证：(任务ID, started_at)
+Claim = Tuple[int, datetime]
+
+
+def lease_now() -> datetime:
+    # 截断到秒，MySQL DATETIME 默认不保存微秒，否则按 started_at 比对领取凭证会失配
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+class TaskLease:
+    """某张任务表的租约操作，name 用于日志。"""
+
+    def __init__(self, model: Any, *, name: str) -> None:
+        self.model = model
+        self.name = name
+
+    async def claim(
+        self,
+        db: AsyncSession,
+        limit: int,
+        *,
+        stale_after: float,
+        columns: Sequence[Any] = (),
+    ) -> Tuple[List[Claim], List[Row]]:
+        """
+        领取待执行与心跳超时的任务并提交。
+
+        返回 (领取凭证列表, 因重试耗尽被标记失败的记录)；columns 为失败记录额外需要的列（如任务类型）。
+        """
+        model = self.model
+        now = lease_now()
+        stale_before = now - timedelta(seconds=stale_after)
+        stmt = (
+            select(model.id, model.status, model.updated_at, model.retry_count, model.max_retries, *columns)
+            .where(
+                or_(
+                    model.status == "pending",
+                    and_(model.status == "processing", model.updated_at < stale_before),
+                )
+            )
+            .order_by(model.priority.desc(), model.created_at.asc())
+            .limit(limit)
+        )
+        claimed: List[Claim] = []
+        exhausted: List[Row] = []
+        for row in (await db.execute(stmt)).all():
+            guard = and_(model.id == row.id, model.status == row.status, model.updated_at == row.updated_at)
+            values: Dict[str, Any] = {"status": "processing", "started_at": now, "updated_at": now}
+            if row.status == "processing":
+                if row.retry_count >= row.max_retries:
+                    result = await db.execute(
+                        update(model)
+                        .where(guard)
+                        .values(
+                            status="failed",
+                            error_type="HeartbeatTimeout",
+                            error_message="任务执行中断且已达到最大重试次数",
+                            completed_at=now,
+                            updated_at=now,
+                        )
+                    )
+                    if result.rowcount == 1:
+                        exhausted.append(row)
+                    continue
+                values["retry_count"] = row.retry_count + 1
+                logger.warning("%s %s 心跳超时，重新领取（第 %d 次重试）", self.name, row.id, row.retry_count + 1)
+            result = await db.execute(update(model).where(guard).values(**values))
+            if result.rowcount == 1:
+                claimed.append((row.id, now))
+        await db.commit()
+        return claimed, exhausted
+
+    async def update_owned(self, session_maker: async_sessionmaker, claim: Claim, values: Dict[str, Any]) -> bool:
+        """仍持有租约（processing 且凭证一致）时写入 values，返回是否写入。"""
+        task_id, token = claim
+        model = self.model
+        async with session_maker() as db:
+            result = await db.execute(
+                update(model)
+                .where(model.id == task_id, model.status == "processing", model.started_at == token)
+                .values(**values)
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    async def keep_alive(
+        self,
+        session_maker: async_sessionmaker,
+        claim: Claim,
+        *,
+        interval: float,
+        progress: Optional[Callable[[], Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        """定时刷新 updated_at 并写入进度，任务被其他执行者重新领取后返回；调用方以后台任务运行，结束时取消。"""
+        while True:
+            await asyncio.sleep(interval)
+            values: Dict[str, Any] = {"updated_at": lease_now()}
+            snapshot = progress() if progress is not None else None
+            if snapshot is not None:
+                values["progress"] = snapshot
+            try:
+                if not await self.update_owned(session_maker, claim, values):
+                    logger.warning("%s %s 已被重新领取，停止心跳", self.name, claim[0])
+                    return
+            except Exception as e:
+                logger.warning(f"写入{self.name} {claim[0]} 心跳失败: {e}")
+
+
+__all__ = [
+    "Claim",
+    "TaskLease",
+    "lease_now",
+]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+"""
+向量存储编码：float32 原样存储，float16 减半，int8 按向量缩放后仅占四分之一。
+
+int8 格式在数据前附带 4 字节 float32 缩放系数（max|x| / 127），解码时乘回。
+压缩格式仅用于第一轮粗排，精确分数由 rag_exact_vectors 中的 float32 副本重排得到。
+"""
+
+from typing import Any, Sequence
+
+import numpy as np
+
+FORMAT_FLOAT32 = "f32"
+FORMAT_FLOAT16 = "f16"
+FORMAT_INT8 = "i8"
+
+# 配置值 -> 列 embedding_format 中的取值
+STORAGE_FORMATS = {
+    "float32": FORMAT_FLOAT32,
+    "float16": FORMAT_FLOAT16,
+    "int8": FORMAT_INT8,
+}
+
+_INT8_SCALE_BYTES = 4
+
+
+def encode_vector(embedding: Sequence[float], fmt: str) -> bytes:
+    """按格式编码向量。"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    if fmt == FORMAT_FLOAT16:
+        return vector.astype(np.float16).tobytes()
+    if fmt == FORMAT_INT8:
+        peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return np.float32(scale).tobytes() + quantized.tobytes()
+    return vector.tobytes()
+
+
+def decode_vector(blob: Any, fmt: str) -> "np.ndarray":
+    """解码为 float32 数组；float32 为零拷贝只读视图。"""
+    if not blob:
+        return np.zeros(0, dtype=np.float32)
+    if fmt == FORMAT_FLOAT16:
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if fmt == FORMAT_INT8:
+        scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=_INT8_SCALE_BYTES).astype(np.float32) * scale
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def encoded_size(dimension: int, fmt: str) -> int:
+    """给定维度下编码后的字节数，用于在解码前过滤维度不一致的历史数据。"""
+    if fmt == FORMAT_FLOAT16:
+        return dimension * 2
+    if fmt == FORMAT_INT8:
+        return dimension + _INT8_SCALE_BYTES
+    return dimension * 4
+
+
+__all__ = [
+    "FORMAT_FLOAT16",
+    "FORMAT_FLOAT32",
+    "FORMAT_INT8",
+    "STORAGE_FORMATS",
+    "decode_vector",
+    "encode_vector",
+    "encoded_size",
+]
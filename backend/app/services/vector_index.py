@@ -0,0 +1,553 @@
+from __future__ import annotations
+
+"""
+项目级近似最近邻（ANN）索引，为 RAG 检索提供常数级延迟的 top-k 查询。
+
+采用 IVF（倒排文件）结构：向量先做 L2 归一化，余弦距离即可转为内积；
+数据量较小时直接精确扫描，超过训练阈值后用球面 k-means 生成聚类中心，
+查询时只扫描与查询向量最接近的 nprobe 个簇。索引随 upsert 增量维护，
+并以 npz 文件的形式持久化在向量库文件旁边，进程重启后无需重建。
+
+读盘、全量构建、聚类训练与写盘都放到线程中执行，不阻塞事件循环；新索引就绪前
+检索继续使用旧索引，没有可用索引时由调用方退回全量扫描。写盘按项目合并延迟执行，
+并在文件锁下原子替换，API 与回填脚本等多个进程共用同一目录时不会写坏文件。
+已加载的索引定期与向量库核对指纹（条数与 id 集合的摘要）以发现其他进程的写入，数量超过
+VECTOR_INDEX_MAX_LOADED 时淘汰最久未使用的。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:  # noqa: SIM105 - Windows 没有 fcntl，仅依赖原子替换
+    import fcntl
+except ImportError:  # pragma: no cover - 非 POSIX 平台
+    fcntl = None  # type: ignore[assignment]
+
+try:  # noqa: SIM105 - numpy 缺失时整体退回 SQL 检索
+    import numpy as np
+except ImportError:  # pragma: no cover - 运行环境缺少依赖
+    np = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# 索引文件格式版本，结构变化时递增，旧文件将被忽略并重建
+INDEX_FORMAT_VERSION = 1
+
+# 已加载索引与向量库核对指纹的间隔（秒），用于发现其他进程写入的数据
+_VERIFY_INTERVAL = 300.0
+
+# 构建索引所需的 (id 列表, 向量矩阵, 章节号列表)，读取失败时为 None
+IndexRows = Tuple[List[str], "np.ndarray", List[int]]
+RowLoader = Callable[[], Awaitable[Optional[IndexRows]]]
+FingerprintLoader = Callable[[], Awaitable[Optional[str]]]
+
+
+def ids_fingerprint(ids: Iterable[str]) -> str:
+    """
+    记录集合的指纹：条数加排序后 id 的摘要。
+
+    删一条再插一条时条数不变，只比较条数发现不了；片段 id 含内容摘要，内容变化也会体现在 id 上。
+    """
+    ordered = sorted(ids)
+    digest = hashlib.sha256("\n".join(ordered).encode("utf-8")).hexdigest()[:16]
+    return f"{len(ordered)}:{digest}"
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """跨进程互斥地写同一个索引文件；没有 fcntl 的平台只依赖原子替换。"""
+    if fcntl is None:  # pragma: no cover - 非 POSIX 平台
+        yield
+        return
+    with open(path.with_suffix(".lock"), "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class ProjectVectorIndex:
+    """单个项目、单张向量表的 IVF 索引。"""
+
+    def __init__(self, dimension: int, *, nprobe: int = 8, min_train_size: int = 2048) -> None:
+        self.dimension = dimension
+        self.nprobe = max(1, nprobe)
+        self.min_train_size = max(1, min_train_size)
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._chapters = np.zeros(0, dtype=np.int32)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._size = 0
+        self._centroids: Optional["np.ndarray"] = None
+        self._trained_size = 0
+        self.checked_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._ids)
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def needs_training(self) -> bool:
+        """首次达到阈值时需要训练，之后规模翻倍再重训，保持簇数与数据量匹配。"""
+        if self._size < self.min_train_size:
+            return False
+        return not self.is_trained or self._size >= self._trained_size * 2
+
+    def build(self, ids: Sequence[str], vectors: "np.ndarray", chapters: Sequence[int]) -> None:
+        """写入全量向量并按需训练；仅用于尚未对外可见的新索引，可在线程中执行。"""
+        self.add(ids, vectors, chapters)
+        if self.needs_training:
+            self.train()
+
+    def add(self, ids: Sequence[str], vectors: "np.ndarray", chapters: Sequence[int]) -> None:
+        """写入或覆盖向量；同 id 的记录原地更新。不会触发训练，是否需要重训见 needs_training。"""
+        if not len(ids):
+            return
+        matrix = self._normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension))
+        for row, (item_id, chapter) in enumerate(zip(ids, chapters)):
+            position = self._positions.get(item_id)
+            if position is None:
+                self._ensure_capacity(self._size + 1)
+                position = self._size
+                self._ids.append(item_id)
+                self._positions[item_id] = position
+                self._size += 1
+            self._vectors[position] = matrix[row]
+            self._chapters[position] = int(chapter)
+            self._assign[position] = self._nearest_centroid(matrix[row]) if self.is_trained else 0
+
+    def remove_chapters(self, chapter_numbers: Iterable[int]) -> int:
+        """删除指定章节的全部向量，返回删除条数。"""
+        if not self._size:
+            return 0
+        targets = np.asarray(list(chapter_numbers), dtype=np.int32)
+        keep = ~np.isin(self._chapters[: self._size], targets)
+        removed = int(self._size - keep.sum())
+        if removed:
+            self._compact(keep)
+        return removed
+
+    def remove_ids(self, ids: Iterable[str]) -> int:
+        """按 id 删除向量，返回删除条数。"""
+        positions = [self._positions[item_id] for item_id in ids if item_id in self._positions]
+        if not positions:
+            return 0
+        keep = np.ones(self._size, dtype=bool)
+        keep[positions] = False
+        self._compact(keep)
+        return len(positions)
+
+    def search(
+        self,
+        query: Sequence[float],
+        top_k: int,
+        *,
+        min_chapter: Optional[int] = None,
+        max_chapter: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """返回 (id, 余弦距离) 列表，按距离升序排列。
+
+        指定章节范围（闭区间）时只对范围内的向量计算相似度。
+        """
+        if not self._size or top_k <= 0:
+            return []
+        vector = self._normalize(np.asarray(query, dtype=np.float32).reshape(1, self.dimension))[0]
+        in_range: Optional["np.ndarray"] = None
+        scope: Optional["np.ndarray"] = None
+        if min_chapter is not None or max_chapter is not None:
+            chapters = self._chapters[: self._size]
+            in_range = np.ones(self._size, dtype=bool)
+            if min_chapter is not None:
+                in_range &= chapters >= min_chapter
+            if max_chapter is not None:
+                in_range &= chapters <= max_chapter
+            scope = np.flatnonzero(in_range)
+            if not len(scope):
+                return []
+
+        candidates = scope
+        if self.is_trained:
+            centroid_scores = self._centroids @ vector
+            probes = min(self.nprobe, len(centroid_scores))
+            probe_lists = np.argpartition(-centroid_scores, probes - 1)[:probes]
+            probed = np.isin(self._assign[: self._size], probe_lists)
+            if in_range is not None:
+                probed &= in_range
+            candidates = np.flatnonzero(probed)
+            # 探测簇内候选不足时退回范围内精确扫描，保证返回条数
+            if len(candidates) < top_k:
+                candidates = scope
+
+        matrix = self._vectors[: self._size] if candidates is None else self._vectors[candidates]
+        scores = matrix @ vector
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        rows = best if candidates is None else candidates[best]
+        return [(self._ids[int(row)], float(1.0 - scores[idx])) for row, idx in zip(rows, best)]
+
+    def train(self) -> None:
+        """使用球面 k-means 训练聚类中心，并重新分配所有向量。"""
+        self.apply_training(*self.fit())
+
+    def fit(self) -> Tuple[Optional["np.ndarray"], "np.ndarray"]:
+        """计算聚类中心与各向量所属的簇。只读不改动索引，可在线程中与检索并行执行。"""
+        if not self._size:
+            return None, np.zeros(0, dtype=np.int32)
+        data = self._vectors[: self._size]
+        nlist = max(1, min(int(4 * math.sqrt(self._size)), self._size // 16 or 1))
+        rng = np.random.default_rng(0)
+        sample_size = min(self._size, nlist * 64)
+        sample = data[rng.choice(self._size, size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(10):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = sample[labels == cluster]
+                if len(members):
+                    centroids[cluster] = members.sum(axis=0)
+            centroids = self._normalize(centroids)
+        return centroids, np.argmax(data @ centroids.T, axis=1).astype(np.int32)
+
+    def apply_training(self, centroids: Optional["np.ndarray"], assign: "np.ndarray") -> bool:
+        """安装 fit 的结果；训练期间条数发生变化时放弃本次结果并返回 False。"""
+        if len(assign) != self._size:
+            return False
+        self._centroids = centroids
+        self._assign[: self._size] = assign
+        self._trained_size = self._size
+        if centroids is not None:
+            logger.info("ANN 索引训练完成: size=%d nlist=%d", self._size, len(centroids))
+        return True
+
+    def save(self, path: Path) -> None:
+        """在文件锁下原子写入索引文件，避免进程中断或多个进程同时写入导致文件损坏。"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 临时文件按进程区分，其他进程的半成品不会被覆盖或提前替换
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        header = {
+            "version": INDEX_FORMAT_VERSION,
+            "dimension": self.dimension,
+            "trained_size": self._trained_size,
+        }
+        with _file_lock(path):
+            np.savez(
+                tmp_path,
+                header=np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8),
+                ids=np.asarray(self._ids, dtype=np.str_),
+                vectors=self._vectors[: self._size],
+                chapters=self._chapters[: self._size],
+                assign=self._assign[: self._size],
+                centroids=self._centroids if self._centroids is not None else np.zeros((0, self.dimension), np.float32),
+            )
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, *, nprobe: int, min_train_size: int) -> Optional["ProjectVectorIndex"]:
+        """读取索引文件，格式不兼容或损坏时返回 None。"""
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                header = json.loads(data["header"].tobytes().decode("utf-8"))
+                if header.get("version") != INDEX_FORMAT_VERSION:
+                    return None
+                index = cls(int(header["dimension"]), nprobe=nprobe, min_train_size=min_train_size)
+                index._ids = [str(item) for item in data["ids"]]
+                index._size = len(index._ids)
+                index._positions = {item_id: pos for pos, item_id in enumerate(index._ids)}
+                index._vectors = np.ascontiguousarray(data["vectors"], dtype=np.float32)
+                index._chapters = data["chapters"].astype(np.int32)
+                index._assign = data["assign"].astype(np.int32)
+                centroids = data["centroids"]
+                index._centroids = centroids.astype(np.float32) if len(centroids) else None
+                index._trained_size = int(header.get("trained_size", 0))
+        except Exception as exc:  # pragma: no cover - 文件损坏时重建
+            logger.warning("读取 ANN 索引失败，将重新构建: path=%s error=%s", path, exc)
+            return None
+        return index
+
+    def _nearest_centroid(self, vector: "np.ndarray") -> int:
+        return int(np.argmax(self._centroids @ vector))
+
+    def _ensure_capacity(self, required: int) -> None:
+        capacity = len(self._vectors)
+        if required <= capacity:
+            return
+        new_capacity = max(required, capacity * 2, 64)
+        vectors = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+        vectors[: self._size] = self._vectors[: self._size]
+        chapters = np.zeros(new_capacity, dtype=np.int32)
+        chapters[: self._size] = self._chapters[: self._size]
+        assign = np.zeros(new_capacity, dtype=np.int32)
+        assign[: self._size] = self._assign[: self._size]
+        self._vectors, self._chapters, self._assign = vectors, chapters, assign
+
+    def _compact(self, keep: "np.ndarray") -> None:
+        self._vectors = np.ascontiguousarray(self._vectors[: self._size][keep])
+        self._chapters = self._chapters[: self._size][keep]
+        self._assign = self._assign[: self._size][keep]
+        self._ids = [item_id for item_id, flag in zip(self._ids, keep) if flag]
+        self._positions = {item_id: pos for pos, item_id in enumerate(self._ids)}
+        self._size = len(self._ids)
+
+    @staticmethod
+    def _normalize(matrix: "np.ndarray") -> "np.ndarray":
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32, copy=False)
+
+
+class VectorIndexManager:
+    """管理所有项目的 ANN 索引：后台加载与重建、定期核对、延迟写盘与按最近使用淘汰。"""
+
+    def __init__(
+        self,
+        base_dir: Path,
+        *,
+        nprobe: int = 8,
+        min_train_size: int = 2048,
+        max_loaded: int = 16,
+        persist_delay: float = 10.0,
+    ) -> None:
+        self.base_dir = base_dir
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.max_loaded = max(1, max_loaded)
+        self.persist_delay = max(0.0, persist_delay)
+        self._indexes: "OrderedDict[Tuple[str, str], ProjectVectorIndex]" = OrderedDict()
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        # 有改动尚未写盘的索引；被淘汰的索引仍保留在这里直到写出
+        self._unsaved: Dict[Tuple[str, str], ProjectVectorIndex] = {}
+        self._tasks: Dict[Tuple[str, str, str], "asyncio.Task[None]"] = {}
+        self._flush_now = asyncio.Event()
+
+    def lock_for(self, table: str, project_id: str) -> asyncio.Lock:
+        """项目索引的写锁：增量写入、训练、写盘与重建互斥，检索不需要取锁。"""
+        return self._locks.setdefault((table, project_id), asyncio.Lock())
+
+    def get_loaded(self, table: str, project_id: str) -> Optional[ProjectVectorIndex]:
+        return self._indexes.get((table, project_id))
+
+    def get_or_refresh(
+        self,
+        table: str,
+        project_id: str,
+        *,
+        dimension: int,
+        fingerprint_rows: FingerprintLoader,
+        load_rows: RowLoader,
+    ) -> Optional[ProjectVectorIndex]:
+        """
+        返回可立即检索的索引，不等待构建。
+
+        未加载、维度不符或距上次核对超过间隔时在后台读盘或重建，期间继续返回旧索引；
+        没有可用索引时返回 None，由调用方退回全量扫描。
+        """
+        key = (table, project_id)
+        index = self._indexes.get(key)
+        if index is not None and index.dimension != dimension:
+            index = None
+        if index is not None:
+            self._indexes.move_to_end(key)
+            if time.monotonic() - index.checked_at < _VERIFY_INTERVAL:
+                return index
+        self._spawn(("refresh", *key), lambda: self._refresh(key, dimension, fingerprint_rows, load_rows))
+        return index
+
+    def mark_changed(self, table: str, project_id: str) -> None:
+        """已加载索引增量写入或删除后调用：合并延迟写盘，规模翻倍时在后台重训。"""
+        key = (table, project_id)
+        index = self._indexes.get(key)
+        if index is None:
+            return
+        self._schedule_persist(key, index)
+        if index.needs_training:
+            self._spawn(("train", *key), lambda: self._train(key))
+
+    def drop(self, table: str, project_id: str) -> None:
+        """作废索引：移出内存、放弃未写盘的改动并删除文件，下次使用时重建。"""
+        key = (table, project_id)
+        self._indexes.pop(key, None)
+        self._unsaved.pop(key, None)
+        lock = self._locks.get(key)
+        if lock is not None and not lock.locked():
+            del self._locks[key]
+        path = self.path_for(table, project_id)
+        try:
+            path.unlink(missing_ok=True)
+        except OSError as exc:  # pragma: no cover - 删除失败不影响主流程
+            logger.warning("删除 ANN 索引文件失败: path=%s error=%s", path, exc)
+
+    async def drain(self) -> None:
+        """等待后台加载与训练完成，并立即写出所有未落盘的改动；进程退出前调用。"""
+        self._flush_now.set()
+        try:
+            while True:
+                pending = [task for task in self._tasks.values() if not task.done()]
+                if not pending:
+                    break
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            self._flush_now.clear()
+
+    def path_for(self, table: str, project_id: str) -> Path:
+        safe_project = re.sub(r"[^0-9A-Za-z_.-]", "_", project_id)
+        return self.base_dir / safe_project / f"{table}.npz"
+
+    def _spawn(self, task_key: Tuple[str, str, str], factory: Callable[[], Awaitable[None]]) -> None:
+        # 同一项目同类后台任务只保留一个
+        task = self._tasks.get(task_key)
+        if task is not None and not task.done():
+            return
+        task = asyncio.create_task(factory())
+        self._tasks[task_key] = task
+        task.add_done_callback(lambda done: self._tasks.pop(task_key, None) if self._tasks.get(task_key) is done else None)
+
+    async def _refresh(
+        self,
+        key: Tuple[str, str],
+        dimension: int,
+        fingerprint_rows: FingerprintLoader,
+        load_rows: RowLoader,
+    ) -> None:
+        table, project_id = key
+        try:
+            async with self.lock_for(table, project_id):
+                expected = await fingerprint_rows()
+                if expected is None:
+                    return
+                index = self._indexes.get(key)
+                if index is not None and index.dimension == dimension and await self._matches(index, expected):
+                    index.checked_at = time.monotonic()
+                    return
+                if index is not None:
+                    logger.info("ANN 索引与向量库不一致，后台重建: table=%s project=%s", table, project_id)
+                # 其他进程可能已写出最新的索引文件，指纹一致时直接使用
+                index = await asyncio.to_thread(
+                    ProjectVectorIndex.load,
+                    self.path_for(table, project_id),
+                    nprobe=self.nprobe,
+                    min_train_size=self.min_train_size,
+                )
+                if index is None or index.dimension != dimension or not await self._matches(index, expected):
+                    rows = await load_rows()
+                    if rows is None:
+                        return
+                    index = ProjectVectorIndex(dimension, nprobe=self.nprobe, min_train_size=self.min_train_size)
+                    # 大项目全量写入与聚类训练耗时可达十秒级，放到线程中执行避免阻塞事件循环
+                    await asyncio.to_thread(index.build, *rows)
+                    self._schedule_persist(key, index)
+                    logger.info("ANN 索引构建完成: table=%s project=%s size=%d", table, project_id, len(index))
+                index.checked_at = time.monotonic()
+                self._indexes[key] = index
+                self._indexes.move_to_end(key)
+                self._evict(keep=key)
+        except Exception as exc:  # pragma: no cover - 刷新失败时检索退回全量扫描
+            logger.warning("刷新 ANN 索引失败: table=%s project=%s error=%s", table, project_id, exc)
+
+    @staticmethod
+    async def _matches(index: ProjectVectorIndex, expected: str) -> bool:
+        # 写锁内调用，id 列表不会被并发修改；大项目排序与摘要放到线程中执行
+        return await asyncio.to_thread(ids_fingerprint, index.ids) == expected
+
+    async def _train(self, key: Tuple[str, str]) -> None:
+        try:
+            # 训练期间持有写锁，增量写入排队等待；检索不取锁，继续使用旧的聚类
+            async with self.lock_for(*key):
+                index = self._indexes.get(key)
+                if index is None or not index.needs_training:
+                    return
+                centroids, assign = await asyncio.to_thread(index.fit)
+                if index.apply_training(centroids, assign):
+                    self._schedule_persist(key, index)
+        except Exception as exc:  # pragma: no cover - 训练失败时继续使用旧的聚类
+            logger.warning("训练 ANN 索引失败: table=%s project=%s error=%s", *key, exc)
+
+    def _schedule_persist(self, key: Tuple[str, str], index: ProjectVectorIndex) -> None:
+        self._unsaved[key] = index
+        self._spawn(("persist", *key), lambda: self._persist_later(key))
+
+    async def _persist_later(self, key: Tuple[str, str]) -> None:
+        # 延迟期间的多次改动合并为一次写盘；drain 时立即写出
+        while key in self._unsaved:
+            if not self._flush_now.is_set():
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), self.persist_delay)
+                except asyncio.TimeoutError:
+                    pass
+            async with self.lock_for(*key):
+                index = self._unsaved.pop(key, None)
+                if index is None:
+                    return
+                try:
+                    await asyncio.to_thread(index.save, self.path_for(*key))
+                except Exception as exc:  # pragma: no cover - 磁盘异常仅记录日志，下次启动时重建
+                    logger.error("保存 ANN 索引失败: table=%s project=%s error=%s", *key, exc)
+
+    def _evict(self, *, keep: Tuple[str, str]) -> None:
+        # 只移出内存不删文件，未写盘的改动仍由延迟写盘任务写出
+        while len(self._indexes) > self.max_loaded:
+            oldest = next(iter(self._indexes))
+            if oldest == keep:
+                break
+            del self._indexes[oldest]
+            lock = self._locks.get(oldest)
+            if lock is not None and not lock.locked():
+                del self._locks[oldest]
+            logger.info("ANN 索引超出数量上限，已淘汰: table=%s project=%s", *oldest)
+
+
+_MANAGERS: Dict[Path, VectorIndexManager] = {}
+
+
+def get_index_manager(
+    base_dir: Path,
+    *,
+    nprobe: int,
+    min_train_size: int,
+    max_loaded: int,
+    persist_delay: float,
+) -> Optional[VectorIndexManager]:
+    """按目录返回进程内共享的索引管理器，缺少 numpy 时返回 None。"""
+    if np is None:
+        return None
+    manager = _MANAGERS.get(base_dir)
+    if manager is None:
+        manager = VectorIndexManager(
+            base_dir,
+            nprobe=nprobe,
+            min_train_size=min_train_size,
+            max_loaded=max_loaded,
+            persist_delay=persist_delay,
+        )
+        _MANAGERS[base_dir] = manager
+    return manager
+
+
+__all__ = [
+    "IndexRows",
+    "ProjectVectorIndex",
+    "VectorIndexManager",
+    "get_index_manager",
+    "ids_fingerprint",
+]
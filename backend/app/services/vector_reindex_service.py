@@ -0,0 +1,407 @@
+from __future__ import annotations
+
+"""
+向量库批量回填 / 重建：遍历所有已选定版本的章节，在有界的工作池中调用 ChapterIngestionService。
+
+适用于新启用向量库或更换嵌入模型后，一次性为历史章节建立索引：
+- 进度写入检查点文件（章节内容指纹 + 嵌入模型），中断后重新执行会跳过已完成的章节；
+- 嵌入速率按（提供方, 模型）节流，所有工作协程共享同一限额；
+- 运行期间持续统计 章/分钟 与 向量/秒。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db.session import AsyncSessionLocal
+from ..models import Chapter, ChapterOutline, ChapterVersion, NovelProject
+from .chapter_ingest_service import ChapterIngestionService
+from .llm_service import LLMService
+from .vector_store_service import VectorStoreService, get_vector_store
+
+logger = logging.getLogger(__name__)
+
+SessionFactory = Callable[[], AsyncSession]
+
+
+@dataclass
+class ReindexItem:
+    chapter_id: int
+    project_id: str
+    chapter_number: int
+    user_id: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.project_id}:{self.chapter_number}"
+
+
+@dataclass
+class ReindexProgress:
+    """一次回填任务的进度与吞吐统计。"""
+
+    rebuild: bool = False
+    status: str = "running"
+    total: int = 0
+    processed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    embeddings: int = 0
+    error: Optional[str] = None
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = max(self.elapsed, 1e-6)
+        return {
+            "status": self.status,
+            "rebuild": self.rebuild,
+            "total": self.total,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "remaining": max(0, self.total - self.processed - self.skipped - self.failed),
+            "embeddings": self.embeddings,
+            "elapsed_seconds": round(elapsed, 2),
+            "chapters_per_minute": round(self.processed / elapsed * 60, 2),
+            "embeddings_per_second": round(self.embeddings / elapsed, 2),
+            "error": self.error,
+        }
+
+
+class ReindexCheckpoint:
+    """以 JSON 文件记录已完成章节的内容指纹，嵌入模型变化后旧记录整体失效。
+
+    ``completed`` 表示上一次任务是否完整结束，重建模式据此区分“续跑”与“重新开始”；
+    ``rebuild`` 记录任务是否以重建模式运行（包括因模型变化自动切换的情况），
+    未结束的重建续跑时必须保持重建模式，否则剩余章节会按内容比对被误判为未变化。
+    """
+
+    def __init__(self, path: Path, *, model_key: str, flush_every: int = 20) -> None:
+        self.path = path
+        self.model_key = model_key
+        self.flush_every = max(1, flush_every)
+        self.previous_model_key: Optional[str] = None
+        self.completed = False
+        self.rebuild = False
+        self._done: Dict[str, str] = {}
+        self._dirty = 0
+
+    def load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logger.warning("读取回填检查点失败，将从头开始: path=%s error=%s", self.path, exc)
+            return
+        self.previous_model_key = data.get("model_key")
+        if self.previous_model_key == self.model_key:
+            self._done = dict(data.get("done") or {})
+            self.completed = bool(data.get("completed"))
+            self.rebuild = bool(data.get("rebuild"))
+
+    def reset(self) -> None:
+        self._done.clear()
+        self.completed = False
+        self._dirty = 0
+        self.path.unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def is_done(self, key: str, fingerprint: str) -> bool:
+        return self._done.get(key) == fingerprint
+
+    def mark_done(self, key: str, fingerprint: str) -> None:
+        self._done[key] = fingerprint
+        self._dirty += 1
+        if self._dirty >= self.flush_every:
+            self.flush()
+
+    def flush(self, *, completed: bool = False) -> None:
+        self.completed = completed
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(
+            json.dumps(
+                {
+                    "model_key": self.model_key,
+                    "completed": completed,
+                    "rebuild": self.rebuild,
+                    "done": self._done,
+                },
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+        # 先写临时文件再原子替换，进程中途退出也不会留下半截检查点
+        os.replace(tmp_path, self.path)
+        self._dirty = 0
+
+
+class _EmbeddingPacer:
+    """限制平均嵌入速率：按已消耗的向量条数推迟下一次请求。"""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self._next_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def consume(self, count: int) -> None:
+        if self.rate <= 0 or count <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            start = max(self._next_at, now)
+            self._next_at = start + count / self.rate
+            delay = start - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_PACERS: Dict[str, _EmbeddingPacer] = {}
+
+
+def _get_pacer(model_key: str) -> _EmbeddingPacer:
+    """按（提供方, 模型）共享节流器，同一提供方上的多个任务合并计算速率。"""
+    rate = settings.vector_reindex_embeddings_per_second
+    pacer = _PACERS.get(model_key)
+    if pacer is None or pacer.rate != rate:
+        pacer = _EmbeddingPacer(rate)
+        _PACERS[model_key] = pacer
+    return pacer
+
+
+def default_checkpoint_path() -> Path:
+    if settings.vector_reindex_checkpoint_path:
+        return Path(settings.vector_reindex_checkpoint_path).expanduser().resolve()
+    return Path(__file__).resolve().parents[2] / "storage" / "vector_reindex_checkpoint.json"
+
+
+def _fingerprint(title: str, content: str, summary: Optional[str]) -> str:
+    digest = hashlib.sha256()
+    for part in (title, content, summary or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:16]
+
+
+class VectorReindexService:
+    """遍历章节并批量写入向量库。"""
+
+    def __init__(
+        self,
+        *,
+        project_ids: Optional[Sequence[str]] = None,
+        rebuild: bool = False,
+        workers: Optional[int] = None,
+        checkpoint_path: Optional[Path] = None,
+        session_factory: SessionFactory = AsyncSessionLocal,
+        vector_store: Optional[VectorStoreService] = None,
+    ) -> None:
+        self.project_ids = list(project_ids or [])
+        self.rebuild = rebuild
+        self.workers = max(1, workers or settings.vector_reindex_workers)
+        self.checkpoint_path = checkpoint_path or default_checkpoint_path()
+        self._session_factory = session_factory
+        self._vector_store = vector_store or get_vector_store()
+
+    async def run(self, progress: Optional[ReindexProgress] = None) -> ReindexProgress:
+        """执行回填，返回最终进度；单个章节失败只计数，不中断整体任务。"""
+        progress = progress or ReindexProgress(rebuild=self.rebuild)
+        if self._vector_store is None:
+            progress.status = "failed"
+            progress.error = "向量库未启用"
+            progress.finished_at = time.monotonic()
+            return progress
+
+        async with self._session_factory() as session:
+            model_key = await LLMService(session).get_embedding_model_key()
+            items = await self._list_items(session)
+        progress.total = len(items)
+
+        checkpoint = ReindexCheckpoint(self.checkpoint_path, model_key=model_key)
+        checkpoint.load()
+        if checkpoint.previous_model_key and checkpoint.previous_model_key != model_key and not self.rebuild:
+            # 片段 id 只由内容决定，模型变化后增量比对会误判为未变化，必须整章重建
+            logger.warning(
+                "嵌入模型已由 %s 变更为 %s，本次回填自动切换为重建模式",
+                checkpoint.previous_model_key,
+                model_key,
+            )
+            self.rebuild = progress.rebuild = True
+        elif self.rebuild and checkpoint.completed:
+            # 上一次任务已完整结束，本次重建从头开始；未结束的重建则在检查点基础上续跑
+            checkpoint.reset()
+        elif checkpoint.rebuild and not checkpoint.completed and not self.rebuild:
+            # 上一次重建（可能由模型变化触发）中途退出，剩余章节仍需重建，不能退回增量比对
+            logger.warning("上一次重建任务未完成，本次回填继续以重建模式执行")
+            self.rebuild = progress.rebuild = True
+        checkpoint.rebuild = self.rebuild
+
+        logger.info(
+            "开始向量回填: chapters=%d workers=%d rebuild=%s model=%s checkpoint=%d",
+            len(items),
+            self.workers,
+            self.rebuild,
+            model_key,
+            len(checkpoint),
+        )
+        queue: "asyncio.Queue[ReindexItem]" = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+        pacer = _get_pacer(model_key)
+
+        try:
+            await asyncio.gather(
+                *(self._worker(queue, checkpoint, pacer, progress) for _ in range(min(self.workers, len(items) or 1)))
+            )
+            progress.status = "completed"
+        except asyncio.CancelledError:
+            progress.status = "cancelled"
+            raise
+        finally:
+            checkpoint.flush(completed=progress.status == "completed")
+            progress.finished_at = time.monotonic()
+            logger.info("向量回填结束: %s", progress.as_dict())
+        return progress
+
+    async def _list_items(self, session: AsyncSession) -> List[ReindexItem]:
+        stmt = (
+            select(Chapter.id, Chapter.project_id, Chapter.chapter_number, NovelProject.user_id)
+            .join(NovelProject, NovelProject.id == Chapter.project_id)
+            .where(Chapter.selected_version_id.is_not(None))
+            .order_by(Chapter.project_id, Chapter.chapter_number)
+        )
+        if self.project_ids:
+            stmt = stmt.where(Chapter.project_id.in_(self.project_ids))
+        rows = (await session.execute(stmt)).all()
+        return [ReindexItem(*row) for row in rows]
+
+    async def _worker(
+        self,
+        queue: "asyncio.Queue[ReindexItem]",
+        checkpoint: ReindexCheckpoint,
+        pacer: _EmbeddingPacer,
+        progress: ReindexProgress,
+    ) -> None:
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                embedded = await self._reindex_one(item, checkpoint)
+            except Exception as exc:  # noqa: BLE001 - 单章失败不影响其余章节
+                logger.error("章节向量回填失败: chapter=%s error=%s", item.key, exc, exc_info=True)
+                progress.failed += 1
+                continue
+            if embedded is None:
+                progress.skipped += 1
+                continue
+            progress.processed += 1
+            progress.embeddings += embedded
+            done = progress.processed + progress.skipped + progress.failed
+            if done % 50 == 0:
+                logger.info("向量回填进度: %s", progress.as_dict())
+            await pacer.consume(embedded)
+
+    async def _reindex_one(self, item: ReindexItem, checkpoint: ReindexCheckpoint) -> Optional[int]:
+        async with self._session_factory() as session:
+            row = (
+                await session.execute(
+                    select(ChapterVersion.content, Chapter.real_summary, ChapterOutline.title)
+                    .join(ChapterVersion, ChapterVersion.id == Chapter.selected_version_id)
+                    .outerjoin(
+                        ChapterOutline,
+                        and_(
+                            ChapterOutline.project_id == Chapter.project_id,
+                            ChapterOutline.chapter_number == Chapter.chapter_number,
+                        ),
+                    )
+                    .where(Chapter.id == item.chapter_id)
+                )
+            ).first()
+            if row is None or not (row.content or "").strip():
+                return None
+            title = row.title or f"第{item.chapter_number}章"
+            fingerprint = _fingerprint(title, row.content, row.real_summary)
+            if checkpoint.is_done(item.key, fingerprint):
+                return None
+
+            ingestion = ChapterIngestionService(llm_service=LLMService(session), vector_store=self._vector_store)
+            embedded = await ingestion.ingest_chapter(
+                project_id=item.project_id,
+                chapter_number=item.chapter_number,
+                title=title,
+                content=row.content,
+                summary=row.real_summary,
+                user_id=item.user_id,
+                rebuild=self.rebuild,
+            )
+        if embedded is None:
+            raise RuntimeError("向量写入失败")
+        checkpoint.mark_done(item.key, fingerprint)
+        return embedded
+
+
+_current_progress: Optional[ReindexProgress] = None
+_current_task: Optional["asyncio.Task[ReindexProgress]"] = None
+
+
+def get_reindex_progress() -> Optional[ReindexProgress]:
+    """返回最近一次后台回填任务的进度，从未运行时返回 None。"""
+    return _current_progress
+
+
+def start_reindex_job(
+    *,
+    project_ids: Optional[Sequence[str]] = None,
+    rebuild: bool = False,
+    workers: Optional[int] = None,
+) -> ReindexProgress:
+    """在当前事件循环中启动后台回填任务，已有任务运行时抛出 RuntimeError。"""
+    global _current_progress, _current_task
+    if _current_task is not None and not _current_task.done():
+        raise RuntimeError("已有向量回填任务正在运行")
+    service = VectorReindexService(project_ids=project_ids, rebuild=rebuild, workers=workers)
+    progress = ReindexProgress(rebuild=rebuild)
+    _current_progress = progress
+
+    async def _run() -> ReindexProgress:
+        try:
+            return await service.run(progress)
+        except Exception as exc:  # noqa: BLE001 - 后台任务需记录失败原因
+            logger.error("向量回填任务异常终止: %s", exc, exc_info=True)
+            progress.status = "failed"
+            progress.error = str(exc)
+            progress.finished_at = time.monotonic()
+            return progress
+
+    _current_task = asyncio.create_task(_run())
+    return progress
+
+
+__all__ = [
+    "ReindexCheckpoint",
+    "ReindexProgress",
+    "VectorReindexService",
+    "default_checkpoint_path",
+    "get_reindex_progress",
+    "start_reindex_job",
+]
@@ -9,13 +9,18 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
-import math
+import time
 from array import array
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence
+from typing import Any, Collection, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
 
 from ..core.config import settings
+from ..utils.metrics import vector_store_batch_duration, vector_store_batch_statements
+from .vector_codec import FORMAT_FLOAT32, STORAGE_FORMATS, decode_vector, encode_vector, encoded_size
+from .vector_index import IndexRows, ProjectVectorIndex, VectorIndexManager, get_index_manager, ids_fingerprint
 
 try:  # noqa: SIM105 - 明确区分依赖缺失的情况
     import libsql_client
@@ -24,6 +29,110 @@ except ImportError:  # pragma: no cover - 在未安装依赖时提供友好提
 
 logger = logging.getLogger(__name__)
 
+# 已完成建表检查的向量库地址，同一进程内只执行一次 DDL
+_SCHEMA_READY_URLS: Set[str] = set()
+
+# 各项目向量数据的版本号，任何写入或删除都会递增，供检索结果缓存判断是否过期
+_project_generations: Dict[str, int] = {}
+
+# 检索章节范围缺省的一端使用 SQLite 整数极值
+_MIN_CHAPTER = -(2**63)
+_MAX_CHAPTER = 2**63 - 1
+
+# 词法索引构建时读取的文本字段，两张表统一为 id / chapter_number / title / text / metadata
+_DOCUMENT_SQL = {
+    "rag_chunks": """
+        SELECT id, chapter_number, chapter_title AS title, content AS text,
+               COALESCE(metadata, '{}') AS metadata
+        FROM rag_chunks
+        WHERE project_id = :project_id
+    """,
+    "rag_summaries": """
+        SELECT id, chapter_number, title, summary AS text, '{}' AS metadata
+        FROM rag_summaries
+        WHERE project_id = :project_id
+    """,
+}
+
+# 应用级共享实例，由 FastAPI lifespan 或后台进程负责创建与关闭
+_shared_store: Optional["VectorStoreService"] = None
+_shared_store_failed = False
+
+_UPSERT_CHUNK_SQL = """
+INSERT INTO rag_chunks (
+    id,
+    project_id,
+    chapter_number,
+    chunk_index,
+    chapter_title,
+    content,
+    embedding,
+    embedding_format,
+    metadata
+) VALUES (
+    :id,
+    :project_id,
+    :chapter_number,
+    :chunk_index,
+    :chapter_title,
+    :content,
+    :embedding,
+    :embedding_format,
+    :metadata
+)
+ON CONFLICT(id) DO UPDATE SET
+    content=excluded.content,
+    embedding=excluded.embedding,
+    embedding_format=excluded.embedding_format,
+    metadata=excluded.metadata,
+    chapter_title=excluded.chapter_title
+"""
+
+_UPSERT_SUMMARY_SQL = """
+INSERT INTO rag_summaries (
+    id,
+    project_id,
+    chapter_number,
+    title,
+    summary,
+    embedding,
+    embedding_format
+) VALUES (
+    :id,
+    :project_id,
+    :chapter_number,
+    :title,
+    :summary,
+    :embedding,
+    :embedding_format
+)
+ON CONFLICT(id) DO UPDATE SET
+    summary=excluded.summary,
+    embedding=excluded.embedding,
+    embedding_format=excluded.embedding_format,
+    title=excluded.title
+"""
+
+# 压缩存储时保留的 float32 精确副本，仅在重排候选时按主键读取
+_UPSERT_EXACT_SQL = """
+INSERT INTO rag_exact_vectors (
+    source,
+    id,
+    project_id,
+    chapter_number,
+    embedding
+) VALUES (
+    :source,
+    :id,
+    :project_id,
+    :chapter_number,
+    :embedding
+)
+ON CONFLICT(source, id) DO UPDATE SET
+    embedding=excluded.embedding,
+    chapter_number=excluded.chapter_number
+"""
+
 
 @dataclass
 class RetrievedChunk:
@@ -46,10 +155,26 @@ class RetrievedSummary:
     score: float
 
 
+@dataclass
+class ChapterVectorState:
+    """章节在向量库中的现存状态，用于增量入库时比对差异。"""
+
+    # 片段 id -> (chunk_index, chapter_title)
+    chunks: Dict[str, Tuple[int, Optional[str]]] = field(default_factory=dict)
+    summary: Optional[str] = None
+    summary_title: Optional[str] = None
+
+
 class VectorStoreService:
     """libsql 向量库操作工具，确保不同小说项目的数据隔离。"""
 
-    def __init__(self) -> None:
+    def __init__(self, *, pool_size: Optional[int] = None) -> None:
+        self._index_manager: Optional[VectorIndexManager] = None
+        self._readers: List[Any] = []
+        self._next_reader = 0
+        # 写入格式：压缩格式需要应用层粗排 + 精确重排
+        self._storage_format = STORAGE_FORMATS[settings.vector_storage_format]
+        self._compact = self._storage_format != FORMAT_FLOAT32
         if not settings.vector_store_enabled:
             logger.warning("未开启向量库配置，RAG 检索将被跳过。")
             self._client = None
@@ -60,25 +185,45 @@ class VectorStoreService:
             raise RuntimeError("缺少 libsql-client 依赖，请先在环境中安装。")
 
         url = settings.vector_db_url
+        local_db_path: Optional[Path] = None
         if url and url.startswith("file:"):
             path_part = url.split("file:", 1)[1]
             resolved = Path(path_part).expanduser().resolve()
             resolved.parent.mkdir(parents=True, exist_ok=True)
             url = f"file:{resolved}"
+            local_db_path = resolved
             logger.info("向量库使用本地文件: %s", resolved)
+        self._url = url
 
-        try:
-            logger.info("初始化 libsql 客户端: url=%s", url)
-            self._client = libsql_client.create_client(
-                url=url,
-                auth_token=settings.vector_db_auth_token,
+        if settings.vector_index_enabled:
+            self._index_manager = get_index_manager(
+                self._resolve_index_dir(local_db_path),
+                nprobe=settings.vector_index_nprobe,
+                min_train_size=settings.vector_index_min_train_size,
+                max_loaded=settings.vector_index_max_loaded,
+                persist_delay=settings.vector_index_persist_delay,
             )
+
+        # 本地文件库的客户端每次操作自行打开连接，多建客户端没有意义
+        size = 1 if local_db_path is not None else max(1, pool_size or settings.vector_db_pool_size)
+        try:
+            logger.info("初始化 libsql 客户端: url=%s pool_size=%d", url, size)
+            self._readers = [
+                libsql_client.create_client(
+                    url=url,
+                    auth_token=settings.vector_db_auth_token,
+                )
+                for _ in range(size)
+            ]
         except Exception as exc:  # pragma: no cover - 连接异常仅打印日志
             logger.error("初始化 libsql 客户端失败: %s", exc)
             self._client = None
+            self._readers = []
             self._schema_ready = True
         else:
-            self._schema_ready = False
+            # 首个客户端同时负责建表与写入，其余客户端仅分担读请求
+            self._client = self._readers[0]
+            self._schema_ready = url in _SCHEMA_READY_URLS
             logger.info("libsql 客户端初始化成功，等待建表。")
 
     async def close(self) -> None:
@@ -86,19 +231,24 @@ class VectorStoreService:
 
         ✅ 修复：添加资源清理方法，避免连接泄漏
         """
+        if self._index_manager is not None:
+            # 先等后台索引任务结束并写出未落盘的改动，再关闭它们依赖的连接
+            await self._index_manager.drain()
         if self._client:
             try:
-                # libsql_client 可能有 close 方法
-                if hasattr(self._client, 'close'):
-                    if asyncio.iscoroutinefunction(self._client.close):
-                        await self._client.close()
-                    else:
-                        self._client.close()
+                for client in self._readers:
+                    # libsql_client 可能有 close 方法
+                    if hasattr(client, 'close'):
+                        if asyncio.iscoroutinefunction(client.close):
+                            await client.close()
+                        else:
+                            client.close()
                 logger.info("libsql 客户端已关闭")
             except Exception as e:
                 logger.warning(f"关闭 libsql 客户端时出错: {e}")
             finally:
                 self._client = None
+                self._readers = []
                 self._schema_ready = True
 
     def __del__(self):
@@ -106,14 +256,23 @@ class VectorStoreService:
 
         注意：这是最后的保障，不应依赖此方法进行资源清理
         """
-        if self._client:
+        if getattr(self, "_client", None):
             logger.warning("VectorStoreService 未正确关闭，在析构函数中清理资源")
             # 同步关闭（如果支持）
-            if hasattr(self._client, 'close'):
-                try:
-                    self._client.close()
-                except Exception:
-                    pass
+            for client in self._readers:
+                if hasattr(client, 'close'):
+                    try:
+                        client.close()
+                    except Exception:
+                        pass
+
+    def _reader(self) -> Any:
+        """轮询返回用于只读查询的客户端。"""
+        if len(self._readers) <= 1:
+            return self._client
+        client = self._readers[self._next_reader % len(self._readers)]
+        self._next_reader += 1
+        return client
 
     async def ensure_schema(self) -> None:
         """初始化向量表结构，保证系统首次运行即可使用。"""
@@ -153,16 +312,40 @@ class VectorStoreService:
             CREATE INDEX IF NOT EXISTS idx_rag_summaries_project
             ON rag_summaries(project_id, chapter_number)
             """,
+            """
+            CREATE TABLE IF NOT EXISTS rag_exact_vectors (
+                source TEXT NOT NULL,
+                id TEXT NOT NULL,
+                project_id TEXT NOT NULL,
+                chapter_number INTEGER NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (source, id)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_rag_exact_vectors_project
+            ON rag_exact_vectors(project_id, chapter_number)
+            """,
         ]
 
         try:
             for sql in statements:
                 await self._client.execute(sql)  # type: ignore[union-attr]
+            # 旧库补充 embedding_format 列，历史数据均为 float32
+            for table in ("rag_chunks", "rag_summaries"):
+                result = await self._client.execute(f"PRAGMA table_info({table})")  # type: ignore[union-attr]
+                columns = {row.get("name") for row in self._iter_rows(result)}
+                if "embedding_format" not in columns:
+                    await self._client.execute(  # type: ignore[union-attr]
+                        f"ALTER TABLE {table} ADD COLUMN embedding_format TEXT NOT NULL DEFAULT '{FORMAT_FLOAT32}'"
+                    )
+                    logger.info("已为 %s 补充 embedding_format 列", table)
             logger.info("已确保向量库表结构存在。")
         except Exception as exc:  # pragma: no cover - 初始化失败时记录日志
             logger.error("创建向量库表结构失败: %s", exc)
         else:
             self._schema_ready = True
+            _SCHEMA_READY_URLS.add(self._url)
 
     async def query_chunks(
         self,
@@ -170,16 +353,43 @@ class VectorStoreService:
         project_id: str,
         embedding: Sequence[float],
         top_k: Optional[int] = None,
+        exact: bool = False,
+        min_chapter: Optional[int] = None,
+        max_chapter: Optional[int] = None,
     ) -> List[RetrievedChunk]:
-        """根据查询向量检索剧情片段，结果已按相似度排序。"""
+        """根据查询向量检索剧情片段，结果已按相似度排序。
+
+        默认走 ANN 索引；``exact=True`` 时强制全量精确扫描，可用于校验索引召回率。
+        ``min_chapter`` / ``max_chapter`` 限定章节闭区间，检索只读取范围内的向量。
+        """
         if not self._client or not embedding:
             return []
 
         await self.ensure_schema()
         top_k = top_k or settings.vector_top_k_chunks
-        if top_k <= 0:
+        lower, upper = self._chapter_bounds(min_chapter, max_chapter)
+        if top_k <= 0 or lower > upper:
             return []
 
+        if not exact and self._index_manager:
+            indexed = await self._query_chunks_with_index(
+                project_id=project_id,
+                embedding=embedding,
+                top_k=top_k,
+                chapter_bounds=(lower, upper),
+            )
+            if indexed is not None:
+                return indexed
+
+        if self._compact:
+            # 压缩向量无法交给 vector_distance_cosine，直接走应用层粗排 + 精确重排
+            return await self._query_chunks_with_python_similarity(
+                project_id=project_id,
+                embedding=embedding,
+                top_k=top_k,
+                chapter_bounds=(lower, upper),
+            )
+
         blob = self._to_f32_blob(embedding)
         sql = """
         SELECT
@@ -190,16 +400,19 @@ class VectorStoreService:
             vector_distance_cosine(embedding, :query) AS distance
         FROM rag_chunks
         WHERE project_id = :project_id
+          AND chapter_number BETWEEN :min_chapter AND :max_chapter
         ORDER BY distance ASC
         LIMIT :limit
         """
         try:
-            result = await self._client.execute(  # type: ignore[union-attr]
+            result = await self._reader().execute(  # type: ignore[union-attr]
                 sql,
                 {
                     "project_id": project_id,
                     "query": blob,
                     "limit": top_k,
+                    "min_chapter": lower,
+                    "max_chapter": upper,
                 },
             )
         except Exception as exc:  # pragma: no cover - 查询异常时仅记录
@@ -209,6 +422,7 @@ class VectorStoreService:
                     project_id=project_id,
                     embedding=embedding,
                     top_k=top_k,
+                    chapter_bounds=(lower, upper),
                 )
             logger.warning("向量检索剧情片段失败: %s", exc)
             return []
@@ -232,16 +446,38 @@ class VectorStoreService:
         project_id: str,
         embedding: Sequence[float],
         top_k: Optional[int] = None,
+        exact: bool = False,
+        min_chapter: Optional[int] = None,
+        max_chapter: Optional[int] = None,
     ) -> List[RetrievedSummary]:
-        """根据查询向量检索章节摘要列表。"""
+        """根据查询向量检索章节摘要列表，参数含义同 :meth:`query_chunks`。"""
         if not self._client or not embedding:
             return []
 
         await self.ensure_schema()
         top_k = top_k or settings.vector_top_k_summaries
-        if top_k <= 0:
+        lower, upper = self._chapter_bounds(min_chapter, max_chapter)
+        if top_k <= 0 or lower > upper:
             return []
 
+        if not exact and self._index_manager:
+            indexed = await self._query_summaries_with_index(
+                project_id=project_id,
+                embedding=embedding,
+                top_k=top_k,
+                chapter_bounds=(lower, upper),
+            )
+            if indexed is not None:
+                return indexed
+
+        if self._compact:
+            return await self._query_summaries_with_python_similarity(
+                project_id=project_id,
+                embedding=embedding,
+                top_k=top_k,
+                chapter_bounds=(lower, upper),
+            )
+
         blob = self._to_f32_blob(embedding)
         sql = """
         SELECT
@@ -251,16 +487,19 @@ class VectorStoreService:
             vector_distance_cosine(embedding, :query) AS distance
         FROM rag_summaries
         WHERE project_id = :project_id
+          AND chapter_number BETWEEN :min_chapter AND :max_chapter
         ORDER BY distance ASC
         LIMIT :limit
         """
         try:
-            result = await self._client.execute(  # type: ignore[union-attr]
+            result = await self._reader().execute(  # type: ignore[union-attr]
                 sql,
                 {
                     "project_id": project_id,
                     "query": blob,
                     "limit": top_k,
+                    "min_chapter": lower,
+                    "max_chapter": upper,
                 },
             )
         except Exception as exc:  # pragma: no cover - 查询异常时仅记录
@@ -270,6 +509,7 @@ class VectorStoreService:
                     project_id=project_id,
                     embedding=embedding,
                     top_k=top_k,
+                    chapter_bounds=(lower, upper),
                 )
             logger.warning("向量检索章节摘要失败: %s", exc)
             return []
@@ -291,120 +531,212 @@ class VectorStoreService:
         *,
         records: Iterable[Dict[str, Any]],
     ) -> None:
-        """批量写入章节片段，供后续检索使用。"""
+        """批量写入章节片段，供后续检索使用；所有记录在同一事务中提交。"""
         if not self._client:
             return
 
         await self.ensure_schema()
-        sql = """
-        INSERT INTO rag_chunks (
-            id,
-            project_id,
-            chapter_number,
-            chunk_index,
-            chapter_title,
-            content,
-            embedding,
-            metadata
-        ) VALUES (
-            :id,
-            :project_id,
-            :chapter_number,
-            :chunk_index,
-            :chapter_title,
-            :content,
-            :embedding,
-            :metadata
-        )
-        ON CONFLICT(id) DO UPDATE SET
-            content=excluded.content,
-            embedding=excluded.embedding,
-            metadata=excluded.metadata,
-            chapter_title=excluded.chapter_title
-        """
-        payload = []
-        for item in records:
-            embedding = item.get("embedding", [])
-            payload.append(
-                {
-                    **item,
-                    "embedding": self._to_f32_blob(embedding),
-                    "metadata": json.dumps(item.get("metadata") or {}, ensure_ascii=False),
-                }
-            )
-
+        payload, vectors = self._prepare_chunk_payload(records)
         if not payload:
             return
 
-        for item in payload:
-            try:
-                await self._client.execute(sql, item)  # type: ignore[union-attr]
-            except Exception as exc:  # pragma: no cover - 单条写入失败时记录日志
-                logger.error("写入 rag_chunks 失败: %s", exc)
-            else:
-                logger.debug(
-                    "已写入章节片段: project=%s chapter=%s chunk=%s",
-                    item.get("project_id"),
-                    item.get("chapter_number"),
-                    item.get("chunk_index"),
-                )
+        statements = [(_UPSERT_CHUNK_SQL, item) for item in payload]
+        statements.extend(self._exact_statements("rag_chunks", payload, vectors))
+        if not await self._execute_batch("upsert_chunks", statements):
+            return
+        logger.debug("已批量写入章节片段: count=%d", len(payload))
+        self._bump_generation(item["project_id"] for item in payload)
+        await self._index_upsert("rag_chunks", list(zip(payload, vectors)))
 
     async def upsert_summaries(
         self,
         *,
         records: Iterable[Dict[str, Any]],
     ) -> None:
-        """同步章节摘要向量，供摘要层检索使用。"""
+        """同步章节摘要向量，供摘要层检索使用；所有记录在同一事务中提交。"""
         if not self._client:
             return
 
         await self.ensure_schema()
-        sql = """
-        INSERT INTO rag_summaries (
-            id,
+        payload, vectors = self._prepare_summary_payload(records)
+        if not payload:
+            return
+
+        statements = [(_UPSERT_SUMMARY_SQL, item) for item in payload]
+        statements.extend(self._exact_statements("rag_summaries", payload, vectors))
+        if not await self._execute_batch("upsert_summaries", statements):
+            return
+        logger.debug("已批量写入章节摘要: count=%d", len(payload))
+        self._bump_generation(item["project_id"] for item in payload)
+        await self._index_upsert("rag_summaries", list(zip(payload, vectors)))
+
+    async def replace_chapter(
+        self,
+        *,
+        project_id: str,
+        chapter_number: int,
+        chunk_records: Iterable[Dict[str, Any]],
+        summary_records: Iterable[Dict[str, Any]] = (),
+    ) -> bool:
+        """原子地替换单个章节的全部片段与摘要。
+
+        删除旧数据与写入新数据合并为一次 batch 调用：远程库只需一次往返，
+        且任一语句失败时整体回滚，不会出现章节向量被删空的中间状态。
+        """
+        if not self._client:
+            return False
+
+        await self.ensure_schema()
+        chunk_payload, chunk_vectors = self._prepare_chunk_payload(chunk_records)
+        summary_payload, summary_vectors = self._prepare_summary_payload(summary_records)
+        statements = self._delete_statements(project_id, [chapter_number])
+        statements.extend((_UPSERT_CHUNK_SQL, item) for item in chunk_payload)
+        statements.extend((_UPSERT_SUMMARY_SQL, item) for item in summary_payload)
+        statements.extend(self._exact_statements("rag_chunks", chunk_payload, chunk_vectors))
+        statements.extend(self._exact_statements("rag_summaries", summary_payload, summary_vectors))
+
+        if not await self._execute_batch("replace_chapter", statements):
+            return False
+        self._bump_generation([project_id])
+        logger.info(
+            "已替换章节向量: project=%s chapter=%s chunks=%d summaries=%d",
             project_id,
             chapter_number,
-            title,
-            summary,
-            embedding
-        ) VALUES (
-            :id,
-            :project_id,
-            :chapter_number,
-            :title,
-            :summary,
-            :embedding
+            len(chunk_payload),
+            len(summary_payload),
         )
-        ON CONFLICT(id) DO UPDATE SET
-            summary=excluded.summary,
-            embedding=excluded.embedding,
-            title=excluded.title
-        """
+        await self._index_remove_chapters(project_id, [chapter_number])
+        await self._index_upsert("rag_chunks", list(zip(chunk_payload, chunk_vectors)))
+        await self._index_upsert("rag_summaries", list(zip(summary_payload, summary_vectors)))
+        return True
 
-        payload = []
-        for item in records:
-            embedding = item.get("embedding", [])
-            payload.append(
-                {
-                    **item,
-                    "embedding": self._to_f32_blob(embedding),
-                }
+    async def get_chapter_state(self, project_id: str, chapter_number: int) -> Optional[ChapterVectorState]:
+        """读取章节已入库的片段 id 与摘要文本，读取失败时返回 None。"""
+        if not self._client:
+            return None
+
+        await self.ensure_schema()
+        params = {"project_id": project_id, "chapter_number": chapter_number}
+        try:
+            chunk_result = await self._reader().execute(  # type: ignore[union-attr]
+                """
+                SELECT id, chunk_index, chapter_title
+                FROM rag_chunks
+                WHERE project_id = :project_id AND chapter_number = :chapter_number
+                """,
+                params,
             )
+            summary_result = await self._reader().execute(  # type: ignore[union-attr]
+                """
+                SELECT title, summary
+                FROM rag_summaries
+                WHERE project_id = :project_id AND chapter_number = :chapter_number
+                LIMIT 1
+                """,
+                params,
+            )
+        except Exception as exc:  # pragma: no cover - 读取失败时由调用方回退为整章替换
+            logger.warning("读取章节向量状态失败: project=%s chapter=%s error=%s", project_id, chapter_number, exc)
+            return None
 
-        if not payload:
-            return
+        state = ChapterVectorState(
+            chunks={
+                str(row.get("id")): (int(row.get("chunk_index") or 0), row.get("chapter_title"))
+                for row in self._iter_rows(chunk_result)
+            }
+        )
+        for row in self._iter_rows(summary_result):
+            state.summary = row.get("summary")
+            state.summary_title = row.get("title")
+        return state
 
-        for item in payload:
-            try:
-                await self._client.execute(sql, item)  # type: ignore[union-attr]
-            except Exception as exc:  # pragma: no cover - 单条写入失败时记录日志
-                logger.error("写入 rag_summaries 失败: %s", exc)
-            else:
-                logger.debug(
-                    "已写入章节摘要: project=%s chapter=%s",
-                    item.get("project_id"),
-                    item.get("chapter_number"),
+    async def sync_chapter(
+        self,
+        *,
+        project_id: str,
+        chapter_number: int,
+        chunk_records: Iterable[Dict[str, Any]] = (),
+        stale_chunk_ids: Collection[str] = (),
+        moved_chunks: Iterable[Dict[str, Any]] = (),
+        summary_records: Iterable[Dict[str, Any]] = (),
+        delete_summary: bool = False,
+    ) -> bool:
+        """按差异增量更新单个章节，所有变更在同一事务中提交。
+
+        ``chunk_records`` 为新增片段，``stale_chunk_ids`` 为需删除的旧片段，
+        ``moved_chunks`` 仅更新位置与标题（``id``/``chunk_index``/``chapter_title``），不改动向量。
+        """
+        if not self._client:
+            return False
+
+        await self.ensure_schema()
+        chunk_payload, chunk_vectors = self._prepare_chunk_payload(chunk_records)
+        summary_payload, summary_vectors = self._prepare_summary_payload(summary_records)
+        stale_ids = list(stale_chunk_ids)
+        moved = list(moved_chunks)
+
+        statements: List[Tuple[str, Dict[str, Any]]] = []
+        if stale_ids:
+            placeholders = ",".join(":id_" + str(idx) for idx in range(len(stale_ids)))
+            params = {"project_id": project_id, **{f"id_{idx}": item_id for idx, item_id in enumerate(stale_ids)}}
+            statements.append(
+                (f"DELETE FROM rag_chunks WHERE project_id = :project_id AND id IN ({placeholders})", params)
+            )
+            statements.append(
+                (
+                    "DELETE FROM rag_exact_vectors WHERE source = 'rag_chunks' "
+                    f"AND project_id = :project_id AND id IN ({placeholders})",
+                    params,
                 )
+            )
+        statements.extend(
+            (
+                "UPDATE rag_chunks SET chunk_index = :chunk_index, chapter_title = :chapter_title WHERE id = :id",
+                {"id": item["id"], "chunk_index": item["chunk_index"], "chapter_title": item.get("chapter_title")},
+            )
+            for item in moved
+        )
+        statements.extend((_UPSERT_CHUNK_SQL, item) for item in chunk_payload)
+        if delete_summary:
+            params = {"project_id": project_id, "chapter_number": chapter_number}
+            statements.append(
+                (
+                    "DELETE FROM rag_summaries WHERE project_id = :project_id AND chapter_number = :chapter_number",
+                    params,
+                )
+            )
+            statements.append(
+                (
+                    "DELETE FROM rag_exact_vectors WHERE source = 'rag_summaries' "
+                    "AND project_id = :project_id AND chapter_number = :chapter_number",
+                    params,
+                )
+            )
+        statements.extend((_UPSERT_SUMMARY_SQL, item) for item in summary_payload)
+        statements.extend(self._exact_statements("rag_chunks", chunk_payload, chunk_vectors))
+        statements.extend(self._exact_statements("rag_summaries", summary_payload, summary_vectors))
+        if not statements:
+            return True
+
+        if not await self._execute_batch("sync_chapter", statements):
+            return False
+        self._bump_generation([project_id])
+        logger.info(
+            "已增量更新章节向量: project=%s chapter=%s added=%d removed=%d moved=%d summaries=%d",
+            project_id,
+            chapter_number,
+            len(chunk_payload),
+            len(stale_ids),
+            len(moved),
+            len(summary_payload),
+        )
+        if stale_ids:
+            await self._index_remove_ids("rag_chunks", project_id, stale_ids)
+        if delete_summary:
+            await self._index_remove_chapters(project_id, [chapter_number], tables=("rag_summaries",))
+        await self._index_upsert("rag_chunks", list(zip(chunk_payload, chunk_vectors)))
+        await self._index_upsert("rag_summaries", list(zip(summary_payload, summary_vectors)))
+        return True
 
     async def delete_by_chapters(self, project_id: str, chapter_numbers: Sequence[int]) -> None:
         """根据章节编号批量删除对应的上下文数据。"""
@@ -412,6 +744,102 @@ class VectorStoreService:
             return
 
         await self.ensure_schema()
+        statements = self._delete_statements(project_id, chapter_numbers)
+        if not await self._execute_batch("delete_chapters", statements):
+            logger.error("删除章节向量失败: project=%s chapters=%s", project_id, list(chapter_numbers))
+            return
+        self._bump_generation([project_id])
+        logger.info(
+            "已删除章节向量: project=%s chapters=%s",
+            project_id,
+            list(chapter_numbers),
+        )
+        await self._index_remove_chapters(project_id, chapter_numbers)
+
+    @staticmethod
+    def project_generation(project_id: str) -> int:
+        """返回项目向量数据的版本号，本进程内每次成功写入或删除后递增。"""
+        return _project_generations.get(project_id, 0)
+
+    @staticmethod
+    def _bump_generation(project_ids: Iterable[Any]) -> None:
+        for project_id in set(str(item) for item in project_ids):
+            _project_generations[project_id] = _project_generations.get(project_id, 0) + 1
+
+    async def _execute_batch(self, operation: str, statements: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """以单次 batch 调用（libsql 保证事务语义）执行写操作，并上报耗时指标。"""
+        start = time.perf_counter()
+        status = "success"
+        try:
+            await self._client.batch(statements)  # type: ignore[union-attr]
+        except Exception as exc:  # pragma: no cover - 写入失败时整体回滚
+            status = "failed"
+            logger.error("向量库批量写入失败: operation=%s statements=%d error=%s", operation, len(statements), exc)
+            return False
+        finally:
+            elapsed = time.perf_counter() - start
+            vector_store_batch_duration.labels(operation=operation, status=status).observe(elapsed)
+            vector_store_batch_statements.labels(operation=operation).observe(len(statements))
+        return True
+
+    def _prepare_chunk_payload(self, records: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Any]]:
+        """将片段记录转换为 SQL 参数，同时保留原始向量供索引使用。"""
+        payload: List[Dict[str, Any]] = []
+        vectors: List[Any] = []
+        for item in records:
+            embedding = item.get("embedding", [])
+            vectors.append(embedding)
+            payload.append(
+                {
+                    **item,
+                    "embedding": encode_vector(embedding, self._storage_format),
+                    "embedding_format": self._storage_format,
+                    "metadata": json.dumps(item.get("metadata") or {}, ensure_ascii=False),
+                }
+            )
+        return payload, vectors
+
+    def _prepare_summary_payload(self, records: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Any]]:
+        """将摘要记录转换为 SQL 参数，同时保留原始向量供索引使用。"""
+        payload: List[Dict[str, Any]] = []
+        vectors: List[Any] = []
+        for item in records:
+            embedding = item.get("embedding", [])
+            vectors.append(embedding)
+            payload.append(
+                {
+                    **item,
+                    "embedding": encode_vector(embedding, self._storage_format),
+                    "embedding_format": self._storage_format,
+                }
+            )
+        return payload, vectors
+
+    def _exact_statements(
+        self,
+        table: str,
+        payload: Sequence[Dict[str, Any]],
+        vectors: Sequence[Any],
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """压缩存储时为每条记录写入 float32 精确副本，float32 存储无需副本。"""
+        if not self._compact:
+            return []
+        return [
+            (
+                _UPSERT_EXACT_SQL,
+                {
+                    "source": table,
+                    "id": item["id"],
+                    "project_id": item["project_id"],
+                    "chapter_number": item["chapter_number"],
+                    "embedding": self._to_f32_blob(embedding),
+                },
+            )
+            for item, embedding in zip(payload, vectors)
+        ]
+
+    @staticmethod
+    def _delete_statements(project_id: str, chapter_numbers: Sequence[int]) -> List[Tuple[str, Dict[str, Any]]]:
         placeholders = ",".join(":chapter_" + str(idx) for idx in range(len(chapter_numbers)))
         params = {
             "project_id": project_id,
@@ -427,69 +855,324 @@ class VectorStoreService:
         WHERE project_id = :project_id
           AND chapter_number IN ({placeholders})
         """
+        exact_sql = f"""
+        DELETE FROM rag_exact_vectors
+        WHERE project_id = :project_id
+          AND chapter_number IN ({placeholders})
+        """
+        return [(chunk_sql, params), (summary_sql, params), (exact_sql, params)]
+
+    # ------------------------------------------------------------------
+    # 存储格式迁移
+    # ------------------------------------------------------------------
+    async def migrate_storage_format(
+        self,
+        target_format: str,
+        *,
+        page_size: int = 500,
+    ) -> Dict[str, int]:
+        """将已有向量改写为目标格式（float32 / float16 / int8），返回各表改写条数。
+
+        压缩格式会同时写入 float32 精确副本；改回 float32 时删除副本。
+        每页在单个事务中提交，中断后重新执行会从未迁移的行继续。
+        """
+        fmt = STORAGE_FORMATS[target_format]
+        migrated: Dict[str, int] = {}
+        if not self._client:
+            return migrated
+
+        await self.ensure_schema()
+        for table in ("rag_chunks", "rag_summaries"):
+            count = 0
+            after = -1
+            while True:
+                result = await self._reader().execute(  # type: ignore[union-attr]
+                    f"""
+                    SELECT r.rowid AS row_id, r.id AS id, r.project_id AS project_id,
+                           r.chapter_number AS chapter_number, r.embedding AS stored,
+                           r.embedding_format AS embedding_format, x.embedding AS exact
+                    FROM {table} r
+                    LEFT JOIN rag_exact_vectors x ON x.source = '{table}' AND x.id = r.id
+                    WHERE r.rowid > :after AND r.embedding_format != :fmt
+                    ORDER BY r.rowid
+                    LIMIT :limit
+                    """,
+                    {"after": after, "fmt": fmt, "limit": page_size},
+                )
+                rows = list(self._iter_rows(result))
+                if not rows:
+                    break
+                after = int(rows[-1].get("row_id"))
+
+                statements: List[Tuple[str, Dict[str, Any]]] = []
+                for row in rows:
+                    current = row.get("embedding_format") or FORMAT_FLOAT32
+                    source_blob = row.get("stored") if current == FORMAT_FLOAT32 else row.get("exact")
+                    vector = (
+                        decode_vector(source_blob, FORMAT_FLOAT32)
+                        if source_blob
+                        else decode_vector(row.get("stored"), current)
+                    )
+                    statements.append(
+                        (
+                            f"UPDATE {table} SET embedding = :embedding, embedding_format = :fmt WHERE id = :id",
+                            {"id": row.get("id"), "embedding": encode_vector(vector, fmt), "fmt": fmt},
+                        )
+                    )
+                    if fmt == FORMAT_FLOAT32:
+                        statements.append(
+                            (
+                                "DELETE FROM rag_exact_vectors WHERE source = :source AND id = :id",
+                                {"source": table, "id": row.get("id")},
+                            )
+                        )
+                    else:
+                        statements.append(
+                            (
+                                _UPSERT_EXACT_SQL,
+                                {
+                                    "source": table,
+                                    "id": row.get("id"),
+                                    "project_id": row.get("project_id"),
+                                    "chapter_number": row.get("chapter_number"),
+                                    "embedding": self._to_f32_blob(vector),
+                                },
+                            )
+                        )
+                if not await self._execute_batch("migrate_format", statements):
+                    raise RuntimeError(f"迁移 {table} 失败，已提交的页保持新格式，可重新执行继续")
+                count += len(rows)
+                logger.info("向量格式迁移进度: table=%s format=%s migrated=%d", table, fmt, count)
+                if len(rows) < page_size:
+                    break
+            migrated[table] = count
+
+        # 已迁移的数据在本进程内视为变更，使检索缓存失效
+        result = await self._reader().execute(  # type: ignore[union-attr]
+            "SELECT project_id FROM rag_chunks UNION SELECT project_id FROM rag_summaries"
+        )
+        self._bump_generation(row.get("project_id") for row in self._iter_rows(result))
+        return migrated
+
+    async def fetch_exact_vectors(
+        self,
+        table: str,
+        *,
+        project_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[str], "np.ndarray"]:
+        """读取 float32 精确向量（压缩行取副本），用于评估与离线分析。"""
+        if not self._client:
+            return [], np.zeros((0, 0), dtype=np.float32)
+
+        await self.ensure_schema()
+        where = "WHERE r.project_id = :project_id" if project_id else ""
+        result = await self._reader().execute(  # type: ignore[union-attr]
+            f"""
+            SELECT r.id AS id, r.embedding AS stored, r.embedding_format AS embedding_format,
+                   x.embedding AS exact
+            FROM {table} r
+            LEFT JOIN rag_exact_vectors x ON x.source = '{table}' AND x.id = r.id
+            {where}
+            ORDER BY r.rowid
+            LIMIT :limit
+            """,
+            {"project_id": project_id, "limit": limit if limit else -1},
+        )
+        ids: List[str] = []
+        vectors = []
+        for row in self._iter_rows(result):
+            fmt = row.get("embedding_format") or FORMAT_FLOAT32
+            if fmt == FORMAT_FLOAT32:
+                vector = decode_vector(row.get("stored"), FORMAT_FLOAT32)
+            elif row.get("exact"):
+                vector = decode_vector(row.get("exact"), FORMAT_FLOAT32)
+            else:
+                vector = decode_vector(row.get("stored"), fmt)
+            if vectors and len(vector) != len(vectors[0]):
+                continue
+            ids.append(str(row.get("id")))
+            vectors.append(vector)
+        if not vectors:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return ids, np.stack(vectors)
+
+    async def fetch_documents(self, table: str, project_id: str) -> Optional[List[Dict[str, Any]]]:
+        """读取项目全部片段或摘要的文本（不含向量），供本地词法索引构建，失败时返回 None。"""
+        if not self._client:
+            return None
+
+        await self.ensure_schema()
+        sql = _DOCUMENT_SQL[table]
         try:
-            await self._client.execute(chunk_sql, params)  # type: ignore[union-attr]
-            await self._client.execute(summary_sql, params)  # type: ignore[union-attr]
-            logger.info(
-                "已删除章节向量: project=%s chapters=%s",
-                project_id,
-                list(chapter_numbers),
-            )
-        except Exception as exc:  # pragma: no cover - 删除失败时记录日志
-            logger.error("删除章节向量失败: project=%s chapters=%s error=%s", project_id, chapter_numbers, exc)
+            result = await self._reader().execute(sql, {"project_id": project_id})  # type: ignore[union-attr]
+        except Exception as exc:  # pragma: no cover - 读取失败时交由调用方降级
+            logger.warning("读取检索文本失败: table=%s project=%s error=%s", table, project_id, exc)
+            return None
+        documents = []
+        for row in self._iter_rows(result):
+            row["metadata"] = self._parse_metadata(row.get("metadata"))
+            documents.append(row)
+        return documents
 
-    @staticmethod
-    def _to_f32_blob(embedding: Sequence[float]) -> bytes:
-        """将向量浮点列表编码为 libsql 可识别的 float32 二进制。"""
-        return array("f", embedding).tobytes()
+    async def fingerprint_documents(self, table: str, project_id: str) -> Optional[str]:
+        """计算项目在指定表中记录集合的指纹（见 ids_fingerprint），供内存索引核对，失败时返回 None。"""
+        if not self._client:
+            return None
 
-    @staticmethod
-    def _from_f32_blob(blob: Any) -> List[float]:
-        """将数据库中的 BLOB 解码为浮点列表。"""
-        if not blob:
-            return []
-        if isinstance(blob, memoryview):
-            blob = blob.tobytes()
-        data = array("f")
-        data.frombytes(bytes(blob))
-        return list(data)
+        await self.ensure_schema()
+        sql = f"SELECT id FROM {table} WHERE project_id = :project_id"
+        try:
+            result = await self._reader().execute(sql, {"project_id": project_id})  # type: ignore[union-attr]
+        except Exception as exc:  # pragma: no cover - 读取失败时视为未知
+            logger.warning("读取向量记录 id 失败: table=%s project=%s error=%s", table, project_id, exc)
+            return None
+        ids = [str(row.get("id")) for row in self._iter_rows(result)]
+        return await asyncio.to_thread(ids_fingerprint, ids)
 
+    # ------------------------------------------------------------------
+    # ANN 索引维护与查询
+    # ------------------------------------------------------------------
     @staticmethod
-    def _cosine_distance(vec_a: Sequence[float], vec_b: Sequence[float]) -> float:
-        """计算余弦距离（1 - similarity），避免除零。"""
-        if not vec_a or not vec_b:
-            return 1.0
-        dot = sum(a * b for a, b in zip(vec_a, vec_b))
-        norm_a = math.sqrt(sum(a * a for a in vec_a))
-        norm_b = math.sqrt(sum(b * b for b in vec_b))
-        if norm_a == 0 or norm_b == 0:
-            return 1.0
-        similarity = dot / (norm_a * norm_b)
-        return 1.0 - similarity
+    def _resolve_index_dir(local_db_path: Optional[Path]) -> Path:
+        """索引目录优先取配置，其次放在本地向量库文件旁，远程库则放在 storage 下。"""
+        if settings.vector_index_dir:
+            return Path(settings.vector_index_dir).expanduser().resolve()
+        if local_db_path is not None:
+            return local_db_path.parent / f"{local_db_path.name}.ann"
+        return Path(__file__).resolve().parents[2] / "storage" / "vector_index"
 
-    async def _query_chunks_with_python_similarity(
+    def _get_index(
         self,
-        *,
+        table: str,
         project_id: str,
-        embedding: Sequence[float],
-        top_k: int,
-    ) -> List[RetrievedChunk]:
-        sql = """
-        SELECT
-            content,
-            chapter_number,
-            chapter_title,
-            COALESCE(metadata, '{}') AS metadata,
-            embedding
-        FROM rag_chunks
+        *,
+        dimension: int,
+    ) -> Optional[ProjectVectorIndex]:
+        """获取可立即检索的项目索引；缺失或失效时由管理器在后台读盘或重建，期间返回旧索引或 None。"""
+        manager = self._index_manager
+        if manager is None:
+            return None
+        return manager.get_or_refresh(
+            table,
+            project_id,
+            dimension=dimension,
+            fingerprint_rows=lambda: self.fingerprint_documents(table, project_id),
+            load_rows=lambda: self._load_index_rows(table, project_id, dimension),
+        )
+
+    async def _load_index_rows(self, table: str, project_id: str, dimension: int) -> Optional[IndexRows]:
+        """全量读取项目向量供构建索引，仅在首次使用或索引失效时触发。"""
+        sql = f"""
+        SELECT id, chapter_number, embedding, embedding_format
+        FROM {table}
         WHERE project_id = :project_id
         """
-        result = await self._client.execute(sql, {"project_id": project_id})  # type: ignore[union-attr]
-        scored: List[RetrievedChunk] = []
-        for row in self._iter_rows(result):
-            stored_embedding = self._from_f32_blob(row.get("embedding"))
-            distance = self._cosine_distance(embedding, stored_embedding)
-            scored.append(
+        try:
+            result = await self._reader().execute(sql, {"project_id": project_id})  # type: ignore[union-attr]
+        except Exception as exc:  # pragma: no cover - 读取失败时退回全量扫描
+            logger.warning("读取 ANN 索引数据失败: table=%s project=%s error=%s", table, project_id, exc)
+            return None
+        # 大项目解码数十万条向量耗时明显，放到线程中执行
+        return await asyncio.to_thread(self._decode_index_rows, list(self._iter_rows(result)), dimension)
+
+    @staticmethod
+    def _decode_index_rows(rows: Sequence[Dict[str, Any]], dimension: int) -> IndexRows:
+        ids: List[str] = []
+        chapters: List[int] = []
+        vectors = []
+        for row in rows:
+            blob = row.get("embedding")
+            if not blob:
+                continue
+            vector = decode_vector(blob, row.get("embedding_format") or FORMAT_FLOAT32)
+            if len(vector) != dimension:
+                continue
+            ids.append(str(row.get("id")))
+            chapters.append(int(row.get("chapter_number") or 0))
+            vectors.append(vector)
+        matrix = np.stack(vectors) if vectors else np.zeros((0, dimension), dtype=np.float32)
+        return ids, matrix, chapters
+
+    async def _index_upsert(self, table: str, written: Sequence[Any]) -> None:
+        """将成功写入向量库的记录同步到已加载的索引；未加载的索引不处理，加载时会按指纹核对索引文件。"""
+        manager = self._index_manager
+        if manager is None or not written:
+            return
+        grouped: Dict[str, List[Any]] = {}
+        for item, embedding in written:
+            grouped.setdefault(str(item.get("project_id")), []).append((item, embedding))
+        for project_id, items in grouped.items():
+            async with manager.lock_for(table, project_id):
+                index = manager.get_loaded(table, project_id)
+                if index is None:
+                    continue
+                if index.dimension != len(items[0][1]):
+                    manager.drop(table, project_id)
+                    continue
+                index.add(
+                    [str(item["id"]) for item, _ in items],
+                    np.asarray([embedding for _, embedding in items], dtype=np.float32),
+                    [int(item.get("chapter_number") or 0) for item, _ in items],
+                )
+                manager.mark_changed(table, project_id)
+
+    async def _index_remove_chapters(
+        self,
+        project_id: str,
+        chapter_numbers: Sequence[int],
+        *,
+        tables: Sequence[str] = ("rag_chunks", "rag_summaries"),
+    ) -> None:
+        manager = self._index_manager
+        if manager is None:
+            return
+        for table in tables:
+            async with manager.lock_for(table, project_id):
+                index = manager.get_loaded(table, project_id)
+                if index is None:
+                    continue
+                if index.remove_chapters(chapter_numbers):
+                    manager.mark_changed(table, project_id)
+
+    async def _index_remove_ids(self, table: str, project_id: str, ids: Sequence[str]) -> None:
+        manager = self._index_manager
+        if manager is None or not ids:
+            return
+        async with manager.lock_for(table, project_id):
+            index = manager.get_loaded(table, project_id)
+            if index is None:
+                return
+            if index.remove_ids(ids):
+                manager.mark_changed(table, project_id)
+
+    async def _fetch_rows_by_ids(self, sql_prefix: str, ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        placeholders = ",".join(":id_" + str(idx) for idx in range(len(ids)))
+        params = {f"id_{idx}": item_id for idx, item_id in enumerate(ids)}
+        result = await self._reader().execute(  # type: ignore[union-attr]
+            f"{sql_prefix} WHERE id IN ({placeholders})",
+            params,
+        )
+        return {str(row.get("id")): row for row in self._iter_rows(result)}
+
+    async def _hydrate_chunks(self, hits: Sequence[Tuple[str, float]]) -> List[RetrievedChunk]:
+        """按 (id, 距离) 列表回表读取剧情片段，保持传入顺序。"""
+        if not hits:
+            return []
+        rows = await self._fetch_rows_by_ids(
+            """
+            SELECT id, content, chapter_number, chapter_title,
+                   COALESCE(metadata, '{}') AS metadata
+            FROM rag_chunks
+            """,
+            [item_id for item_id, _ in hits],
+        )
+        items: List[RetrievedChunk] = []
+        for item_id, distance in hits:
+            row = rows.get(item_id)
+            if row is None:
+                continue
+            items.append(
                 RetrievedChunk(
                     content=row.get("content", ""),
                     chapter_number=row.get("chapter_number", 0),
@@ -498,40 +1181,258 @@ class VectorStoreService:
                     metadata=self._parse_metadata(row.get("metadata")),
                 )
             )
-        scored.sort(key=lambda item: item.score)
-        return scored[:top_k]
+        return items
 
-    async def _query_summaries_with_python_similarity(
+    async def _hydrate_summaries(self, hits: Sequence[Tuple[str, float]]) -> List[RetrievedSummary]:
+        """按 (id, 距离) 列表回表读取章节摘要，保持传入顺序。"""
+        if not hits:
+            return []
+        rows = await self._fetch_rows_by_ids(
+            "SELECT id, chapter_number, title, summary FROM rag_summaries",
+            [item_id for item_id, _ in hits],
+        )
+        items: List[RetrievedSummary] = []
+        for item_id, distance in hits:
+            row = rows.get(item_id)
+            if row is None:
+                continue
+            items.append(
+                RetrievedSummary(
+                    chapter_number=row.get("chapter_number", 0),
+                    title=row.get("title", ""),
+                    summary=row.get("summary", ""),
+                    score=distance,
+                )
+            )
+        return items
+
+    async def _query_chunks_with_index(
         self,
         *,
         project_id: str,
         embedding: Sequence[float],
         top_k: int,
-    ) -> List[RetrievedSummary]:
-        sql = """
-        SELECT
-            chapter_number,
-            title,
-            summary,
-            embedding
-        FROM rag_summaries
+        chapter_bounds: Tuple[int, int],
+    ) -> Optional[List[RetrievedChunk]]:
+        """通过 ANN 索引召回剧情片段，索引不可用时返回 None 交由调用方降级。"""
+        try:
+            index = self._get_index("rag_chunks", project_id, dimension=len(embedding))
+            if index is None:
+                return None
+            hits = index.search(
+                embedding,
+                self._candidate_count(top_k),
+                min_chapter=chapter_bounds[0],
+                max_chapter=chapter_bounds[1],
+            )
+            return await self._hydrate_chunks(await self._rerank_exact("rag_chunks", hits, embedding, top_k))
+        except Exception as exc:  # pragma: no cover - 索引异常时退回全量扫描
+            logger.warning("ANN 检索剧情片段失败，回退至全量扫描: %s", exc)
+            return None
+
+    async def _query_summaries_with_index(
+        self,
+        *,
+        project_id: str,
+        embedding: Sequence[float],
+        top_k: int,
+        chapter_bounds: Tuple[int, int],
+    ) -> Optional[List[RetrievedSummary]]:
+        """通过 ANN 索引召回章节摘要，索引不可用时返回 None。"""
+        try:
+            index = self._get_index("rag_summaries", project_id, dimension=len(embedding))
+            if index is None:
+                return None
+            hits = index.search(
+                embedding,
+                self._candidate_count(top_k),
+                min_chapter=chapter_bounds[0],
+                max_chapter=chapter_bounds[1],
+            )
+            return await self._hydrate_summaries(await self._rerank_exact("rag_summaries", hits, embedding, top_k))
+        except Exception as exc:  # pragma: no cover - 索引异常时退回全量扫描
+            logger.warning("ANN 检索章节摘要失败，回退至全量扫描: %s", exc)
+            return None
+
+    @staticmethod
+    def _to_f32_blob(embedding: Sequence[float]) -> bytes:
+        """将向量浮点列表编码为 libsql 可识别的 float32 二进制。"""
+        return array("f", embedding).tobytes()
+
+    @staticmethod
+    def _chapter_bounds(min_chapter: Optional[int], max_chapter: Optional[int]) -> Tuple[int, int]:
+        """将可选的章节范围转换为闭区间，缺省的一端取 SQLite 整数极值。"""
+        return (
+            min_chapter if min_chapter is not None else _MIN_CHAPTER,
+            max_chapter if max_chapter is not None else _MAX_CHAPTER,
+        )
+
+    def _candidate_count(self, top_k: int) -> int:
+        """压缩存储时第一轮多取若干倍候选，供精确重排。"""
+        return top_k * settings.vector_rerank_factor if self._compact else top_k
+
+    async def _rerank_exact(
+        self,
+        table: str,
+        hits: Sequence[Tuple[str, float]],
+        embedding: Sequence[float],
+        top_k: int,
+    ) -> List[Tuple[str, float]]:
+        """用 float32 精确向量重新计算候选的余弦距离并截取 top-k。
+
+        float32 行直接使用主表向量；压缩行读取 rag_exact_vectors 中的副本，
+        缺少副本时保留粗排分数。
+        """
+        if not self._compact or not hits:
+            return list(hits[:top_k])
+
+        ids = [item_id for item_id, _ in hits]
+        placeholders = ",".join(":id_" + str(idx) for idx in range(len(ids)))
+        params = {f"id_{idx}": item_id for idx, item_id in enumerate(ids)}
+        result = await self._reader().execute(  # type: ignore[union-attr]
+            f"""
+            SELECT r.id AS id, r.embedding_format AS embedding_format,
+                   r.embedding AS stored, x.embedding AS exact
+            FROM {table} r
+            LEFT JOIN rag_exact_vectors x ON x.source = '{table}' AND x.id = r.id
+            WHERE r.id IN ({placeholders})
+            """,
+            params,
+        )
+        rows = {str(row.get("id")): row for row in self._iter_rows(result)}
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        rescored: List[Tuple[str, float]] = []
+        for item_id, distance in hits:
+            row = rows.get(item_id)
+            if row is None:
+                continue
+            if (row.get("embedding_format") or FORMAT_FLOAT32) == FORMAT_FLOAT32:
+                vector = decode_vector(row.get("stored"), FORMAT_FLOAT32)
+            elif row.get("exact"):
+                vector = decode_vector(row.get("exact"), FORMAT_FLOAT32)
+            else:
+                rescored.append((item_id, distance))
+                continue
+            if len(vector) != len(query):
+                continue
+            norm = float(np.linalg.norm(vector)) * query_norm
+            similarity = float(vector @ query) / norm if norm > 0 else 0.0
+            rescored.append((item_id, 1.0 - similarity))
+        rescored.sort(key=lambda hit: hit[1])
+        return rescored[:top_k]
+
+    async def _scan_top_k(
+        self,
+        table: str,
+        *,
+        project_id: str,
+        embedding: Sequence[float],
+        top_k: int,
+        chapter_bounds: Tuple[int, int],
+    ) -> List[Tuple[str, float]]:
+        """分页流式扫描项目向量，向量化计算余弦距离并维护全局 top-k。
+
+        每页只读取 id 与 embedding，沿 (project_id, chapter_number) 索引按
+        (chapter_number, rowid) 做 keyset 分页：章节范围直接转为索引区间，
+        范围外的行不会被读取，内存占用与页大小成正比；
+        页内使用 argpartition 选出候选，再与已有候选合并，避免对全部行排序。
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        dimension = len(query)
+        page_size = settings.vector_scan_page_size
+        sql = f"""
+        SELECT rowid AS row_id, id, chapter_number, embedding, embedding_format
+        FROM {table}
         WHERE project_id = :project_id
+          AND chapter_number BETWEEN :lower AND :upper
+          AND (chapter_number > :lower OR rowid > :after)
+        ORDER BY chapter_number, rowid
+        LIMIT :limit
         """
-        result = await self._client.execute(sql, {"project_id": project_id})  # type: ignore[union-attr]
-        scored: List[RetrievedSummary] = []
-        for row in self._iter_rows(result):
-            stored_embedding = self._from_f32_blob(row.get("embedding"))
-            distance = self._cosine_distance(embedding, stored_embedding)
-            scored.append(
-                RetrievedSummary(
-                    chapter_number=row.get("chapter_number", 0),
-                    title=row.get("title", ""),
-                    summary=row.get("summary", ""),
-                    score=distance,
-                )
+
+        best_ids: List[str] = []
+        best_distances = np.zeros(0, dtype=np.float32)
+        lower, upper = chapter_bounds
+        after = -1
+        while True:
+            result = await self._reader().execute(  # type: ignore[union-attr]
+                sql,
+                {"project_id": project_id, "lower": lower, "upper": upper, "after": after, "limit": page_size},
             )
-        scored.sort(key=lambda item: item.score)
-        return scored[:top_k]
+            rows = list(self._iter_rows(result))
+            if not rows:
+                break
+            lower = int(rows[-1].get("chapter_number"))
+            after = int(rows[-1].get("row_id"))
+
+            page_ids: List[str] = []
+            page_vectors = []
+            for row in rows:
+                blob = row.get("embedding")
+                fmt = row.get("embedding_format") or FORMAT_FLOAT32
+                # 维度不一致（如更换了嵌入模型）的历史数据直接跳过
+                if not blob or len(blob) != encoded_size(dimension, fmt):
+                    continue
+                page_ids.append(str(row.get("id")))
+                page_vectors.append(decode_vector(blob, fmt))
+            if page_vectors:
+                matrix = np.stack(page_vectors)
+                norms = np.linalg.norm(matrix, axis=1) * query_norm
+                dots = matrix @ query
+                similarity = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+                distances = (1.0 - similarity).astype(np.float32)
+
+                k = min(top_k, len(distances))
+                candidates = np.argpartition(distances, k - 1)[:k]
+                merged_ids = best_ids + [page_ids[idx] for idx in candidates]
+                merged_distances = np.concatenate([best_distances, distances[candidates]])
+                k = min(top_k, len(merged_distances))
+                keep = np.argpartition(merged_distances, k - 1)[:k]
+                best_ids = [merged_ids[idx] for idx in keep]
+                best_distances = merged_distances[keep]
+
+            if len(rows) < page_size:
+                break
+
+        order = np.argsort(best_distances, kind="stable")
+        return [(best_ids[idx], float(best_distances[idx])) for idx in order]
+
+    async def _query_chunks_with_python_similarity(
+        self,
+        *,
+        project_id: str,
+        embedding: Sequence[float],
+        top_k: int,
+        chapter_bounds: Tuple[int, int],
+    ) -> List[RetrievedChunk]:
+        hits = await self._scan_top_k(
+            "rag_chunks",
+            project_id=project_id,
+            embedding=embedding,
+            top_k=self._candidate_count(top_k),
+            chapter_bounds=chapter_bounds,
+        )
+        return await self._hydrate_chunks(await self._rerank_exact("rag_chunks", hits, embedding, top_k))
+
+    async def _query_summaries_with_python_similarity(
+        self,
+        *,
+        project_id: str,
+        embedding: Sequence[float],
+        top_k: int,
+        chapter_bounds: Tuple[int, int],
+    ) -> List[RetrievedSummary]:
+        hits = await self._scan_top_k(
+            "rag_summaries",
+            project_id=project_id,
+            embedding=embedding,
+            top_k=self._candidate_count(top_k),
+            chapter_bounds=chapter_bounds,
+        )
+        return await self._hydrate_summaries(await self._rerank_exact("rag_summaries", hits, embedding, top_k))
 
     @staticmethod
     def _parse_metadata(raw: Any) -> Dict[str, Any]:
@@ -572,8 +1473,47 @@ class VectorStoreService:
         return normalized
 
 
+async def init_vector_store() -> Optional[VectorStoreService]:
+    """创建进程级共享的向量库实例并完成建表，向量库未启用或初始化失败时返回 None。"""
+    store = get_vector_store()
+    if store is not None:
+        await store.ensure_schema()
+    return store
+
+
+def get_vector_store() -> Optional[VectorStoreService]:
+    """返回进程级共享的向量库实例，首次调用时惰性创建。
+
+    调用方不应关闭该实例，关闭统一由 :func:`close_vector_store` 完成。
+    """
+    global _shared_store, _shared_store_failed
+    if not settings.vector_store_enabled or _shared_store_failed:
+        return None
+    if _shared_store is None:
+        try:
+            _shared_store = VectorStoreService()
+        except RuntimeError as exc:
+            logger.warning("向量库初始化失败，RAG 检索被禁用: %s", exc)
+            _shared_store_failed = True
+            return None
+    return _shared_store
+
+
+async def close_vector_store() -> None:
+    """关闭共享实例，供应用退出时调用。"""
+    global _shared_store, _shared_store_failed
+    store, _shared_store = _shared_store, None
+    _shared_store_failed = False
+    if store is not None:
+        await store.close()
+
+
 __all__ = [
     "VectorStoreService",
+    "ChapterVectorState",
+    "close_vector_store",
+    "get_vector_store",
+    "init_vector_store",
     "RetrievedChunk",
     "RetrievedSummary",
 ]
@@ -5,7 +5,7 @@ import os
 from dataclasses import asdict, dataclass
 from typing import AsyncGenerator, Dict, List, Optional
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, RateLimitError
 
 
 @dataclass
@@ -20,12 +20,19 @@ class ChatMessage:
 class LLMClient:
     """异步流式调用封装，兼容 OpenAI SDK。"""
 
-    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        *,
+        client: Optional[AsyncOpenAI] = None,
+    ):
         key = api_key or os.environ.get("OPENAI_API_KEY")
         if not key:
             raise ValueError("缺少 OPENAI_API_KEY 配置，请在数据库或环境变量中补全。")
 
-        self._client = AsyncOpenAI(api_key=key, base_url=base_url or os.environ.get("OPENAI_API_BASE"))
+        # 传入共享客户端时复用其连接池，否则单独创建
+        self._client = client or AsyncOpenAI(api_key=key, base_url=base_url or os.environ.get("OPENAI_API_BASE"))
 
     async def stream_chat(
         self,
@@ -74,6 +81,9 @@ class LLMClient:
                     "finish_reason": choice.finish_reason,
                 }
             return
+        except RateLimitError:
+            # 限流时换参数重发只会再次被拒，交由调用方按 Retry-After 处理
+            raise
         except Exception as exc:
             text = str(exc).lower()
             # 兼容部分提供商在 json 模式下不支持 stream 或报 "prefix ... json mode"/code 20033
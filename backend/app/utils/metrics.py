@@ -42,6 +42,20 @@ ai_fallback_total = Counter(
     ['function', 'from_provider', 'to_provider']
 )
 
+# 对冲请求发起次数（主模型超出延迟预算）
+ai_hedge_total = Counter(
+    'ai_hedge_total',
+    'Total hedged AI requests started',
+    ['function', 'primary_provider', 'hedge_provider']
+)
+
+# 对冲请求的胜出方（winner: primary/hedge）
+ai_hedge_wins_total = Counter(
+    'ai_hedge_wins_total',
+    'Hedged AI requests by winning side',
+    ['function', 'winner']
+)
+
 # 错误类型统计
 ai_error_total = Counter(
     'ai_error_total',
@@ -63,6 +77,28 @@ ai_calls_in_progress = Gauge(
     ['function']
 )
 
+# 提供商限流器排队中的请求数
+ai_provider_queue_depth = Gauge(
+    'ai_provider_queue_depth',
+    'Requests waiting for a provider concurrency/rate slot',
+    ['provider']
+)
+
+# 提供商限流器的排队等待耗时
+ai_provider_wait_seconds = Histogram(
+    'ai_provider_wait_seconds',
+    'Time spent waiting for a provider concurrency/rate slot in seconds',
+    ['provider'],
+    buckets=[0.001, 0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120]
+)
+
+# 提供商返回 429 的次数
+ai_provider_throttled_total = Counter(
+    'ai_provider_throttled_total',
+    'Provider responses rejected with HTTP 429',
+    ['provider']
+)
+
 # ==================== 增强模式指标 ====================
 
 # 增强分析总次数（按状态和错误类型分类）
@@ -110,6 +146,110 @@ chapter_generation_duration = Histogram(
     buckets=[10, 30, 60, 120, 300, 600, 1200]
 )
 
+# 流式章节生成中单个版本从开始生成到收到首个 token 的耗时
+chapter_generation_first_token_seconds = Histogram(
+    'chapter_generation_first_token_seconds',
+    'Time from version generation start to its first streamed token in seconds',
+    buckets=[0.5, 1, 2, 5, 10, 30, 60, 120, 300]
+)
+
+# ==================== 异步生成任务指标 ====================
+
+# 生成任务结束次数（status: completed / failed）
+generation_jobs_total = Counter(
+    'generation_jobs_total',
+    'Finished generation jobs',
+    ['job_type', 'status']
+)
+
+# 当前执行中的生成任务数
+generation_jobs_in_progress = Gauge(
+    'generation_jobs_in_progress',
+    'Number of generation jobs currently running'
+)
+
+# 合并到进行中相同请求的调用次数（operation: chapter_generation / chapter_summary）
+coalesced_requests_total = Counter(
+    'coalesced_requests_total',
+    'Duplicate concurrent requests coalesced into an in-flight call',
+    ['operation']
+)
+
+# ==================== LLM 连接池指标 ====================
+
+# 请求发出到收到响应头的耗时（connection: new 新建连接 / reused 复用连接）
+llm_http_ttfb_seconds = Histogram(
+    'llm_http_ttfb_seconds',
+    'Time to first byte of LLM provider HTTP requests in seconds',
+    ['host', 'connection'],
+    buckets=[0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60]
+)
+
+# 连接池新建的连接数
+llm_http_connections_opened_total = Counter(
+    'llm_http_connections_opened_total',
+    'New connections opened to LLM providers',
+    ['host']
+)
+
+# 端点熔断状态变化次数（state: open / half_open / closed）
+llm_endpoint_breaker_transitions_total = Counter(
+    'llm_endpoint_breaker_transitions_total',
+    'LLM endpoint circuit breaker state transitions',
+    ['host', 'state']
+)
+
+# LLM 响应缓存命中统计（result: hit/miss）
+llm_response_cache_requests_total = Counter(
+    'llm_response_cache_requests_total',
+    'LLM response cache lookups',
+    ['function', 'result']
+)
+
+# LLM 响应缓存因容量上限或过期淘汰的条目数
+llm_response_cache_evictions_total = Counter(
+    'llm_response_cache_evictions_total',
+    'LLM response cache entries evicted by size or age limits'
+)
+
+# ==================== 向量库指标 ====================
+
+# 向量库批量写入耗时（每次 batch 调用即一次往返）
+vector_store_batch_duration = Histogram(
+    'vector_store_batch_duration_seconds',
+    'Vector store batch write duration in seconds',
+    ['operation', 'status'],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+)
+
+# 单次 batch 包含的语句数
+vector_store_batch_statements = Histogram(
+    'vector_store_batch_statements',
+    'Number of statements per vector store batch',
+    ['operation'],
+    buckets=[1, 2, 5, 10, 20, 50, 100, 200]
+)
+
+# 嵌入缓存命中统计（result: hit/miss）
+embedding_cache_requests_total = Counter(
+    'embedding_cache_requests_total',
+    'Embedding cache lookups by result',
+    ['result']
+)
+
+# 嵌入缓存因容量上限淘汰的条目数
+embedding_cache_evictions_total = Counter(
+    'embedding_cache_evictions_total',
+    'Embedding cache entries evicted by the size bound'
+)
+
+# 嵌入微批调度器每批合并的文本条数
+embedding_batcher_batch_size = Histogram(
+    'embedding_batcher_batch_size',
+    'Number of texts per coalesced embedding request',
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128, 256]
+)
+
 # ==================== 数据质量指标 ====================
 
 # 角色匹配统计
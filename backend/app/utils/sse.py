@@ -0,0 +1,11 @@
+"""Server-Sent Events 格式化工具。"""
+import json
+from typing import Any, Dict
+
+# 注释行心跳，防止反向代理在长时间无输出时断开连接
+SSE_KEEPALIVE = ": keep-alive\n\n"
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """将事件名与 JSON 数据格式化为一条 SSE 消息。"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
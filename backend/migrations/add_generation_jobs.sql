@@ -0,0 +1,53 @@
+-- 异步生成任务表迁移脚本
+-- 日期: 2026-10-17
+-- 用途: 章节/大纲/蓝图生成、评估、去味等长耗时操作改为提交任务后轮询或订阅结果
+
+CREATE TABLE IF NOT EXISTS generation_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+    -- 关联信息
+    job_type VARCHAR(64) NOT NULL,
+    user_id INTEGER NOT NULL,
+    project_id VARCHAR(36),
+
+    -- 任务状态
+    status VARCHAR(32) NOT NULL DEFAULT 'pending',  -- pending, processing, completed, failed
+    priority INTEGER NOT NULL DEFAULT 5,  -- 1-10，数字越大优先级越高
+
+    -- 重试信息
+    retry_count INTEGER NOT NULL DEFAULT 0,
+    max_retries INTEGER NOT NULL DEFAULT 2,
+
+    -- 请求参数与进度
+    payload TEXT,  -- JSON格式
+    progress TEXT,  -- JSON格式
+
+    -- 结果信息
+    result TEXT,  -- JSON格式
+    error_message TEXT,
+    error_type VARCHAR(64),
+
+    -- 时间信息
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    -- 性能指标
+    duration_seconds INTEGER,
+
+    -- 外键约束
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (project_id) REFERENCES novel_projects(id) ON DELETE CASCADE
+);
+
+-- 创建索引
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_job_type ON generation_jobs(job_type);
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_user_id ON generation_jobs(user_id);
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_project_id ON generation_jobs(project_id);
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_status ON generation_jobs(status);
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_priority ON generation_jobs(priority);
+
+-- 创建复合索引（用于后台任务池领取任务）
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_status_priority
+ON generation_jobs(status, priority DESC, created_at ASC);
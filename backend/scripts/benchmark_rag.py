@@ -0,0 +1,387 @@
+"""
+RAG 检索基准测试
+
+使用确定性的伪嵌入生成合成小说项目（章节数、片段长度、向量维度均可配置），
+写入本地 file: libsql 向量库，分别测量：
+- 入库吞吐（replace_chapter 写入路径，章/秒、向量/秒）
+- 各检索路径的 p50/p99 延迟：libsql 原生 vector_distance_cosine（可用时）、
+  应用层全量扫描、章节窗口扫描、ANN 索引、本地词法索引
+- ANN 索引相对精确扫描的召回率、索引构建耗时与进程内存
+
+全程离线运行，不调用任何嵌入服务。结果以 JSON 输出，便于比较不同版本。
+
+使用方法:
+    python scripts/benchmark_rag.py --chapters 100 1000 5000
+    python scripts/benchmark_rag.py --chapters 500 --dimension 1024 --storage-format int8 --output bench.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import platform
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.services.lexical_index import LexicalDocument, ProjectLexicalIndex
+from app.services.vector_store_service import VectorStoreService
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ID = "bench"
+
+# 合成正文使用的汉字表，按 Zipf 分布取字，使二元组的重复度接近真实中文
+_CHARSET = np.array([chr(code) for code in range(0x4E00, 0x4E00 + 3000)])
+_CHAR_WEIGHTS = 1.0 / np.arange(1, len(_CHARSET) + 1)
+_CHAR_WEIGHTS /= _CHAR_WEIGHTS.sum()
+
+
+class SyntheticCorpus:
+    """确定性的合成小说：章节按主题聚类，同主题片段向量相近、共享关键词。"""
+
+    def __init__(
+        self,
+        chapters: int,
+        *,
+        chunk_size: int,
+        chapter_chars: int,
+        dimension: int,
+        seed: int,
+    ) -> None:
+        self.chapters = chapters
+        self.chunk_size = chunk_size
+        self.chunks_per_chapter = max(1, chapter_chars // chunk_size)
+        self.dimension = dimension
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        topics = max(8, chapters // 20)
+        self._centers = rng.normal(size=(topics, dimension)).astype(np.float32)
+        self._keywords = [
+            rng.choice(_CHARSET, size=(24, 2)) for _ in range(topics)
+        ]
+
+    def _topic(self, chapter_number: int) -> int:
+        digest = hashlib.sha256(f"{self.seed}:{chapter_number}".encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "little") % len(self._centers)
+
+    def chunk_vector(self, chapter_number: int, chunk_index: int) -> "np.ndarray":
+        rng = np.random.default_rng([self.seed, chapter_number, chunk_index])
+        center = self._centers[self._topic(chapter_number)]
+        return (center + rng.normal(scale=0.6, size=self.dimension)).astype(np.float32)
+
+    def chunk_text(self, chapter_number: int, chunk_index: int) -> str:
+        rng = np.random.default_rng([self.seed, chapter_number, chunk_index, 1])
+        keywords = self._keywords[self._topic(chapter_number)]
+        chars = rng.choice(_CHARSET, size=self.chunk_size, p=_CHAR_WEIGHTS)
+        # 约两成位置替换为本主题的关键词，供词法检索命中
+        slots = rng.integers(0, max(1, self.chunk_size - 1), size=self.chunk_size // 10)
+        chars[slots[:, None] + np.arange(2)] = keywords[rng.integers(0, len(keywords), size=len(slots))]
+        return "".join(chars.tolist())[: self.chunk_size]
+
+    def chapter_records(self, chapter_number: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        chunk_records = []
+        for chunk_index in range(self.chunks_per_chapter):
+            record_id = f"{PROJECT_ID}:{chapter_number}:{chunk_index}"
+            content = self.chunk_text(chapter_number, chunk_index)
+            chunk_records.append(
+                {
+                    "id": record_id,
+                    "project_id": PROJECT_ID,
+                    "chapter_number": chapter_number,
+                    "chunk_index": chunk_index,
+                    "chapter_title": f"第{chapter_number}章",
+                    "content": content,
+                    "embedding": self.chunk_vector(chapter_number, chunk_index).tolist(),
+                    "metadata": {"chunk_id": record_id, "length": len(content)},
+                }
+            )
+        summary_vector = self._centers[self._topic(chapter_number)]
+        summary_records = [
+            {
+                "id": f"{PROJECT_ID}:{chapter_number}:summary",
+                "project_id": PROJECT_ID,
+                "chapter_number": chapter_number,
+                "title": f"第{chapter_number}章",
+                "summary": self.chunk_text(chapter_number, self.chunks_per_chapter)[:120],
+                "embedding": summary_vector.tolist(),
+            }
+        ]
+        return chunk_records, summary_records
+
+    def queries(self, count: int) -> List[Tuple[List[float], str]]:
+        """查询向量取自随机片段并加噪声，词法查询取同一片段中的一段原文。"""
+        rng = np.random.default_rng(self.seed + 1)
+        queries = []
+        for _ in range(count):
+            chapter_number = int(rng.integers(1, self.chapters + 1))
+            chunk_index = int(rng.integers(0, self.chunks_per_chapter))
+            vector = self.chunk_vector(chapter_number, chunk_index)
+            vector = vector + rng.normal(scale=0.1, size=self.dimension).astype(np.float32)
+            text = self.chunk_text(chapter_number, chunk_index)
+            start = int(rng.integers(0, max(1, len(text) - 40)))
+            queries.append((vector.tolist(), text[start:start + 40]))
+        return queries
+
+
+def _rss_mb() -> float:
+    """当前常驻内存（MB），Linux 读取 /proc，其他平台退回峰值。"""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as handle:
+            pages = int(handle.read().split()[1])
+        return round(pages * resource.getpagesize() / 1024 / 1024, 1)
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 为 KB
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+async def _measure(
+    queries: Sequence[Any],
+    run: Callable[[Any], Awaitable[Any]],
+    *,
+    warmup: int = 3,
+) -> Tuple[Dict[str, Any], List[Any]]:
+    for query in queries[:warmup]:
+        await run(query)
+    timings: List[float] = []
+    results: List[Any] = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(await run(query))
+        timings.append(time.perf_counter() - start)
+    millis = np.asarray(timings) * 1000
+    stats = {
+        "queries": len(timings),
+        "p50_ms": round(float(np.percentile(millis, 50)), 3),
+        "p99_ms": round(float(np.percentile(millis, 99)), 3),
+        "mean_ms": round(float(millis.mean()), 3),
+        "qps": round(len(timings) / max(float(np.sum(timings)), 1e-9), 1),
+        "rss_mb": _rss_mb(),
+    }
+    return stats, results
+
+
+def _recall(expected: Sequence[Sequence[str]], actual: Sequence[Sequence[str]]) -> float:
+    hits = sum(len(set(truth) & set(found)) for truth, found in zip(expected, actual))
+    total = sum(len(truth) for truth in expected)
+    return round(hits / total, 4) if total else 0.0
+
+
+async def _native_available(store: VectorStoreService) -> bool:
+    try:
+        await store._client.execute("SELECT vector_distance_cosine(:a, :a) AS d", {"a": store._to_f32_blob([1.0])})
+    except Exception:  # noqa: BLE001 - 本地 sqlite 通常不含该函数
+        return False
+    return True
+
+
+async def run_scale(chapters: int, args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    corpus = SyntheticCorpus(
+        chapters,
+        chunk_size=args.chunk_size,
+        chapter_chars=args.chapter_chars,
+        dimension=args.dimension,
+        seed=args.seed,
+    )
+    db_path = workdir / f"bench_{chapters}.db"
+    settings.vector_db_url = f"file:{db_path}"
+    settings.vector_index_dir = str(workdir / f"bench_{chapters}.ann")
+    settings.vector_index_enabled = True
+    settings.vector_storage_format = args.storage_format
+    store = VectorStoreService(pool_size=1)
+    report: Dict[str, Any] = {
+        "chapters": chapters,
+        "chunks_per_chapter": corpus.chunks_per_chapter,
+        "vectors": chapters * corpus.chunks_per_chapter,
+    }
+    try:
+        await store.ensure_schema()
+
+        # ---------------- 入库 ----------------
+        rss_before = _rss_mb()
+        elapsed = 0.0
+        for chapter_number in range(1, chapters + 1):
+            # 只统计写入耗时，不含合成数据的生成
+            chunk_records, summary_records = corpus.chapter_records(chapter_number)
+            start = time.perf_counter()
+            await store.replace_chapter(
+                project_id=PROJECT_ID,
+                chapter_number=chapter_number,
+                chunk_records=chunk_records,
+                summary_records=summary_records,
+            )
+            elapsed += time.perf_counter() - start
+        report["ingest"] = {
+            "seconds": round(elapsed, 3),
+            "chapters_per_second": round(chapters / elapsed, 1),
+            "vectors_per_second": round(chapters * (corpus.chunks_per_chapter + 1) / elapsed, 1),
+            "db_mb": round(db_path.stat().st_size / 1024 / 1024, 2),
+            "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+        }
+
+        queries = corpus.queries(args.queries)
+        top_k = args.top_k
+        bounds = store._chapter_bounds(None, None)
+        paths: Dict[str, Any] = {}
+
+        # ---------------- 应用层全量扫描（基准） ----------------
+        async def scan(query: Tuple[List[float], str]) -> List[str]:
+            hits = await store._scan_top_k(
+                "rag_chunks",
+                project_id=PROJECT_ID,
+                embedding=query[0],
+                top_k=store._candidate_count(top_k),
+                chapter_bounds=bounds,
+            )
+            return [item_id for item_id, _ in await store._rerank_exact("rag_chunks", hits, query[0], top_k)]
+
+        paths["python_scan"], truth = await _measure(queries, scan)
+
+        # ---------------- 章节窗口扫描 ----------------
+        window = (max(1, chapters - args.window + 1), chapters)
+
+        async def window_scan(query: Tuple[List[float], str]) -> List[str]:
+            hits = await store._scan_top_k(
+                "rag_chunks",
+                project_id=PROJECT_ID,
+                embedding=query[0],
+                top_k=store._candidate_count(top_k),
+                chapter_bounds=window,
+            )
+            return [item_id for item_id, _ in hits]
+
+        paths["python_scan_window"], _ = await _measure(queries, window_scan)
+        paths["python_scan_window"]["window_chapters"] = args.window
+
+        # ---------------- libsql 原生函数 ----------------
+        if await _native_available(store) and not store._compact:
+
+            async def native(query: Tuple[List[float], str]) -> Any:
+                return await store.query_chunks(project_id=PROJECT_ID, embedding=query[0], top_k=top_k, exact=True)
+
+            paths["libsql_native"], _ = await _measure(queries, native)
+        else:
+            paths["libsql_native"] = {"available": False}
+
+        # ---------------- ANN 索引 ----------------
+        start = time.perf_counter()
+        store._get_index("rag_chunks", PROJECT_ID, dimension=args.dimension)
+        await store._index_manager.drain()
+        index = store._get_index("rag_chunks", PROJECT_ID, dimension=args.dimension)
+        build_seconds = time.perf_counter() - start
+
+        async def ann(query: Tuple[List[float], str]) -> List[str]:
+            hits = index.search(query[0], store._candidate_count(top_k))
+            return [item_id for item_id, _ in await store._rerank_exact("rag_chunks", hits, query[0], top_k)]
+
+        paths["ann_index"], found = await _measure(queries, ann)
+        paths["ann_index"].update(
+            {
+                "build_seconds": round(build_seconds, 3),
+                "trained": bool(index.is_trained),
+                f"recall@{top_k}": _recall(truth, found),
+            }
+        )
+
+        async def ann_end_to_end(query: Tuple[List[float], str]) -> Any:
+            return await store.query_chunks(project_id=PROJECT_ID, embedding=query[0], top_k=top_k)
+
+        paths["ann_index_hydrated"], _ = await _measure(queries, ann_end_to_end)
+
+        # ---------------- 本地词法索引 ----------------
+        rows = await store.fetch_documents("rag_chunks", PROJECT_ID) or []
+        lexical = ProjectLexicalIndex()
+        start = time.perf_counter()
+        lexical.add(
+            LexicalDocument(
+                id=str(row["id"]),
+                chapter_number=int(row["chapter_number"]),
+                title=row.get("title"),
+                text=row.get("text") or "",
+            )
+            for row in rows
+        )
+        lexical_build = time.perf_counter() - start
+
+        async def lexical_search(query: Tuple[List[float], str]) -> List[str]:
+            return [item_id for item_id, _ in lexical.search(query[1], top_k)]
+
+        paths["lexical_bm25"], _ = await _measure(queries, lexical_search)
+        paths["lexical_bm25"]["build_seconds"] = round(lexical_build, 3)
+
+        report["paths"] = paths
+        report["peak_rss_mb"] = _peak_rss_mb()
+        return report
+    finally:
+        await store.close()
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    output: Dict[str, Any] = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "params": {
+            "chunk_size": args.chunk_size,
+            "chapter_chars": args.chapter_chars,
+            "dimension": args.dimension,
+            "storage_format": args.storage_format,
+            "top_k": args.top_k,
+            "queries": args.queries,
+            "seed": args.seed,
+            "scan_page_size": settings.vector_scan_page_size,
+            "index_nprobe": settings.vector_index_nprobe,
+            "index_min_train_size": settings.vector_index_min_train_size,
+        },
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="rag_bench_", dir=args.workdir) as tmp:
+        for chapters in args.chapters:
+            logger.info("开始基准测试: chapters=%d", chapters)
+            output["results"].append(await run_scale(chapters, args, Path(tmp)))
+    return output
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="RAG 检索基准测试（离线）")
+    parser.add_argument("--chapters", type=int, nargs="+", default=[100, 1000], help="合成项目的章节数，可传多个规模")
+    parser.add_argument("--chunk-size", type=int, default=settings.vector_chunk_size, help="每个片段的字数")
+    parser.add_argument("--chapter-chars", type=int, default=3000, help="每章字数，决定每章片段数")
+    parser.add_argument("--dimension", type=int, default=256, help="伪嵌入向量维度")
+    parser.add_argument("--storage-format", choices=["float32", "float16", "int8"], default="float32")
+    parser.add_argument("--queries", type=int, default=200, help="每条路径的查询次数")
+    parser.add_argument("--top-k", type=int, default=settings.vector_top_k_chunks)
+    parser.add_argument("--window", type=int, default=50, help="章节窗口扫描覆盖的最近章节数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="临时向量库所在目录，默认使用系统临时目录")
+    parser.add_argument("--output", default=None, help="结果 JSON 写入的文件，默认仅输出到标准输出")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+    logger.setLevel(logging.INFO)
+    cli_args = _parse_args()
+    result = asyncio.run(run(cli_args))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if cli_args.output:
+        Path(cli_args.output).write_text(text, encoding="utf-8")
+    print(text)
@@ -0,0 +1,67 @@
+"""
+向量库批量回填 / 重建
+
+遍历所有已选定版本的章节并写入向量库，进度保存在检查点文件中，
+中断后重新执行同一命令即可从断点继续。
+
+使用方法:
+    python scripts/reindex_vectors.py
+    python scripts/reindex_vectors.py --project <project_id> --workers 8
+    python scripts/reindex_vectors.py --rebuild          # 更换嵌入模型后整章重建
+    python scripts/reindex_vectors.py --reset-checkpoint # 忽略已有进度从头开始
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.vector_reindex_service import (
+    ReindexCheckpoint,
+    VectorReindexService,
+    default_checkpoint_path,
+)
+from app.services.vector_store_service import close_vector_store, init_vector_store
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    checkpoint_path = Path(args.checkpoint).expanduser().resolve() if args.checkpoint else default_checkpoint_path()
+    if args.reset_checkpoint:
+        ReindexCheckpoint(checkpoint_path, model_key="").reset()
+
+    store = await init_vector_store()
+    if store is None:
+        raise SystemExit("向量库未启用，请先配置 VECTOR_DB_URL")
+    try:
+        service = VectorReindexService(
+            project_ids=args.project,
+            rebuild=args.rebuild,
+            workers=args.workers,
+            checkpoint_path=checkpoint_path,
+            vector_store=store,
+        )
+        progress = await service.run()
+    finally:
+        await close_vector_store()
+    return progress.as_dict()
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="批量回填章节向量")
+    parser.add_argument("--project", action="append", help="仅处理指定项目，可重复传入")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已有向量整章重新嵌入")
+    parser.add_argument("--workers", type=int, default=None, help="并发章节数，默认读取 VECTOR_REINDEX_WORKERS")
+    parser.add_argument("--checkpoint", default=None, help="检查点文件路径")
+    parser.add_argument("--reset-checkpoint", action="store_true", help="删除检查点后从头开始")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    result = asyncio.run(run(_parse_args()))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
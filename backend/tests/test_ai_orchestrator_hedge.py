@@ -0,0 +1,98 @@
+"""
+对冲请求测试
+
+测试：
+1. 主模型超过延迟预算未返回首个 token 时发起对冲，先完成者胜出，另一路被取消
+2. 主模型在预算内开始输出时不发起对冲
+3. 对冲一路的首 token 延迟从其自身发起时计时，且两路各用独立的数据库会话
+"""
+import asyncio
+
+import pytest
+
+from app.config.ai_function_config import AIFunctionType, FunctionRouteConfig, ProviderConfig
+from app.services import ai_orchestrator as orchestrator_module
+from app.services.ai_orchestrator import AIOrchestrator
+
+
+class _FakeLLMService:
+    def __init__(self, delays):
+        self.delays = delays
+        self.calls = []
+        self.cancelled = []
+
+    async def invoke(self, *, provider, model, messages, on_first_token=None, **_kwargs):
+        self.calls.append(provider)
+        first_token_delay, total = self.delays[provider]
+        try:
+            await asyncio.sleep(first_token_delay)
+            on_first_token()
+            await asyncio.sleep(total - first_token_delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(provider)
+            raise
+        return f"from {provider}"
+
+
+def _route():
+    return FunctionRouteConfig(
+        function_type=AIFunctionType.CONCEPT_DIALOGUE,
+        primary=ProviderConfig(provider="slow", model="m"),
+        fallbacks=[ProviderConfig(provider="fast", model="m")],
+        hedge=True,
+        hedge_min_delay=0.01,
+        hedge_max_delay=0.05,
+    )
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_when_primary_stalls(monkeypatch):
+    monkeypatch.setattr(orchestrator_module, "get_function_config", lambda function: _route())
+    service = _FakeLLMService({"slow": (1.0, 1.0), "fast": (0.01, 0.02)})
+    result = await AIOrchestrator(service).execute(AIFunctionType.CONCEPT_DIALOGUE, "sys", "user")
+    assert result == "from fast"
+    assert service.calls == ["slow", "fast"]
+    assert service.cancelled == ["slow"]
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_when_primary_streams_in_budget(monkeypatch):
+    monkeypatch.setattr(orchestrator_module, "get_function_config", lambda function: _route())
+    service = _FakeLLMService({"slow": (0.01, 0.1), "fast": (0.01, 0.02)})
+    result = await AIOrchestrator(service).execute(AIFunctionType.CONCEPT_DIALOGUE, "sys", "user")
+    assert result == "from slow"
+    assert service.calls == ["slow"]
+
+
+@pytest.mark.asyncio
+async def test_hedged_calls_time_and_isolate_themselves(monkeypatch):
+    monkeypatch.setattr(orchestrator_module, "get_function_config", lambda function: _route())
+    monkeypatch.setattr(orchestrator_module, "_FIRST_TOKEN_SAMPLES", {})
+    delays = {"slow": (1.0, 1.0), "fast": (0.01, 0.02)}
+    sessions = []
+
+    class _SessionService(_FakeLLMService):
+        def __init__(self, session):
+            super().__init__(delays)
+            self.session = session
+            sessions.append(session)
+
+    monkeypatch.setattr(orchestrator_module, "AsyncSessionLocal", lambda: _NullSession())
+    monkeypatch.setattr(orchestrator_module, "LLMService", _SessionService)
+    caller = _SessionService("caller")
+    sessions.clear()
+
+    result = await AIOrchestrator(caller).execute(AIFunctionType.CONCEPT_DIALOGUE, "sys", "user")
+    assert result == "from fast"
+    assert caller.calls == []
+    assert len(sessions) == 2 and sessions[0] is not sessions[1]
+    # 对冲等待了 0.05 秒，若沿用主请求的起点，样本会超过 0.06 秒
+    assert list(orchestrator_module._FIRST_TOKEN_SAMPLES[("fast", "m")])[0] < 0.04
+
+
+class _NullSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
@@ -0,0 +1,150 @@
+"""
+章节上下文检索缓存测试
+
+测试：
+1. 相同查询复用查询向量与检索结果
+2. 项目向量数据变化后检索结果失效，查询向量仍可复用
+3. 检索章节窗口：排除后续章节，按最近 N 章 / 最近 K 卷限定下界
+4. 查询向量失败时退回本地词法检索，混合模式融合两路结果
+5. 已加载的词法索引超出上限时淘汰最久未使用的
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import chapter_context_service as context_module
+from app.services.chapter_context_service import ChapterContextService, resolve_chapter_window
+from app.services.lexical_index import LexicalDocument, LexicalIndexManager, get_lexical_index_manager
+from app.services.vector_index import ids_fingerprint
+from app.services.vector_store_service import RetrievedChunk, RetrievedSummary, VectorStoreService
+
+
+class _FakeLLM:
+    def __init__(self):
+        self.embedding_calls = 0
+
+    async def get_embedding_model_key(self, model=None):
+        return "openai:test-model"
+
+    async def get_embedding(self, text, *, user_id=None, model=None):
+        self.embedding_calls += 1
+        return [1.0, 0.0]
+
+
+class _FakeStore:
+    def __init__(self, documents=()):
+        self.queries = 0
+        self.documents = list(documents)
+
+    project_generation = staticmethod(VectorStoreService.project_generation)
+
+    async def query_chunks(self, *, project_id, embedding, top_k=None, min_chapter=None, max_chapter=None):
+        self.queries += 1
+        return [RetrievedChunk(content="片段", chapter_number=1, chapter_title="T", score=0.1, metadata={})]
+
+    async def query_summaries(self, *, project_id, embedding, top_k=None, min_chapter=None, max_chapter=None):
+        self.queries += 1
+        return [RetrievedSummary(chapter_number=1, title="T", summary="摘要", score=0.2)]
+
+    async def fetch_documents(self, table, project_id):
+        return list(self.documents) if table == "rag_chunks" else []
+
+    async def fingerprint_documents(self, table, project_id):
+        documents = self.documents if table == "rag_chunks" else []
+        return ids_fingerprint(str(row["id"]) for row in documents)
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches(monkeypatch):
+    monkeypatch.setattr(settings, "vector_db_url", "file:unused.db")
+    context_module._QUERY_EMBEDDING_CACHE.clear()
+    context_module._RETRIEVAL_CACHE.clear()
+    get_lexical_index_manager().clear()
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_hits_cache():
+    llm, store = _FakeLLM(), _FakeStore()
+    service = ChapterContextService(llm_service=llm, vector_store=store)
+
+    first = await service.retrieve_for_generation(project_id="cache-p1", query_text="第一章  标题", user_id=1)
+    second = await service.retrieve_for_generation(project_id="cache-p1", query_text="第一章 标题", user_id=1)
+
+    assert llm.embedding_calls == 1
+    assert store.queries == 2
+    assert second.chunks == first.chunks and second.summaries == first.summaries
+
+
+@pytest.mark.asyncio
+async def test_vector_writes_invalidate_results():
+    llm, store = _FakeLLM(), _FakeStore()
+    service = ChapterContextService(llm_service=llm, vector_store=store)
+
+    await service.retrieve_for_generation(project_id="cache-p2", query_text="查询", user_id=1)
+    VectorStoreService._bump_generation(["cache-p2"])
+    await service.retrieve_for_generation(project_id="cache-p2", query_text="查询", user_id=1)
+
+    assert llm.embedding_calls == 1
+    assert store.queries == 4
+
+
+def test_resolve_chapter_window():
+    volumes = [SimpleNamespace(id=10, volume_number=1), SimpleNamespace(id=20, volume_number=2)]
+    outlines = [
+        SimpleNamespace(chapter_number=number, volume_id=10 if number <= 30 else 20) for number in range(1, 61)
+    ]
+
+    assert resolve_chapter_window(45, window_chapters=0, window_volumes=0) == (None, 44)
+    assert resolve_chapter_window(45, window_chapters=10, window_volumes=0) == (35, 44)
+    assert resolve_chapter_window(45, outlines=outlines, volumes=volumes, window_chapters=0, window_volumes=1) == (31, 44)
+    # 两种窗口同时配置时取较窄者
+    assert resolve_chapter_window(45, outlines=outlines, volumes=volumes, window_chapters=30, window_volumes=1) == (31, 44)
+
+
+@pytest.mark.asyncio
+async def test_lexical_fallback_and_hybrid_fusion():
+    documents = [
+        {"id": "c1", "chapter_number": 1, "title": "T", "text": "片段", "metadata": {}},
+        {"id": "c2", "chapter_number": 2, "title": "T", "text": "主角在雪山之巅拔出了古剑", "metadata": {"chunk_id": "c2"}},
+        {"id": "c3", "chapter_number": 3, "title": "T", "text": "城中的集市热闹非凡", "metadata": {"chunk_id": "c3"}},
+    ]
+
+    class _FailingLLM(_FakeLLM):
+        async def get_embedding(self, text, *, user_id=None, model=None):
+            self.embedding_calls += 1
+            return []
+
+    store = _FakeStore(documents)
+    service = ChapterContextService(llm_service=_FailingLLM(), vector_store=store)
+    fallback = await service.retrieve_for_generation(project_id="lex-p1", query_text="雪山 古剑", user_id=1, mode="vector")
+    assert [chunk.content for chunk in fallback.chunks] == ["主角在雪山之巅拔出了古剑"]
+    assert store.queries == 0
+
+    service = ChapterContextService(llm_service=_FakeLLM(), vector_store=store)
+    hybrid = await service.retrieve_for_generation(project_id="lex-p1", query_text="雪山 古剑", user_id=1, mode="hybrid")
+    assert {chunk.content for chunk in hybrid.chunks} == {"片段", "主角在雪山之巅拔出了古剑"}
+    assert all(0.0 <= chunk.score < 1.0 for chunk in hybrid.chunks)
+
+
+@pytest.mark.asyncio
+async def test_lexical_index_manager_evicts_least_recently_used():
+    manager = LexicalIndexManager(max_loaded=2)
+    builds = []
+
+    def loader(project_id):
+        async def load():
+            builds.append(project_id)
+            return [LexicalDocument(id=project_id, chapter_number=1, title=None, text="雪山古剑")]
+        return load
+
+    async def fingerprint():
+        return None
+
+    for project_id in ("a", "b", "a", "c"):
+        await manager.get_or_build(
+            "rag_chunks", project_id, load_documents=loader(project_id), fingerprint_documents=fingerprint
+        )
+    assert manager.get_loaded("rag_chunks", "b") is None
+    assert manager.get_loaded("rag_chunks", "a") is not None
+    assert builds == ["a", "b", "c"]
@@ -0,0 +1,91 @@
+"""
+章节增量入库测试
+
+测试：
+1. 片段 id 由内容哈希生成，插入段落不影响其他片段
+2. 修改单个段落时只重新嵌入并写入变化的片段
+3. 重建时片段向量全部生成失败则保留旧数据
+"""
+import pytest
+
+from app.core.config import settings
+from app.services.chapter_ingest_service import ChapterIngestionService
+from app.services.vector_store_service import VectorStoreService
+
+
+class _FakeLLM:
+    def __init__(self):
+        self.embedded = []
+
+    async def get_embeddings(self, texts, *, user_id=None, model=None):
+        self.embedded.extend(texts)
+        return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+
+
+def _paragraphs(count):
+    return ["。".join(f"第{i}段第{j}句，这是一段足够长的正文内容" for j in range(30)) + "。" for i in range(count)]
+
+
+def test_chunk_ids_follow_content():
+    ids = ChapterIngestionService._build_chunk_ids("p", 1, ["甲", "乙", "甲"])
+    shifted = ChapterIngestionService._build_chunk_ids("p", 1, ["新", "甲", "乙", "甲"])
+
+    assert len(set(ids)) == 3
+    assert shifted[1:] == ids
+
+
+@pytest.mark.asyncio
+async def test_reingest_only_writes_changed_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "vector_db_url", f"file:{tmp_path / 'vectors.db'}")
+    monkeypatch.setattr(settings, "vector_index_dir", str(tmp_path / "ann"))
+    store = VectorStoreService()
+    llm = _FakeLLM()
+    service = ChapterIngestionService(llm_service=llm, vector_store=store)
+    paragraphs = _paragraphs(12)
+
+    await service.ingest_chapter(
+        project_id="p", chapter_number=1, title="T", content="\n\n".join(paragraphs), summary="摘要", user_id=1
+    )
+    before = await store.get_chapter_state("p", 1)
+    assert len(llm.embedded) == len(before.chunks) + 1
+
+    llm.embedded.clear()
+    paragraphs[4] = "第四段被改写。" + "改写后的内容，" * 40
+    await service.ingest_chapter(
+        project_id="p", chapter_number=1, title="T", content="\n\n".join(paragraphs), summary="摘要", user_id=1
+    )
+    after = await store.get_chapter_state("p", 1)
+
+    assert 1 <= len(llm.embedded) <= 2
+    assert len(set(before.chunks) - set(after.chunks)) <= 3
+    assert len(after.chunks) == len(set(before.chunks) & set(after.chunks)) + len(llm.embedded)
+    assert after.summary == "摘要"
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_chapter_when_embeddings_fail(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "vector_db_url", f"file:{tmp_path / 'vectors.db'}")
+    monkeypatch.setattr(settings, "vector_index_dir", str(tmp_path / "ann"))
+    store = VectorStoreService()
+    llm = _FakeLLM()
+    service = ChapterIngestionService(llm_service=llm, vector_store=store)
+    content = "\n\n".join(_paragraphs(3))
+
+    written = await service.ingest_chapter(
+        project_id="p", chapter_number=1, title="T", content=content, summary="摘要", user_id=1
+    )
+    before = await store.get_chapter_state("p", 1)
+    assert written == len(before.chunks) + 1
+
+    async def failing_embeddings(texts, *, user_id=None, model=None):
+        return [[] for _ in texts[:-1]] + [[1.0, 1.0, 1.0]]
+
+    monkeypatch.setattr(llm, "get_embeddings", failing_embeddings)
+    written = await service.ingest_chapter(
+        project_id="p", chapter_number=1, title="T", content=content, summary="新摘要", user_id=1, rebuild=True
+    )
+    after = await store.get_chapter_state("p", 1)
+    assert written is None
+    assert after.chunks == before.chunks and after.summary == "摘要"
+    await store.close()
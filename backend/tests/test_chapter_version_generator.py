@@ -0,0 +1,48 @@
+"""
+章节多版本并发生成测试
+
+测试：
+1. 版本并发生成，并发数不超过上限，结果保持版本顺序
+2. 单个版本失败时返回其余版本，全部失败时抛出异常
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.chapter_version_generator import generate_versions
+
+
+@pytest.mark.asyncio
+async def test_versions_run_concurrently_in_order():
+    running = 0
+    peak = 0
+
+    async def generate_one(idx):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05 - idx * 0.01)
+        running -= 1
+        return {"content": f"版本{idx}"}
+
+    results = await generate_versions(4, generate_one, concurrency=3)
+    assert peak == 3
+    assert [item["content"] for item in results] == ["版本0", "版本1", "版本2", "版本3"]
+
+
+@pytest.mark.asyncio
+async def test_failed_version_is_isolated():
+    async def generate_one(idx):
+        if idx == 1:
+            raise HTTPException(status_code=503, detail="端点不可用")
+        return idx
+
+    assert await generate_versions(3, generate_one) == [0, 2]
+
+    async def always_fail(idx):
+        raise HTTPException(status_code=503, detail=f"失败{idx}")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await generate_versions(2, always_fail)
+    assert exc_info.value.detail == "失败0"
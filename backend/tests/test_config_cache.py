@@ -0,0 +1,62 @@
+"""
+配置缓存测试
+
+测试：
+1. 预热后读取系统配置与管理员设置不再查询数据库，缺失的键同样被缓存
+2. 通过后台写入配置后缓存立即失效
+"""
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.db.base import Base
+from app.models import SystemConfig
+from app.schemas.config import SystemConfigCreate
+from app.services.admin_setting_service import AdminSettingService
+from app.services.config_cache import get_config_cache
+from app.services.config_service import ConfigService
+from app.services.llm_service import LLMService
+
+
+async def _seed_database():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as session:
+        session.add(SystemConfig(key="llm.model", value="gpt-test"))
+        await session.commit()
+    return engine, factory
+
+
+@pytest.mark.asyncio
+async def test_cached_config_reads_skip_database():
+    engine, factory = await _seed_database()
+    cache = get_config_cache()
+    cache.clear()
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    async with factory() as session:
+        await cache.preload(session)
+        statements.clear()
+        service = LLMService(session)
+        assert await service._get_config_value("llm.model") == "gpt-test"
+        assert await service._get_config_value("llm.missing_key") is None
+        assert await service._get_config_value("llm.missing_key") is None
+        assert len(statements) == 1
+
+        await ConfigService(session).upsert_config(SystemConfigCreate(key="llm.model", value="gpt-new"))
+        assert await service._get_config_value("llm.model") == "gpt-new"
+
+        admin = AdminSettingService(session)
+        assert await admin.get("daily_request_limit", "100") == "100"
+        await admin.set("daily_request_limit", "5")
+        assert await admin.get("daily_request_limit", "100") == "5"
+    cache.clear()
+    await engine.dispose()
@@ -0,0 +1,131 @@
+"""
+端点熔断测试
+
+测试：
+1. 连续失败达到阈值后熔断，冷却结束后只放行一个探测请求，探测成功后恢复
+2. 熔断中的端点被跳过，健康端点按首 token 延迟排序
+3. 多个 API Key 之间按进行中请求数分摊并发，被限流的 Key 降级
+"""
+import asyncio
+
+import httpx
+import pytest
+from openai import APIConnectionError
+
+from app.services import llm_service as llm_module
+from app.services.endpoint_health import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    EndpointHealthRegistry,
+)
+from app.services.llm_service import LLMService
+
+_DEAD = {"base_url": "http://dead.example/v1", "api_key": "k1", "model": "m"}
+_SLOW = {"base_url": "http://slow.example/v1", "api_key": "k2", "model": "m"}
+_FAST = {"base_url": "http://fast.example/v1", "api_key": "k3", "model": "m"}
+
+
+def test_breaker_opens_and_recovers_through_single_probe(monkeypatch):
+    registry = EndpointHealthRegistry(failure_threshold=2, cooldown=10.0)
+    now = [100.0]
+    monkeypatch.setattr("app.services.endpoint_health.time.monotonic", lambda: now[0])
+
+    registry.record_failure(_DEAD, "响应超时")
+    ordinary = registry.allow(_DEAD)
+    assert ordinary
+    registry.record_failure(_DEAD, "响应超时")
+    assert registry.get(_DEAD).state == STATE_OPEN
+    assert registry.allow(_DEAD) is None
+
+    now[0] += 10.0
+    probe = registry.allow(_DEAD)
+    assert probe
+    assert registry.get(_DEAD).state == STATE_HALF_OPEN
+    assert registry.allow(_DEAD) is None
+    # 熔断前放行的普通请求结束，不释放探测名额
+    registry.release(_DEAD, ordinary)
+    assert registry.allow(_DEAD) is None
+
+    registry.record_success(_DEAD, 0.5)
+    registry.release(_DEAD, probe)
+    assert registry.get(_DEAD).state == STATE_CLOSED
+    assert registry.allow(_DEAD)
+    assert "api_key" not in registry.snapshot()[0]
+
+
+def test_throttled_endpoint_is_demoted():
+    registry = EndpointHealthRegistry(failure_threshold=3, cooldown=10.0)
+    registry.record_throttled(_SLOW, 30.0)
+    assert registry.order([[_SLOW, _FAST], [_DEAD]]) == [_FAST, _SLOW, _DEAD]
+    assert registry.get(_SLOW).state == STATE_CLOSED
+
+
+class _FakeChatClient:
+    def __init__(self, calls, base_url, api_key=None, delay=0.0):
+        self.calls = calls
+        self.base_url = base_url
+        self.api_key = api_key
+        self.delay = delay
+
+    async def stream_chat(self, **_kwargs):
+        self.calls.append(self.api_key or self.base_url)
+        if "dead" in self.base_url:
+            raise APIConnectionError(request=httpx.Request("POST", self.base_url))
+        await asyncio.sleep(self.delay)
+        yield {"content": self.base_url}
+
+
+@pytest.mark.asyncio
+async def test_stream_and_collect_skips_open_endpoint(monkeypatch):
+    registry = EndpointHealthRegistry(failure_threshold=1, cooldown=60.0)
+    registry.record_success(_SLOW, 5.0)
+    registry.record_success(_FAST, 0.2)
+    monkeypatch.setattr(llm_module, "get_endpoint_health", lambda: registry)
+
+    calls = []
+    service = LLMService(None)
+    service._fallback_endpoints = []
+
+    async def resolve(_user_id):
+        return [dict(_DEAD), dict(_SLOW), dict(_FAST)]
+
+    monkeypatch.setattr(service, "_resolve_llm_config", resolve)
+    monkeypatch.setattr(
+        LLMService, "_open_chat_client", staticmethod(lambda api_key, base_url: _FakeChatClient(calls, base_url))
+    )
+
+    messages = [{"role": "user", "content": "hi"}]
+    first = await service._stream_and_collect(messages, temperature=0.0, user_id=None, timeout=10)
+    assert first == _FAST["base_url"]
+    assert calls == [_DEAD["base_url"], _FAST["base_url"]]
+    assert registry.get(_DEAD).state == STATE_OPEN
+
+    calls.clear()
+    await service._stream_and_collect(messages, temperature=0.0, user_id=None, timeout=10)
+    assert calls == [_FAST["base_url"]]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_spread_across_user_keys(monkeypatch):
+    registry = EndpointHealthRegistry(failure_threshold=3, cooldown=60.0)
+    monkeypatch.setattr(llm_module, "get_endpoint_health", lambda: registry)
+    calls = []
+    service = LLMService(None)
+    service._fallback_endpoints = []
+
+    async def resolve(_user_id):
+        return [{"base_url": _FAST["base_url"], "api_key": key, "model": "m"} for key in ("a", "b", "c")]
+
+    monkeypatch.setattr(service, "_resolve_llm_config", resolve)
+    monkeypatch.setattr(
+        LLMService,
+        "_open_chat_client",
+        staticmethod(lambda api_key, base_url: _FakeChatClient(calls, base_url, api_key, delay=0.01)),
+    )
+
+    messages = [{"role": "user", "content": "hi"}]
+    await asyncio.gather(
+        *(service._stream_and_collect(messages, temperature=0.0, user_id=None, timeout=10) for _ in range(6))
+    )
+    assert sorted(calls) == ["a", "a", "b", "b", "c", "c"]
@@ -0,0 +1,130 @@
+"""
+异步生成任务池测试
+
+测试：
+1. 领取并执行任务，进度事件与结果写入任务记录
+2. 心跳超时的任务被重新领取，处理函数可读取上次保存的阶段性结果
+3. 增强分析任务共用同一套租约：同一任务只被领取一次，超时重新领取后旧执行者的写入不再生效
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.db.base import Base
+from app.models import GenerationJob, User
+from app.models.async_task import PendingAnalysis
+from app.services.async_analysis_processor import AsyncAnalysisProcessor
+from app.services.generation_job_service import GenerationJobProcessor, JobContext, register_job_handler
+
+
+class _EchoPayload(BaseModel):
+    text: str
+
+
+@register_job_handler("test_echo", _EchoPayload, requires_project=False)
+async def _echo_job(ctx: JobContext):
+    ctx.emit("progress", {"phase": "generating"})
+    done = list(ctx.partial.get("parts") or [])
+    done.append(ctx.payload.text)
+    ctx.save_partial("parts", done)
+    return {"parts": done}
+
+
+async def _setup():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as session:
+        session.add(User(id=1, username="writer", hashed_password="hashed"))
+        await session.commit()
+    processor = GenerationJobProcessor(factory, max_concurrent=2, poll_interval=1.0, heartbeat_timeout=60)
+    return engine, factory, processor
+
+
+@pytest.mark.asyncio
+async def test_job_runs_and_records_progress():
+    engine, factory, processor = await _setup()
+    async with factory() as session:
+        session.add(GenerationJob(job_type="test_echo", user_id=1, payload={"text": "第一段"}))
+        await session.commit()
+
+    claims = await processor._claim(2)
+    assert len(claims) == 1
+    await processor._run(claims[0])
+
+    async with factory() as session:
+        job = await session.get(GenerationJob, claims[0][0])
+        assert job.status == "completed"
+        assert job.result == {"parts": ["第一段"]}
+        assert job.progress["phase"] == "generating"
+        assert job.progress["partial"] == {"parts": ["第一段"]}
+    assert await processor._claim(2) == []
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_stale_job_is_reclaimed_with_partial_results():
+    engine, factory, processor = await _setup()
+    stale = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(seconds=600)
+    async with factory() as session:
+        session.add(GenerationJob(
+            job_type="test_echo",
+            user_id=1,
+            status="processing",
+            payload={"text": "第二段"},
+            progress={"partial": {"parts": ["第一段"]}},
+            started_at=stale,
+            updated_at=stale,
+        ))
+        await session.commit()
+
+    claims = await processor._claim(2)
+    assert len(claims) == 1
+    await processor._run(claims[0])
+
+    async with factory() as session:
+        job = await session.get(GenerationJob, claims[0][0])
+        assert job.status == "completed"
+        assert job.retry_count == 1
+        assert job.result == {"parts": ["第一段", "第二段"]}
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_analysis_tasks_share_claim_and_reclaim():
+    engine, factory, _ = await _setup()
+    async with factory() as session:
+        session.add(PendingAnalysis(chapter_id=1, project_id="p", user_id=1, priority=3))
+        session.add(PendingAnalysis(chapter_id=2, project_id="p", user_id=1, priority=8))
+        await session.commit()
+
+    first = AsyncAnalysisProcessor(factory, llm_service_factory=None)
+    second = AsyncAnalysisProcessor(factory, llm_service_factory=None)
+    assert [task_id for task_id, _ in await first._claim_tasks(limit=1)] == [2]
+    assert [task_id for task_id, _ in await second._claim_tasks(limit=5)] == [1]
+    assert await first._claim_tasks(limit=5) == []
+
+    # 执行者失联：心跳超时后被另一个进程重新领取，旧执行者的结果不再写入
+    stale = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(seconds=1200)
+    async with factory() as session:
+        pending = await session.get(PendingAnalysis, 2)
+        pending.started_at = pending.updated_at = stale
+        await session.commit()
+    reclaimed = await second._claim_tasks(limit=5)
+    assert [task_id for task_id, _ in reclaimed] == [2]
+    assert not await first._lease.update_owned(factory, (2, stale), {"status": "completed"})
+    assert await second._lease.update_owned(factory, reclaimed[0], {"status": "completed"})
+
+    async with factory() as session:
+        pending = await session.get(PendingAnalysis, 2)
+        assert pending.status == "completed"
+        assert pending.retry_count == 1
+    await engine.dispose()
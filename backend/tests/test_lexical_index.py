@@ -0,0 +1,125 @@
+"""
+本地词法索引测试
+
+测试：
+1. 中文按二元组切分，英文与数字按整词切分
+2. BM25 排序、章节范围过滤与增量删除
+3. 章节入库时同步维护已加载的索引
+4. 到期核对指纹，条数不变的修改也会触发重建
+"""
+import pytest
+
+from app.core.config import settings
+from app.services.chapter_ingest_service import ChapterIngestionService
+from app.services import lexical_index as lexical_module
+from app.services.lexical_index import (
+    LexicalDocument,
+    LexicalIndexManager,
+    ProjectLexicalIndex,
+    get_lexical_index_manager,
+    tokenize,
+)
+from app.services.vector_index import ids_fingerprint
+from app.services.vector_store_service import VectorStoreService
+
+
+def test_tokenize_mixed_text():
+    assert tokenize("雪山古剑 Sword-42") == ["雪山", "山古", "古剑", "sword", "42"]
+    assert tokenize("剑。") == ["剑"]
+
+
+def test_bm25_ranking_and_removal():
+    index = ProjectLexicalIndex()
+    index.add(
+        [
+            LexicalDocument(id="a", chapter_number=1, title=None, text="古剑出鞘，寒光照亮雪山。"),
+            LexicalDocument(id="b", chapter_number=2, title=None, text="雪山下的小镇，古剑的传说流传已久，古剑无人得见。"),
+            LexicalDocument(id="c", chapter_number=3, title=None, text="集市上人声鼎沸。"),
+        ]
+    )
+
+    hits = index.search("古剑", 3)
+    assert [doc_id for doc_id, _ in hits] == ["b", "a"]
+    assert index.search("古剑", 3, min_chapter=2) == [hits[0]]
+    assert index.search("集市", 3, max_chapter=2) == []
+
+    assert index.remove_chapters([2]) == 1
+    assert [doc_id for doc_id, _ in index.search("古剑", 3)] == ["a"]
+
+
+class _FakeLLM:
+    async def get_embeddings(self, texts, *, user_id=None, model=None):
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_ingestion_updates_loaded_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "vector_db_url", f"file:{tmp_path / 'vectors.db'}")
+    monkeypatch.setattr(settings, "vector_index_enabled", False)
+    store = VectorStoreService()
+    service = ChapterIngestionService(llm_service=_FakeLLM(), vector_store=store)
+    manager = get_lexical_index_manager()
+    manager.clear()
+
+    async def load(table):
+        return await manager.get_or_build(
+            table,
+            "lex",
+            load_documents=lambda: _documents(store, table),
+            fingerprint_documents=lambda: store.fingerprint_documents(table, "lex"),
+        )
+
+    await service.ingest_chapter(
+        project_id="lex", chapter_number=1, title="T", content="古剑出鞘，寒光照亮雪山。", summary="古剑现世", user_id=1
+    )
+    chunks = await load("rag_chunks")
+    summaries = await load("rag_summaries")
+    assert len(chunks) == 1 and len(summaries) == 1
+
+    await service.ingest_chapter(
+        project_id="lex", chapter_number=1, title="T", content="集市上人声鼎沸", summary="赶集", user_id=1
+    )
+    assert [chunks.get(doc_id).text for doc_id, _ in chunks.search("集市", 5)] == ["集市上人声鼎沸"]
+    assert chunks.search("古剑", 5) == []
+    assert [summaries.get(doc_id).text for doc_id, _ in summaries.search("赶集", 5)] == ["赶集"]
+
+    await service.delete_chapters("lex", [1])
+    assert len(chunks) == 0 and len(summaries) == 0
+    manager.clear()
+    await store.close()
+
+
+async def _documents(store, table):
+    rows = await store.fetch_documents(table, "lex")
+    return [
+        LexicalDocument(
+            id=row["id"],
+            chapter_number=row["chapter_number"],
+            title=row["title"],
+            text=row["text"],
+            metadata=row["metadata"],
+        )
+        for row in rows
+    ]
+
+
+@pytest.mark.asyncio
+async def test_verify_detects_edit_with_same_count(monkeypatch):
+    documents = [LexicalDocument(id="a", chapter_number=1, title=None, text="雪山古剑")]
+    manager = LexicalIndexManager(max_loaded=2)
+
+    async def load():
+        return list(documents)
+
+    async def fingerprint():
+        return ids_fingerprint(document.id for document in documents)
+
+    async def get():
+        return await manager.get_or_build("rag_chunks", "p", load_documents=load, fingerprint_documents=fingerprint)
+
+    first = await get()
+    monkeypatch.setattr(lexical_module, "_VERIFY_INTERVAL", 0.0)
+    assert await get() is first
+    documents[0] = LexicalDocument(id="b", chapter_number=1, title=None, text="集市")
+    rebuilt = await get()
+    assert rebuilt is not first and rebuilt.ids == ["b"]
@@ -0,0 +1,118 @@
+"""
+批量嵌入测试
+
+测试：
+1. 多输入请求按批次切分，结果顺序与输入一致
+2. 单个批次失败时仅对应条目为空
+3. 嵌入缓存命中时不再发起请求，并按容量上限淘汰
+4. 并发的单条请求被合并为一次多输入请求
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services.embedding_cache import EmbeddingCache
+from app.services.llm_service import LLMService
+
+
+class _FakeEmbeddings:
+    def __init__(self, calls, fail_on=None):
+        self._calls = calls
+        self._fail_on = fail_on
+
+    async def create(self, *, input, model):
+        self._calls.append(list(input))
+        if self._fail_on and self._fail_on in input:
+            raise RuntimeError("boom")
+        data = [
+            SimpleNamespace(index=idx, embedding=[float(len(text)), float(idx)])
+            for idx, text in enumerate(input)
+        ]
+        # 模拟兼容服务乱序返回
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+def _patch_service(monkeypatch, tmp_path, calls, fail_on=None):
+    class _FakeClient:
+        def __init__(self):
+            self.embeddings = _FakeEmbeddings(calls, fail_on)
+
+    async def fake_config(self, key):
+        return {"embedding.api_key": "sk-test", "embedding.base_url": "http://embed.local"}.get(key)
+
+    monkeypatch.setattr(
+        LLMService, "_open_embedding_client", staticmethod(lambda provider, api_key, base_url: _FakeClient())
+    )
+    monkeypatch.setattr(LLMService, "_get_config_value", fake_config)
+    monkeypatch.setattr(settings, "embedding_batch_size", 3)
+    monkeypatch.setattr(settings, "embedding_cache_path", str(tmp_path / "embedding_cache.db"))
+    return LLMService(session=None)
+
+
+@pytest.mark.asyncio
+async def test_get_embeddings_batches_and_keeps_order(monkeypatch, tmp_path):
+    calls = []
+    service = _patch_service(monkeypatch, tmp_path, calls)
+    texts = ["a" * (i + 1) for i in range(7)]
+
+    embeddings = await service.get_embeddings(texts)
+
+    assert [len(batch) for batch in calls] == [3, 3, 1]
+    assert [vector[0] for vector in embeddings] == [float(i + 1) for i in range(7)]
+    assert await service.get_embedding_dimension() == 2
+
+
+@pytest.mark.asyncio
+async def test_get_embeddings_isolates_failed_batch(monkeypatch, tmp_path):
+    calls = []
+    service = _patch_service(monkeypatch, tmp_path, calls, fail_on="bad")
+
+    embeddings = await service.get_embeddings(["x", "y", "z", "bad", "w"])
+
+    assert embeddings[:3] == [[1.0, 0.0], [1.0, 1.0], [1.0, 2.0]]
+    assert embeddings[3:] == [[], []]
+
+
+@pytest.mark.asyncio
+async def test_cached_texts_skip_provider(monkeypatch, tmp_path):
+    calls = []
+    service = _patch_service(monkeypatch, tmp_path, calls)
+
+    first = await service.get_embeddings(["第一段", "第二段"])
+    # 仅空白不同的文本命中同一缓存
+    second = await service.get_embeddings(["第一段 ", "第二段", "第三段"])
+
+    assert calls == [["第一段", "第二段"], ["第三段"]]
+    assert second[:2] == first
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.db", max_entries=2)
+    await cache.put_many("m", [("a", [1.0]), ("b", [2.0])])
+    assert await cache.get_many("m", ["a"]) == {0: [1.0]}
+
+    await cache.put_many("m", [("c", [3.0])])
+
+    assert await cache.get_many("m", ["a", "b", "c"]) == {0: [1.0], 2: [3.0]}
+    assert await cache.get_many("other", ["a"]) == {}
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_single_requests_are_coalesced(monkeypatch, tmp_path):
+    calls = []
+    _patch_service(monkeypatch, tmp_path, calls)
+    monkeypatch.setattr(settings, "embedding_batch_size", 16)
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    services = [LLMService(session=None) for _ in range(5)]
+    texts = ["甲", "乙乙", "甲", "丙丙丙", "丁丁丁丁"]
+
+    results = await asyncio.gather(
+        *(service.get_embedding(text) for service, text in zip(services, texts))
+    )
+
+    assert calls == [["甲", "乙乙", "丙丙丙", "丁丁丁丁"]]
+    assert [vector[0] for vector in results] == [1.0, 2.0, 1.0, 3.0, 4.0]
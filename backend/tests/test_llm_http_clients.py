@@ -0,0 +1,88 @@
+"""
+LLM 共享连接池测试
+
+测试：
+1. 同一 (base_url, api_key) 复用同一客户端，不同 Key 共用同一连接池
+2. 请求经过事件钩子记录首字节耗时，关闭后连接池不可再用
+3. 事件循环变化时释放旧注册表：旧循环仍在运行则在其中关闭，已结束则丢弃
+"""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from app.services.llm_http_clients import LLMHttpClientRegistry, close_llm_http_clients, get_llm_http_clients
+from app.utils.metrics import llm_http_ttfb_seconds
+
+
+def _registry() -> LLMHttpClientRegistry:
+    return LLMHttpClientRegistry(
+        max_connections=10,
+        max_keepalive_connections=5,
+        keepalive_expiry=30.0,
+        http2=False,
+        max_clients=2,
+    )
+
+
+@pytest.mark.asyncio
+async def test_clients_share_pool_per_base_url():
+    registry = _registry()
+    first = registry.openai("sk-a", "https://api.example.com/v1")
+    assert registry.openai("sk-a", "https://api.example.com/v1") is first
+    second = registry.openai("sk-b", "https://api.example.com/v1")
+    assert second is not first
+    assert second._client is first._client
+
+    # 超出数量上限时淘汰 SDK 客户端，连接池保持不变
+    registry.openai("sk-c", "https://api.example.com/v1")
+    assert registry.openai("sk-a", "https://api.example.com/v1") is not first
+    assert registry.http_client("https://api.example.com/v1/") is first._client
+
+    await registry.aclose()
+    assert first._client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_requests_record_time_to_first_byte():
+    registry = _registry()
+    pool = registry.http_client("http://llm.local")
+    pool._transport = httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+
+    def observed() -> float:
+        return llm_http_ttfb_seconds.labels(host="llm.local", connection="reused")._sum.get()
+
+    before = observed()
+    for _ in range(3):
+        response = await pool.get("http://llm.local/v1/models")
+        assert response.status_code == 200
+    assert observed() > before
+    await registry.aclose()
+
+
+def test_registry_released_when_loop_changes():
+    async def grab():
+        registry = get_llm_http_clients()
+        return registry, registry.http_client("http://llm.local")
+
+    # 旧循环已结束：丢弃旧连接池
+    first, _ = asyncio.run(grab())
+    second, pool = asyncio.run(grab())
+    assert second is not first and not first._pools
+
+    # 旧循环仍在其他线程运行：在旧循环中关闭
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+    try:
+        third, pool = asyncio.run_coroutine_threadsafe(grab(), other).result(5)
+        assert third is not second
+        fourth, _ = asyncio.run(grab())
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), other).result(5)
+        assert pool.is_closed and fourth is not third
+        asyncio.run(close_llm_http_clients())
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join(5)
+        other.close()
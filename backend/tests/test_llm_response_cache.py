@@ -0,0 +1,126 @@
+"""
+LLM 响应缓存测试
+
+测试：
+1. 开启缓存的功能相同输入只调用一次模型，use_cache=False 跳过缓存，未开启缓存的功能不受影响
+2. 条目超过上限按最近使用时间淘汰，过期条目视为未命中
+3. 解析或校验失败的响应不写入缓存，已缓存的坏响应会被删除
+"""
+import time
+
+import pytest
+
+from app.config.ai_function_config import AIFunctionType, FunctionRouteConfig, ProviderConfig
+from app.core.config import settings
+from app.services import ai_orchestrator as orchestrator_module
+from app.services import llm_response_cache as cache_module
+from app.services.ai_orchestrator import AIOrchestrator
+from app.services.llm_response_cache import LLMResponseCache, get_llm_response_cache
+from app.services.llm_service import LLMService
+from app.services.super_analysis_service import SuperAnalysisService
+
+
+class _CountingLLMService:
+    def __init__(self):
+        self.calls = 0
+
+    async def invoke(self, **_kwargs):
+        self.calls += 1
+        return f"结果{self.calls}"
+
+
+def _route(function):
+    return FunctionRouteConfig(
+        function_type=function,
+        primary=ProviderConfig(provider="p", model="m"),
+        temperature=0.15,
+        cache=function == AIFunctionType.SUMMARY_EXTRACTION,
+    )
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_reuses_cached_response(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "llm_response_cache_path", str(tmp_path / "responses.db"))
+    monkeypatch.setattr(orchestrator_module, "get_function_config", _route)
+    monkeypatch.setattr(cache_module, "get_function_config", _route)
+    service = _CountingLLMService()
+    orchestrator = AIOrchestrator(service)
+
+    summary = AIFunctionType.SUMMARY_EXTRACTION
+    assert await orchestrator.execute(summary, "提取摘要", "第一章正文") == "结果1"
+    assert await orchestrator.execute(summary, "提取摘要", "第一章正文") == "结果1"
+    assert await orchestrator.execute(summary, "提取摘要", "第二章正文") == "结果2"
+    assert await orchestrator.execute(summary, "提取摘要", "第一章正文", temperature=0.5) == "结果3"
+    assert await orchestrator.execute(summary, "提取摘要", "第一章正文", use_cache=False) == "结果4"
+    assert service.calls == 4
+
+    writing = AIFunctionType.CHAPTER_CONTENT_WRITING
+    assert await orchestrator.execute(writing, "写作", "第一章正文") == "结果5"
+    assert await orchestrator.execute(writing, "写作", "第一章正文") == "结果6"
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_by_size_and_age(tmp_path):
+    function = AIFunctionType.BASIC_ANALYSIS
+    cache = LLMResponseCache(tmp_path / "responses.db", max_entries=2, max_age=60.0)
+    await cache.put("a", function=function, model="m", response="A")
+    await cache.put("b", function=function, model="m", response="B")
+    assert await cache.get("a", function=function) == "A"
+    await cache.put("c", function=function, model="m", response="C")
+    # b 最久未使用，被淘汰
+    assert await cache.get("b", function=function) is None
+    assert await cache.get("a", function=function) == "A"
+    assert await cache.get("c", function=function) == "C"
+
+    cache.max_age = 0.01
+    time.sleep(0.02)
+    assert await cache.get("a", function=function) is None
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_malformed_response_is_not_served_again(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "llm_response_cache_path", str(tmp_path / "responses.db"))
+    valid = '{"summary": "主角出发", "key_events": []}'
+    responses = ["模型没有按 JSON 输出", valid]
+    calls = []
+
+    service = LLMService(None)
+
+    async def stream(messages, **_kwargs):
+        calls.append(messages)
+        return responses[len(calls) - 1] if len(calls) <= len(responses) else valid
+
+    async def cache_model(_user_id):
+        return "m"
+
+    monkeypatch.setattr(service, "_stream_and_collect", stream)
+    monkeypatch.setattr(service, "_cache_model", cache_model)
+    monkeypatch.setattr(
+        cache_module,
+        "get_function_config",
+        lambda function: FunctionRouteConfig(
+            function_type=function, primary=ProviderConfig(provider="p", model="m"), cache=True
+        ),
+    )
+    validator = SuperAnalysisService(None, service)._is_valid_basic_response
+
+    async def analyze():
+        return await service.get_llm_response(
+            "分析", [{"role": "user", "content": "第一章"}],
+            cache_function=AIFunctionType.BASIC_ANALYSIS,
+            cache_validator=validator,
+        )
+
+    # 坏响应不缓存，重试会重新调用模型；合法响应缓存后命中
+    assert await analyze() == responses[0]
+    assert await analyze() == valid
+    assert await analyze() == valid
+    assert len(calls) == 2
+
+    # 校验规则收紧前写入的坏条目在读取时删除
+    cache = get_llm_response_cache(AIFunctionType.BASIC_ANALYSIS)
+    key = next(iter(cache._connection().execute("SELECT key FROM llm_response_cache")))[0]
+    await cache.put(key, function=AIFunctionType.BASIC_ANALYSIS, model="m", response="{}")
+    assert await analyze() == valid
+    assert len(calls) == 3
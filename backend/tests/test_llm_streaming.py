@@ -0,0 +1,47 @@
+"""
+LLM 增量输出回调测试
+
+测试：
+1. on_delta 按到达顺序收到增量内容，返回值与增量拼接结果一致
+2. 端点中途失败切换后尝试序号加一，返回值只包含成功端点的输出
+"""
+import httpx
+import pytest
+from openai import APIConnectionError
+
+from app.services import llm_service as llm_module
+from app.services.endpoint_health import EndpointHealthRegistry
+from app.services.llm_service import LLMService
+
+
+class _FakeChatClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    async def stream_chat(self, **_kwargs):
+        yield {"content": "半"}
+        if "broken" in self.base_url:
+            raise APIConnectionError(request=httpx.Request("POST", self.base_url))
+        yield {"content": "章"}
+        yield {"content": "正文", "finish_reason": "stop"}
+
+
+@pytest.mark.asyncio
+async def test_on_delta_restarts_attempt_after_failover(monkeypatch):
+    registry = EndpointHealthRegistry(failure_threshold=3, cooldown=60.0)
+    monkeypatch.setattr(llm_module, "get_endpoint_health", lambda: registry)
+    service = LLMService(None)
+    service._fallback_endpoints = [{"base_url": "http://ok.example/v1", "api_key": "k2", "model": "m"}]
+
+    async def resolve(_user_id):
+        return [{"base_url": "http://broken.example/v1", "api_key": "k1", "model": "m"}]
+
+    monkeypatch.setattr(service, "_resolve_llm_config", resolve)
+    monkeypatch.setattr(LLMService, "_open_chat_client", staticmethod(lambda api_key, base_url: _FakeChatClient(base_url)))
+
+    deltas = []
+    result = await service.get_llm_response(
+        "sys", [{"role": "user", "content": "写"}], on_delta=lambda text, attempt: deltas.append((attempt, text))
+    )
+    assert result == "半章正文"
+    assert deltas == [(0, "半"), (1, "半"), (1, "章"), (1, "正文")]
@@ -0,0 +1,61 @@
+"""
+提供商限流器测试
+
+测试：
+1. 并发不超过上限，等待方按到达顺序放行
+2. 令牌桶限制请求速率，429 后按 Retry-After 暂停
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.provider_limiter import ProviderLimiter, ProviderLimits, parse_retry_after
+
+
+@pytest.mark.asyncio
+async def test_concurrency_gate_is_fifo():
+    limiter = ProviderLimiter("test", ProviderLimits(max_concurrent=2))
+    started = []
+    running = 0
+    peak = 0
+
+    async def call(index):
+        nonlocal running, peak
+        async with limiter.slot():
+            started.append(index)
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    tasks = []
+    for index in range(6):
+        tasks.append(asyncio.create_task(call(index)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    assert peak == 2
+    assert started == list(range(6))
+    assert (limiter.active, limiter.queued) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_and_retry_after():
+    limiter = ProviderLimiter("test", ProviderLimits(rate_limit_per_minute=1200))
+    start = time.monotonic()
+    for _ in range(5):
+        async with limiter.slot():
+            pass
+    # 每秒 20 个令牌、桶容量 1：5 次请求至少间隔 4 个补充周期
+    assert time.monotonic() - start >= 0.18
+
+    limiter.penalize(0.2)
+    start = time.monotonic()
+    async with limiter.slot():
+        pass
+    assert time.monotonic() - start >= 0.18
+
+    assert parse_retry_after({"retry-after": "3"}) == 3.0
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+    assert parse_retry_after({}) is None
@@ -0,0 +1,82 @@
+"""
+请求合并测试
+
+测试：
+1. 相同 key 的并发调用只执行一次，共享结果并标记合并；不同 key 互不影响
+2. 异常同样共享；单个调用方取消不影响其他等待者，全部取消时中断执行
+3. 章节生成只合并同一用户、参数完全相同的请求
+"""
+import asyncio
+
+import pytest
+
+from app.api.routers.writer import _generation_flight_key
+from app.schemas.novel import GenerateChapterRequest
+from app.services.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def summarize(text):
+        calls.append(text)
+        await asyncio.sleep(0.02)
+        return f"摘要:{text}"
+
+    results = await asyncio.gather(
+        flights.do("a", lambda: summarize("a")),
+        flights.do("a", lambda: summarize("a")),
+        flights.do("b", lambda: summarize("b")),
+    )
+    assert results == [("摘要:a", False), ("摘要:a", True), ("摘要:b", False)]
+    assert calls == ["a", "b"]
+    assert not flights.in_flight("a")
+
+    # 执行结束后不再合并
+    assert await flights.do("a", lambda: summarize("a")) == ("摘要:a", False)
+
+
+@pytest.mark.asyncio
+async def test_errors_shared_and_cancellation_isolated():
+    flights = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("端点不可用")
+
+    results = await asyncio.gather(flights.do("k", fail), flights.do("k", fail), return_exceptions=True)
+    assert [str(item) for item in results] == ["端点不可用", "端点不可用"]
+
+    finished = asyncio.Event()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        finished.set()
+        return "done"
+
+    leader = asyncio.create_task(flights.do("s", slow))
+    follower = asyncio.create_task(flights.do("s", slow))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == ("done", True)
+    assert finished.is_set()
+
+    finished.clear()
+    only = asyncio.create_task(flights.do("t", slow))
+    await asyncio.sleep(0)
+    only.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await only
+    await asyncio.sleep(0.08)
+    assert not finished.is_set()
+    assert not flights.in_flight("t")
+
+
+def test_chapter_flight_key_covers_user_and_arguments():
+    request = GenerateChapterRequest(chapter_number=3, writing_notes="多写对话")
+    key = _generation_flight_key("p", request, 1)
+    assert key == _generation_flight_key("p", GenerateChapterRequest(chapter_number=3, writing_notes="多写对话"), 1)
+    assert key != _generation_flight_key("p", GenerateChapterRequest(chapter_number=3, writing_notes="多写景物"), 1)
+    assert key != _generation_flight_key("p", request, 2)
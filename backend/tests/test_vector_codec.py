@@ -0,0 +1,68 @@
+"""
+向量压缩存储测试
+
+测试：
+1. float16 / int8 编解码误差与字节数
+2. int8 存储下粗排 + 精确重排的检索结果与 float32 一致
+"""
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.vector_codec import (
+    FORMAT_FLOAT16,
+    FORMAT_FLOAT32,
+    FORMAT_INT8,
+    decode_vector,
+    encode_vector,
+    encoded_size,
+)
+from app.services.vector_store_service import VectorStoreService
+
+
+@pytest.mark.parametrize(
+    "fmt, tolerance",
+    [(FORMAT_FLOAT32, 0.0), (FORMAT_FLOAT16, 1e-2), (FORMAT_INT8, 2e-2)],
+)
+def test_round_trip(fmt, tolerance):
+    vector = np.random.default_rng(3).normal(size=384).astype(np.float32)
+    blob = encode_vector(vector, fmt)
+
+    assert len(blob) == encoded_size(384, fmt)
+    np.testing.assert_allclose(decode_vector(blob, fmt), vector, atol=tolerance * np.abs(vector).max())
+
+
+@pytest.mark.asyncio
+async def test_int8_storage_reranks_exactly(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "vector_db_url", f"file:{tmp_path / 'vectors.db'}")
+    monkeypatch.setattr(settings, "vector_index_enabled", False)
+    monkeypatch.setattr(settings, "vector_storage_format", "int8")
+    vectors = np.random.default_rng(5).normal(size=(200, 64)).astype(np.float32)
+    store = VectorStoreService()
+    await store.upsert_chunks(
+        records=[
+            {
+                "id": f"p:{idx // 20}:{idx}",
+                "project_id": "p",
+                "chapter_number": idx // 20,
+                "chunk_index": idx,
+                "chapter_title": "T",
+                "content": f"片段{idx}",
+                "embedding": vectors[idx].tolist(),
+                "metadata": {},
+            }
+            for idx in range(200)
+        ]
+    )
+
+    distances = 1 - (vectors @ vectors[42]) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(vectors[42]))
+    expected = [f"片段{idx}" for idx in np.argsort(distances)[:5]]
+    hits = await store.query_chunks(project_id="p", embedding=vectors[42].tolist(), top_k=5)
+
+    assert [hit.content for hit in hits] == expected
+    assert hits[0].score == pytest.approx(0.0, abs=1e-5)
+
+    await store.delete_by_chapters("p", [2])
+    result = await store._client.execute("SELECT COUNT(*) FROM rag_exact_vectors")
+    assert result.rows[0][0] == 180
+    await store.close()
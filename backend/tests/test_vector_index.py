@@ -0,0 +1,220 @@
+"""
+ANN 索引测试
+
+测试：
+1. 小规模精确扫描与训练后 IVF 检索的召回
+2. 增量写入、覆盖与按章节删除
+3. 持久化后重新加载
+4. 按章节范围检索：索引与全量扫描都只返回范围内的结果
+5. 管理器在后台构建与重训，合并延迟写盘，定期核对指纹（含条数不变的修改）并按最近使用淘汰
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import vector_index as index_module
+from app.services.vector_index import ProjectVectorIndex, VectorIndexManager, ids_fingerprint
+from app.services.vector_store_service import VectorStoreService
+
+
+def _random_corpus(count: int, dimension: int = 32, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dimension)).astype(np.float32)
+    ids = [f"p:{idx // 10}:{idx % 10}" for idx in range(count)]
+    chapters = [idx // 10 for idx in range(count)]
+    return ids, vectors, chapters
+
+
+def test_exact_search_before_training():
+    """未达到训练阈值时应为精确检索"""
+    ids, vectors, chapters = _random_corpus(50)
+    index = ProjectVectorIndex(32, min_train_size=1000)
+    index.add(ids, vectors, chapters)
+
+    assert not index.is_trained
+    hits = index.search(vectors[12], 3)
+    assert hits[0][0] == ids[12]
+    assert hits[0][1] == pytest.approx(0.0, abs=1e-5)
+    assert [distance for _, distance in hits] == sorted(distance for _, distance in hits)
+
+
+def test_ivf_recall_after_training():
+    """训练后 IVF 检索的 top-1 召回应接近精确检索"""
+    ids, vectors, chapters = _random_corpus(3000)
+    index = ProjectVectorIndex(32, nprobe=16, min_train_size=512)
+    index.add(ids, vectors, chapters)
+    # 增量写入不在调用方同步训练
+    assert not index.is_trained and index.needs_training
+    index.train()
+
+    assert index.is_trained and not index.needs_training
+    found = sum(index.search(vectors[i], 1)[0][0] == ids[i] for i in range(0, 3000, 30))
+    assert found >= 95
+
+
+def test_upsert_and_remove_chapters():
+    """同 id 覆盖写入，按章节删除后不再召回"""
+    ids, vectors, chapters = _random_corpus(40)
+    index = ProjectVectorIndex(32)
+    index.add(ids, vectors, chapters)
+
+    index.add([ids[0]], vectors[5:6], [chapters[0]])
+    assert len(index) == 40
+    assert index.search(vectors[5], 2)[1][0] in {ids[0], ids[5]}
+
+    removed = index.remove_chapters([0])
+    assert removed == 10
+    assert len(index) == 30
+    assert all(not item_id.startswith("p:0:") for item_id, _ in index.search(vectors[0], 30))
+
+
+def test_persist_and_reload(tmp_path):
+    """索引持久化后可原样加载"""
+    ids, vectors, chapters = _random_corpus(600)
+    manager = VectorIndexManager(tmp_path, min_train_size=256)
+    index = ProjectVectorIndex(32, min_train_size=256)
+    index.build(ids, vectors, chapters)
+    index.save(manager.path_for("rag_chunks", "project/1"))
+
+    reloaded = ProjectVectorIndex.load(
+        manager.path_for("rag_chunks", "project/1"),
+        nprobe=8,
+        min_train_size=256,
+    )
+    assert reloaded is not None
+    assert len(reloaded) == 600
+    assert reloaded.is_trained
+    assert reloaded.search(vectors[42], 1)[0][0] == ids[42]
+
+
+@pytest.mark.asyncio
+async def test_manager_builds_in_background_and_verifies(monkeypatch, tmp_path):
+    ids, vectors, chapters = _random_corpus(600)
+    rows = {"p": (ids[:300], vectors[:300], chapters[:300])}
+    loads = []
+
+    async def fingerprint_rows():
+        return ids_fingerprint(rows["p"][0])
+
+    async def load_rows():
+        loads.append(len(rows["p"][0]))
+        return rows["p"]
+
+    manager = VectorIndexManager(tmp_path, min_train_size=256, persist_delay=3600)
+    path = manager.path_for("rag_chunks", "p")
+
+    def get():
+        return manager.get_or_refresh(
+            "rag_chunks", "p", dimension=32, fingerprint_rows=fingerprint_rows, load_rows=load_rows
+        )
+
+    # 首次查询不等待构建，由调用方退回全量扫描
+    assert get() is None
+    await manager.drain()
+    index = get()
+    assert index is not None and len(index) == 300 and index.is_trained
+    assert path.exists()
+
+    # 增量写入只标记改动，延迟期内不写盘；规模翻倍时在后台重训
+    path.unlink()
+    index.add(ids[300:], vectors[300:], chapters[300:])
+    manager.mark_changed("rag_chunks", "p")
+    await asyncio.sleep(0.05)
+    assert not path.exists()
+    await manager.drain()
+    assert path.exists()
+    assert ProjectVectorIndex.load(path, nprobe=8, min_train_size=256)._trained_size == 600
+
+    # 其他进程写入后，到期核对发现不一致，后台重建期间继续返回旧索引
+    rows["p"] = (ids[:500], vectors[:500], chapters[:500])
+    monkeypatch.setattr(index_module, "_VERIFY_INTERVAL", 0.0)
+    assert get() is index
+    await manager.drain()
+    assert len(get()) == 500
+    assert loads == [300, 500]
+
+    # 删一条再插一条，条数不变也会重建
+    rows["p"] = (ids[1:501], vectors[1:501], chapters[1:501])
+    await manager.drain()
+    get()
+    await manager.drain()
+    assert loads == [300, 500, 500]
+    assert ids[0] not in get().ids and ids[500] in get().ids
+
+
+@pytest.mark.asyncio
+async def test_manager_evicts_least_recently_used(tmp_path):
+    ids, vectors, chapters = _random_corpus(20)
+
+    async def fingerprint_rows():
+        return ids_fingerprint(ids)
+
+    async def load_rows():
+        return ids, vectors, chapters
+
+    manager = VectorIndexManager(tmp_path, max_loaded=2, persist_delay=0)
+    for project_id in ("a", "b", "a", "c"):
+        manager.get_or_refresh(
+            "rag_chunks", project_id, dimension=32, fingerprint_rows=fingerprint_rows, load_rows=load_rows
+        )
+        await manager.drain()
+    assert manager.get_loaded("rag_chunks", "a") is not None
+    assert manager.get_loaded("rag_chunks", "b") is None
+    assert manager.get_loaded("rag_chunks", "c") is not None
+    # 淘汰只移出内存，文件保留，再次使用时直接读盘
+    assert manager.path_for("rag_chunks", "b").exists()
+
+
+def test_search_within_chapter_range():
+    """训练前后的检索都只返回章节范围内的向量"""
+    ids, vectors, chapters = _random_corpus(3000)
+    for min_train_size in (10000, 512):
+        index = ProjectVectorIndex(32, nprobe=4, min_train_size=min_train_size)
+        index.build(ids, vectors, chapters)
+
+        hits = index.search(vectors[5], 10, min_chapter=100, max_chapter=119)
+        assert len(hits) == 10
+        assert all(100 <= int(item_id.split(":")[1]) <= 119 for item_id, _ in hits)
+        assert index.search(vectors[1234], 1, max_chapter=123)[0][0] == ids[1234]
+        assert index.search(vectors[0], 5, min_chapter=500) == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("exact", [True, False])
+async def test_store_query_respects_chapter_range(monkeypatch, tmp_path, exact):
+    monkeypatch.setattr(settings, "vector_db_url", f"file:{tmp_path / 'vectors.db'}")
+    monkeypatch.setattr(settings, "vector_index_dir", str(tmp_path / "ann"))
+    monkeypatch.setattr(settings, "vector_scan_page_size", 7)
+    ids, vectors, chapters = _random_corpus(120)
+    store = VectorStoreService()
+    await store.upsert_summaries(
+        records=[
+            {
+                "id": item_id,
+                "project_id": "p",
+                "chapter_number": chapter,
+                "title": "T",
+                "summary": item_id,
+                "embedding": vector.tolist(),
+            }
+            for item_id, vector, chapter in zip(ids, vectors, chapters)
+        ]
+    )
+
+    if not exact:
+        # 索引在后台构建，就绪后再检索以覆盖 ANN 路径
+        assert store._get_index("rag_summaries", "p", dimension=32) is None
+        await store._index_manager.drain()
+        assert store._get_index("rag_summaries", "p", dimension=32) is not None
+
+    hits = await store.query_summaries(
+        project_id="p", embedding=vectors[95].tolist(), top_k=15, exact=exact, min_chapter=3, max_chapter=8
+    )
+    assert len(hits) == 15
+    assert all(3 <= hit.chapter_number <= 8 for hit in hits)
+    # 范围外的完全匹配项不会出现
+    assert ids[95] not in {hit.summary for hit in hits}
+    assert [hit.score for hit in hits] == sorted(hit.score for hit in hits)
+    await store.close()
@@ -0,0 +1,149 @@
+"""
+向量库批量回填测试
+
+测试：
+1. 回填所有已选定版本的章节，未选定版本的章节被忽略
+2. 检查点记录完成进度，再次执行时跳过未变化的章节
+3. 模型变化触发的重建中途退出后，续跑仍保持重建模式
+"""
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.db.base import Base
+from app.models import Chapter, ChapterVersion, NovelProject, User
+from app.services.llm_service import LLMService
+from app.services.vector_reindex_service import VectorReindexService
+from app.services.vector_store_service import VectorStoreService
+
+
+async def _seed_database():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with factory() as session:
+        session.add(User(id=1, username="writer", hashed_password="hashed"))
+        session.add(NovelProject(id="p", user_id=1, title="测试小说"))
+        await session.flush()
+        for number in range(1, 5):
+            chapter = Chapter(project_id="p", chapter_number=number, real_summary=f"第{number}章摘要")
+            session.add(chapter)
+            await session.flush()
+            version = ChapterVersion(chapter_id=chapter.id, content=f"第{number}章正文。" * 30)
+            session.add(version)
+            await session.flush()
+            # 第 4 章尚未选定版本，不应被回填
+            if number < 4:
+                chapter.selected_version_id = version.id
+        await session.commit()
+    return engine, factory
+
+
+@pytest.mark.asyncio
+async def test_reindex_resumes_from_checkpoint(monkeypatch, tmp_path):
+    engine, session_factory = await _seed_database()
+    monkeypatch.setattr(settings, "vector_db_url", f"file:{tmp_path / 'vectors.db'}")
+    monkeypatch.setattr(settings, "vector_index_enabled", False)
+    embedded = []
+
+    async def fake_embeddings(self, texts, *, user_id=None, model=None):
+        embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+    async def fake_model_key(self, model=None):
+        return "openai:test"
+
+    monkeypatch.setattr(LLMService, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(LLMService, "get_embedding_model_key", fake_model_key)
+    store = VectorStoreService()
+    checkpoint = tmp_path / "checkpoint.json"
+
+    def make_service(**kwargs):
+        return VectorReindexService(
+            workers=2,
+            checkpoint_path=checkpoint,
+            session_factory=session_factory,
+            vector_store=store,
+            **kwargs,
+        )
+
+    first = (await make_service().run()).as_dict()
+    assert first["status"] == "completed"
+    assert (first["total"], first["processed"], first["failed"]) == (3, 3, 0)
+    assert first["embeddings"] == len(embedded) > 0
+    assert not (await store.get_chapter_state("p", 4)).chunks
+
+    embedded.clear()
+    second = (await make_service().run()).as_dict()
+    assert (second["processed"], second["skipped"]) == (0, 3)
+    assert embedded == []
+
+    # 已完整结束的重建任务再次执行时从头开始
+    rebuilt = (await make_service(rebuild=True).run()).as_dict()
+    assert rebuilt["processed"] == 3
+    assert len(embedded) == first["embeddings"]
+    await store.close()
+    await engine.dispose()
+
+
+class _Crash(BaseException):
+    """模拟进程中途退出（不被单章失败处理捕获）。"""
+
+
+@pytest.mark.asyncio
+async def test_model_change_rebuild_survives_crash(monkeypatch, tmp_path):
+    engine, session_factory = await _seed_database()
+    monkeypatch.setattr(settings, "vector_db_url", f"file:{tmp_path / 'vectors.db'}")
+    monkeypatch.setattr(settings, "vector_index_enabled", False)
+    model = ["openai:old"]
+    embedded = []
+    crash_after = [None]
+
+    async def fake_embeddings(self, texts, *, user_id=None, model=None):
+        if crash_after[0] is not None:
+            if crash_after[0] == 0:
+                raise _Crash()
+            crash_after[0] -= 1
+        embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+    async def fake_model_key(self, model_name=None):
+        return model[0]
+
+    monkeypatch.setattr(LLMService, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(LLMService, "get_embedding_model_key", fake_model_key)
+    store = VectorStoreService()
+    checkpoint = tmp_path / "checkpoint.json"
+
+    def make_service():
+        return VectorReindexService(
+            workers=1, checkpoint_path=checkpoint, session_factory=session_factory, vector_store=store
+        )
+
+    await make_service().run()
+
+    # 更换模型后自动重建，处理完第 1 章后进程退出
+    model[0] = "openai:new"
+    embedded.clear()
+    crash_after[0] = 1
+    with pytest.raises(_Crash):
+        await make_service().run()
+    assert any("第1章" in text for text in embedded)
+
+    # 续跑时剩余章节仍以重建模式写入新模型的向量
+    embedded.clear()
+    crash_after[0] = None
+    resumed = await make_service().run()
+    assert resumed.rebuild
+    assert (resumed.processed, resumed.skipped) == (2, 1)
+    assert any("第2章" in text for text in embedded)
+    assert any("第3章" in text for text in embedded)
+    await store.close()
+    await engine.dispose()